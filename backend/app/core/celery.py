@@ -0,0 +1,66 @@
+"""Celery应用
+
+JOB_QUEUE_BACKEND=celery 时执行通过该应用投递给worker运行：
+
+    celery -A app.core.celery worker --loglevel=info
+"""
+
+import asyncio
+import logging
+import os
+
+from celery import Celery
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+celery_app = Celery(
+    "feishu_ai",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    timezone="UTC",
+    enable_utc=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_time_limit=settings.TASK_TIMEOUT,
+)
+
+
+# worker进程内常驻的事件循环。全局异步Redis客户端、取消和在途执行的订阅都绑定在
+# 首次使用时的事件循环上，每个任务各自 asyncio.run 会在循环关闭后复用它们而报错
+_loop = None
+_loop_pid = None
+
+
+def run_async(coro):
+    """在当前worker进程的常驻事件循环中运行协程"""
+    global _loop, _loop_pid
+    if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+        # prefork模式下子进程不能沿用父进程的事件循环
+        _loop = asyncio.new_event_loop()
+        _loop_pid = os.getpid()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@celery_app.task(name="executions.run")
+def run_execution(execution_id: int) -> bool:
+    """认领并运行执行，执行已被认领（重复投递）时直接返回"""
+    from app.core.database import SessionLocal
+    from app.services.job_queue import CELERY_QUEUE, claim_execution
+    from app.services.pipeline import execute_claimed
+
+    db = SessionLocal()
+    try:
+        if claim_execution(db, execution_id, CELERY_QUEUE) is None:
+            logger.info(f"执行已被认领，跳过: {execution_id}")
+            return False
+    finally:
+        db.close()
+    return run_async(execute_claimed(execution_id))
@@ -109,11 +109,67 @@ class Settings(BaseSettings):
     DEFAULT_AI_MODEL: str = "gpt-3.5-turbo"
     AI_REQUEST_TIMEOUT: int = 120
     MAX_TOKENS_PER_REQUEST: int = 4000
-    
+
+    # AI模型并发控制配置（跨worker的分布式信号量）
+    AI_CONCURRENCY_LEASE_SECONDS: int = 30  # 并发名额租约时长，持有者崩溃后自动释放
+    AI_CONCURRENCY_POLL_INTERVAL: float = 0.2  # 等待名额时的轮询间隔（秒）
+    AI_CONCURRENCY_ACQUIRE_TIMEOUT: int = 300  # 等待名额的最长时间（秒）
+
+    # AI响应缓存配置（按任务analysis_config.response_cache开启）
+    AI_RESPONSE_CACHE_TTL: int = 24 * 3600  # 默认缓存有效期（秒）
+    AI_RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 缓存总大小上限，超出后按最近最少使用淘汰
+
+    # Token预算与分段分析配置
+    TOKENIZER_CACHE_DIR: str = "/tmp/ai_analysis/tokenizer"  # 本地分词器缓存目录（tiktoken）
+    AI_MAX_CHUNKS_PER_DOCUMENT: int = 50  # 单个文档最多拆分的分段数
+
+    # 自适应并发配置（AIMD，AIModel.max_concurrent_requests作为上限）
+    AI_ADAPTIVE_CONCURRENCY_ENABLED: bool = True
+    AI_ADAPTIVE_MIN_LIMIT: int = 1  # 并发上限下限
+    AI_ADAPTIVE_INCREASE: float = 1.0  # 每轮成功后上限增加量
+    AI_ADAPTIVE_BACKOFF: float = 0.5  # 过载时上限乘以该系数
+    AI_ADAPTIVE_LATENCY_SPIKE_RATIO: float = 2.0  # 耗时超过平滑耗时的倍数视为突增
+    AI_ADAPTIVE_DECREASE_COOLDOWN: float = 5.0  # 两次减小上限的最小间隔（秒）
+    AI_ADAPTIVE_HISTORY_SIZE: int = 500  # 每个模型保留的上限调整历史条数
+
+    # 对冲请求与备用模型配置（按任务analysis_config.fallback_model_ids开启）
+    AI_LATENCY_WINDOW_MINUTES: int = 10  # 延迟直方图统计窗口（分钟）
+    AI_LATENCY_MIN_SAMPLES: int = 20  # 计算分位数所需的最少样本数
+    AI_HEDGE_QUANTILE: float = 0.95  # 主模型超过该分位数耗时仍未返回时触发对冲
+    AI_HEDGE_DEFAULT_DELAY: float = 30.0  # 样本不足时的对冲等待时间（秒）
+    AI_HEDGE_MIN_DELAY: float = 0.5  # 对冲等待时间下限（秒）
+
+    # 模型熔断配置（状态在Redis中跨worker共享）
+    AI_CIRCUIT_WINDOW_SECONDS: int = 60  # 失败率统计的滑动窗口（秒）
+    AI_CIRCUIT_BUCKET_SECONDS: int = 10  # 滑动窗口分桶粒度（秒）
+    AI_CIRCUIT_MIN_CALLS: int = 10  # 窗口内调用数达到该值才判断是否熔断
+    AI_CIRCUIT_FAILURE_RATE: float = 0.5  # 失败（含慢调用）比例阈值
+    AI_CIRCUIT_SLOW_CALL_SECONDS: float = 60.0  # 超过该耗时的调用按失败计
+    AI_CIRCUIT_OPEN_SECONDS: int = 30  # 熔断持续时间，之后放行探测请求
+
+    # 离线批量推理配置（非实时任务）
+    AI_BATCH_MAX_REQUESTS: int = 5000  # 单个批次最多包含的请求数
+    AI_BATCH_POLL_INTERVAL: int = 60  # 轮询批次状态的间隔（秒）
+    AI_BATCH_COMPLETION_WINDOW: str = "24h"  # 批次完成时间窗口
+
     # 飞书配置
     FEISHU_APP_ID: Optional[str] = None
     FEISHU_APP_SECRET: Optional[str] = None
     FEISHU_BASE_URL: str = "https://open.feishu.cn/open-apis"
+    FEISHU_PROJECT_BASE_URL: str = "https://project.feishu.cn"  # 飞书项目开放接口地址
+    FEISHU_REQUEST_TIMEOUT: float = 10.0  # 飞书接口请求超时（秒）
+    FEISHU_TOKEN_REFRESH_AHEAD: int = 300  # 访问凭证到期前多久主动刷新（秒）
+    FEISHU_TOKEN_IDLE_SECONDS: int = 3600  # 凭证超过该时间未使用则停止后台刷新（秒）
+
+    # 飞书回写配置（同一工作项的字段更新在窗口内合并为一次调用）
+    FEISHU_WRITE_BACK_WINDOW: float = 2.0  # 合并窗口（秒）
+    FEISHU_WRITE_BACK_SHARED: bool = True  # 经Redis在所有worker进程之间合并（关闭时只在进程内合并）
+    FEISHU_WRITE_BACK_MAX_RETRIES: int = 3  # 限流或服务端错误的最大重试次数
+    FEISHU_WRITE_BACK_RETRY_BASE: float = 1.0  # 重试退避基数（秒）
+    FEISHU_WRITE_BACK_RETRY_MAX: float = 30.0  # 重试退避上限（秒）
+    FEISHU_RATE_LIMIT_QPS: float = 10.0  # 每个进程调用飞书接口的速率上限（次/秒）
+    FEISHU_RATE_LIMIT_BURST: int = 10  # 允许的突发调用数
+    FEISHU_WRITTEN_CACHE_TTL: int = 7 * 24 * 3600  # 最后回写值缓存有效期（秒），字段值未变化时跳过回写
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -135,6 +191,61 @@ class Settings(BaseSettings):
     MAX_RETRY_ATTEMPTS: int = 3
     RETRY_DELAY: int = 60  # 秒
     TASK_TIMEOUT: int = 3600  # 1小时
+    RETRY_MAX_DELAY: int = 3600  # 重试延迟上限（秒）
+
+    # 重试调度配置（即将到期的重试放入内存时间轮按时分派，不逐秒轮询数据库）
+    RETRY_WHEEL_TICK: float = 1.0  # 时间轮刻度（秒），即分派精度
+    RETRY_LOAD_INTERVAL: int = 60  # 从数据库加载即将到期重试的间隔（秒）
+    RETRY_LOAD_HORIZON: int = 120  # 每次加载未来多长时间内到期的重试（秒），应大于加载间隔
+    RETRY_LOAD_LIMIT: int = 1000  # 每次最多加载的重试数
+
+    # 定时触发配置（TriggerType.SCHEDULE任务，多实例时由主节点触发）
+    CRON_TIMEZONE: str = "Asia/Shanghai"  # cron表达式未指定timezone时使用的时区
+    CRON_SYNC_INTERVAL: float = 30.0  # 增量同步任务调度配置的间隔（秒）
+    CRON_MISFIRE_GRACE: float = 60.0  # 计划时间过去多久视为错过（秒）
+    CRON_MISFIRE_POLICY: str = "fire_once"  # 错过触发的默认处理：skip / fire_once / fire_all
+    CRON_MAX_CATCHUP: int = 10  # fire_all策略下连续补触发的最大次数
+    CRON_LEADER_TTL: float = 15.0  # 主节点租约（秒）
+
+    # 执行队列配置
+    JOB_QUEUE_BACKEND: str = "celery"  # celery / postgres（基于task_executions表的SKIP LOCKED队列，适合小规模部署和低延迟任务）/ scheduler（按任务加权公平调度）
+    JOB_QUEUE_CONCURRENCY: int = 8  # postgres队列每个worker同时运行的执行数
+    JOB_QUEUE_LEASE_SECONDS: int = 60  # 认领租约时长，worker定期续约，过期未续约的执行重新入队
+    JOB_QUEUE_POLL_INTERVAL: float = 5.0  # 未收到通知时的兜底轮询间隔（秒）
+    JOB_QUEUE_CHANNEL: str = "task_executions"  # LISTEN/NOTIFY频道
+
+    # 执行调度配置（JOB_QUEUE_BACKEND=scheduler，按任务加权公平调度，任务并发上限跨实例生效）
+    SCHEDULER_MAX_RUNNING: int = 16  # 每个调度实例同时运行的执行数上限
+    SCHEDULER_POLL_INTERVAL: float = 1.0  # 拉取待执行记录的间隔（秒）
+    SCHEDULER_FETCH_LIMIT: int = 500  # 每轮最多拉取的待执行记录数
+    SCHEDULER_LOAD_LAG: float = 10.0  # 增量拉取时入队时间水位回退的秒数，覆盖提交较晚的事务
+
+    # 流水线执行配置（各执行步骤独立的worker池，步骤之间用有界队列衔接）
+    PIPELINE_QUEUE_SIZE: int = 32  # 每个步骤的输入队列容量，满时阻塞上游
+    PIPELINE_PARSE_WORKERS: int = 2
+    PIPELINE_DOWNLOAD_WORKERS: int = 4
+    PIPELINE_AI_WORKERS: int = 8
+    PIPELINE_WRITE_WORKERS: int = 4
+
+    # 沙箱进程池配置（文件内容提取等重负载作业在独立进程中按作业限制资源）
+    SANDBOX_WORKERS: int = 2  # 预先启动的沙箱进程数
+    SANDBOX_MAX_JOBS_PER_WORKER: int = 100  # 沙箱进程运行多少个作业后回收
+    SANDBOX_RECYCLE_RSS_MB: int = 512  # 沙箱进程常驻内存超过该值时回收（MB）
+    SANDBOX_DEFAULT_MEMORY_MB: int = 1024  # 任务未设置max_memory_usage时每个作业的内存上限（MB）
+    SANDBOX_CPU_SECONDS: int = 120  # 每个作业的CPU时间上限（秒）
+
+    # 执行日志配置（日志逐条写入execution_logs表）
+    EXECUTION_LOG_LIMIT: int = 1000  # 每个执行保留的日志条数上限，超出时删除最早的日志
+    EXECUTION_LOG_TAIL: int = 100  # 执行详情中返回的最近日志条数
+
+    # 执行大字段存储配置（超过阈值的触发数据、AI请求/响应等压缩后存入execution_payloads表）
+    PAYLOAD_OFFLOAD_THRESHOLD: int = 16 * 1024  # 序列化后超过该大小（字节）的值转存
+    PAYLOAD_COMPRESSION_LEVEL: int = 3  # zstd压缩级别（未安装zstandard时使用zlib，级别6）
+
+    # 执行单飞去重配置（同一任务版本、同一文件的并发执行只下载和分析一次）
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 5.0  # follower检查leader登记的间隔（秒），兜底丢失的结束消息
+    SINGLE_FLIGHT_LEASE_SECONDS: float = 30.0  # leader登记的租约（秒），leader运行期间定期续约，崩溃后在一个租约内过期
     
     # 邮件配置（可选）
     SMTP_TLS: bool = True
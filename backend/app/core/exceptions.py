@@ -0,0 +1,71 @@
+"""平台异常定义
+
+业务服务层抛出的异常类型，API层可据此转换为合适的HTTP响应。
+"""
+
+from typing import Any, Dict, Optional
+
+
+class PlatformError(Exception):
+    """平台基础异常"""
+
+    error_code = "PLATFORM_ERROR"
+
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.message = message
+        self.details = details or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（用于写入TaskExecution.error_details）"""
+        return {
+            "error_code": self.error_code,
+            "message": self.message,
+            "details": self.details,
+        }
+
+
+class AIServiceError(PlatformError):
+    """AI调用异常"""
+
+    error_code = "AI_SERVICE_ERROR"
+
+
+class ConcurrencyLimitTimeout(AIServiceError):
+    """等待模型并发名额超时"""
+
+    error_code = "AI_CONCURRENCY_TIMEOUT"
+
+
+class CircuitOpenError(AIServiceError):
+    """模型熔断中，请求被快速拒绝"""
+
+    error_code = "AI_CIRCUIT_OPEN"
+
+
+class FeishuAPIError(PlatformError):
+    """飞书接口调用异常"""
+
+    error_code = "FEISHU_API_ERROR"
+
+    def __init__(self, message: str, status_code: Optional[int] = None, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message, details)
+        self.status_code = status_code
+
+
+class ExecutionTimeout(PlatformError):
+    """执行超过截止时间"""
+
+    error_code = "EXECUTION_TIMEOUT"
+
+
+class ExecutionCancelled(PlatformError):
+    """执行被请求取消"""
+
+    error_code = "EXECUTION_CANCELLED"
+
+
+class SandboxError(PlatformError):
+    """沙箱进程中的作业失败（超出资源限制或进程异常退出）"""
+
+    error_code = "SANDBOX_ERROR"
@@ -0,0 +1,39 @@
+"""Prometheus监控指标
+
+指标在各进程内注册：API进程通过 /metrics 暴露，
+后台worker进程调用 start_metrics_server() 在 METRICS_PORT 上暴露。
+"""
+
+import logging
+
+from prometheus_client import Counter, Gauge, start_http_server
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# AI模型自适应并发
+AI_CONCURRENCY_LIMIT = Gauge(
+    "ai_model_concurrency_limit",
+    "AI模型当前的自适应并发上限",
+    ["model_id"],
+)
+AI_CONCURRENCY_ADJUSTMENTS = Counter(
+    "ai_model_concurrency_adjustments_total",
+    "AI模型自适应并发上限调整次数",
+    ["model_id", "direction", "reason"],
+)
+
+
+def start_metrics_server(port: int = None) -> bool:
+    """在独立端口上暴露指标（用于没有HTTP服务的worker进程）"""
+    if not settings.ENABLE_METRICS:
+        return False
+    port = port or settings.METRICS_PORT
+    try:
+        start_http_server(port)
+    except OSError as e:
+        logger.warning(f"启动指标服务失败，端口{port}: {e}")
+        return False
+    logger.info(f"指标服务已启动，端口{port}")
+    return True
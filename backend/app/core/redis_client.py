@@ -0,0 +1,56 @@
+"""Redis连接管理
+
+提供进程内共享的Redis客户端，供分布式协调（并发控制、缓存等）使用。
+"""
+
+import logging
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_sync_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """获取同步Redis客户端（懒加载）"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.get_redis_url(), decode_responses=True)
+        logger.debug("创建同步Redis客户端")
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """获取异步Redis客户端（懒加载）"""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.get_redis_url(), decode_responses=True)
+        logger.debug("创建异步Redis客户端")
+    return _async_client
+
+
+async def close_redis():
+    """关闭Redis客户端"""
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def check_redis_connection() -> bool:
+    """检查Redis连接是否正常"""
+    try:
+        get_redis().ping()
+        return True
+    except Exception as e:
+        logger.error(f"Redis连接失败: {e}")
+        return False
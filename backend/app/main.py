@@ -259,6 +259,17 @@ async def health_check():
     }
 
 
+# 监控指标端点
+if settings.ENABLE_METRICS:
+    @app.get("/metrics", tags=["监控"], include_in_schema=False)
+    async def metrics():
+        """Prometheus指标接口"""
+        from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+        from app.core import metrics as _metrics  # noqa: F401  确保指标已注册
+
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # 根路径
 @app.get("/", tags=["根路径"])
 async def root():
@@ -0,0 +1,10 @@
+"""本地替身服务包
+
+提供与外部服务接口兼容的本地模拟服务，用于离线联调和性能测试，不在生产环境中使用：
+
+- llm_server      聊天补全（耗时分布、Token数、流式输出、429注入、提示词缓存）
+- batch_server    离线批量推理
+- storage_server  网盘存储（HTTP/WebDAV/FTP）
+- feishu_server   飞书访问凭证与工作项更新
+- stack           一次启动以上全部服务
+"""
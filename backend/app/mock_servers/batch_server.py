@@ -0,0 +1,134 @@
+"""OpenAI兼容的批量推理替身服务
+
+实现 Files 与 Batches 接口的最小子集：
+
+- POST /v1/files                  上传批次输入文件（multipart，purpose=batch）
+- POST /v1/batches                创建批次
+- GET  /v1/batches/{batch_id}     查询批次状态
+- GET  /v1/files/{file_id}/content 下载批次输出文件
+
+批次在创建后经过 MOCK_BATCH_DELAY_SECONDS 秒自动完成，每个请求返回固定回复
+MOCK_BATCH_REPLY。启动方式：
+
+    python -m app.mock_servers.batch_server --port 9101
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+
+BATCH_DELAY_SECONDS = float(os.getenv("MOCK_BATCH_DELAY_SECONDS", "2"))
+BATCH_REPLY = os.getenv("MOCK_BATCH_REPLY", "通过")
+
+app = FastAPI(title="Mock Batch API")
+
+_files: Dict[str, bytes] = {}
+_batches: Dict[str, Dict[str, Any]] = {}
+
+
+def _completion_body(request_body: dict) -> dict:
+    """为单个请求生成聊天补全响应"""
+    prompt_chars = sum(len(m.get("content") or "") for m in request_body.get("messages", []))
+    prompt_tokens = max(prompt_chars // 2, 1)
+    completion_tokens = max(len(BATCH_REPLY) // 2, 1)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request_body.get("model", "mock-model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": BATCH_REPLY},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _complete_batch(batch: Dict[str, Any]):
+    """处理批次输入并生成输出文件"""
+    lines = []
+    for raw in _files[batch["input_file_id"]].decode("utf-8").splitlines():
+        if not raw.strip():
+            continue
+        request = json.loads(raw)
+        lines.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": _completion_body(request.get("body") or {})},
+            "error": None,
+        }, ensure_ascii=False))
+
+    output_file_id = f"file-{uuid.uuid4().hex[:16]}"
+    _files[output_file_id] = "\n".join(lines).encode("utf-8")
+    batch.update({
+        "status": "completed",
+        "output_file_id": output_file_id,
+        "completed_at": int(time.time()),
+        "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+    })
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form("batch")):
+    file_id = f"file-{uuid.uuid4().hex[:16]}"
+    _files[file_id] = await file.read()
+    return {"id": file_id, "object": "file", "purpose": purpose, "bytes": len(_files[file_id])}
+
+
+@app.post("/v1/batches")
+async def create_batch(body: Dict[str, Any]):
+    input_file_id = body.get("input_file_id")
+    if input_file_id not in _files:
+        raise HTTPException(status_code=404, detail="input file not found")
+
+    batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+    _batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body.get("endpoint"),
+        "input_file_id": input_file_id,
+        "completion_window": body.get("completion_window", "24h"),
+        "status": "in_progress",
+        "output_file_id": None,
+        "error_file_id": None,
+        "created_at": int(time.time()),
+    }
+    return _batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    batch = _batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= BATCH_DELAY_SECONDS:
+        _complete_batch(batch)
+    return batch
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+async def get_file_content(file_id: str):
+    if file_id not in _files:
+        raise HTTPException(status_code=404, detail="file not found")
+    return _files[file_id].decode("utf-8")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="批量推理替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
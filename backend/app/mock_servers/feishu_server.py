@@ -0,0 +1,172 @@
+"""飞书开放接口替身服务
+
+覆盖访问凭证和工作项更新接口：
+
+- POST /open-apis/auth/v3/tenant_access_token/internal      获取tenant_access_token
+- POST /open_api/authen/plugin_token                         获取飞书项目插件token
+- PUT  /open_api/{project_key}/work_item/{type_key}/{id}     更新工作项字段（X-PLUGIN-TOKEN鉴权）
+- GET  /mock/work_items/{id}                                 查看替身服务中工作项的当前字段
+- GET  /stats                                                调用统计
+
+token有效期为 MOCK_FEISHU_TOKEN_TTL 秒，过期token调用更新接口返回鉴权错误；
+MOCK_FEISHU_LATENCY 为耗时分布（格式见llm_server），MOCK_FEISHU_ERROR_RATE 为随机返回429的比例。
+启动方式：
+
+    python -m app.mock_servers.feishu_server --port 9104
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
+
+from app.mock_servers.llm_server import Distribution
+
+# 飞书项目接口的token失效错误码
+TOKEN_INVALID_CODE = 10022
+
+
+@dataclass
+class MockFeishuConfig:
+    """替身服务配置"""
+
+    token_ttl: int = int(os.getenv("MOCK_FEISHU_TOKEN_TTL", "7200"))
+    latency: str = os.getenv("MOCK_FEISHU_LATENCY", "constant:0.05")
+    error_rate: float = float(os.getenv("MOCK_FEISHU_ERROR_RATE", "0"))
+    seed: int = int(os.getenv("MOCK_FEISHU_SEED", "42"))
+
+    def __post_init__(self):
+        self.latency_distribution = Distribution(self.latency)
+
+
+class MockFeishuState:
+    """token、工作项与调用统计"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.tokens: Dict[str, float] = {}
+        self.work_items: Dict[str, Dict[str, Any]] = {}
+        self.calls: Counter = Counter()
+
+
+config = MockFeishuConfig()
+state = MockFeishuState(config.seed)
+
+app = FastAPI(title="Mock Feishu Open API")
+
+
+def configure(**kwargs):
+    """进程内修改配置并重置状态"""
+    global config, state
+    config = MockFeishuConfig(**kwargs)
+    state = MockFeishuState(config.seed)
+
+
+async def _simulate(endpoint: str) -> Optional[JSONResponse]:
+    """记录调用、模拟耗时，按比例注入429"""
+    state.calls[endpoint] += 1
+    await asyncio.sleep(config.latency_distribution.sample(state.rng))
+    if config.error_rate and state.rng.random() < config.error_rate:
+        state.calls[f"{endpoint}:429"] += 1
+        return JSONResponse(status_code=429, content={"err_code": 429, "err_msg": "too many requests"})
+    return None
+
+
+def _issue_token(prefix: str) -> str:
+    token = f"{prefix}-{uuid.uuid4().hex}"
+    state.tokens[token] = time.time() + config.token_ttl
+    return token
+
+
+@app.post("/open-apis/auth/v3/tenant_access_token/internal")
+async def tenant_access_token(body: Dict[str, Any]):
+    error = await _simulate("tenant_access_token")
+    if error is not None:
+        return error
+    if not body.get("app_id") or not body.get("app_secret"):
+        return {"code": 10003, "msg": "invalid app_id or app_secret"}
+    return {
+        "code": 0,
+        "msg": "ok",
+        "tenant_access_token": _issue_token("t"),
+        "expire": config.token_ttl,
+    }
+
+
+@app.post("/open_api/authen/plugin_token")
+async def plugin_token(body: Dict[str, Any]):
+    error = await _simulate("plugin_token")
+    if error is not None:
+        return error
+    if not body.get("plugin_id") or not body.get("plugin_secret"):
+        return {"data": None, "error": {"code": 10003, "msg": "invalid plugin_id or plugin_secret"}}
+    return {
+        "data": {"token": _issue_token("p"), "expire_time": config.token_ttl},
+        "error": {"code": 0, "msg": "success"},
+    }
+
+
+@app.put("/open_api/{project_key}/work_item/{work_item_type_key}/{work_item_id}")
+async def update_work_item(
+    project_key: str,
+    work_item_type_key: str,
+    work_item_id: str,
+    body: Dict[str, Any],
+    x_plugin_token: Optional[str] = Header(None),
+    x_user_key: Optional[str] = Header(None),
+):
+    error = await _simulate("update_work_item")
+    if error is not None:
+        return error
+
+    expires_at = state.tokens.get(x_plugin_token or "")
+    if expires_at is None or expires_at < time.time():
+        state.calls["update_work_item:token_invalid"] += 1
+        return JSONResponse(
+            status_code=401,
+            content={"err_code": TOKEN_INVALID_CODE, "err_msg": "token invalid or expired", "data": None},
+        )
+
+    item = state.work_items.setdefault(work_item_id, {
+        "project_key": project_key,
+        "work_item_type_key": work_item_type_key,
+        "fields": {},
+        "updates": 0,
+    })
+    for field in body.get("update_fields") or []:
+        item["fields"][field.get("field_key")] = field.get("field_value")
+    item["updates"] += 1
+    item["updated_by"] = x_user_key
+    return {"err_code": 0, "err_msg": "", "data": {}}
+
+
+@app.get("/mock/work_items/{work_item_id}")
+async def get_work_item(work_item_id: str):
+    item = state.work_items.get(work_item_id)
+    if item is None:
+        return JSONResponse(status_code=404, content={"detail": "work item not found"})
+    return item
+
+
+@app.get("/stats")
+async def stats():
+    """调用统计"""
+    return {"calls": dict(state.calls), "work_items": len(state.work_items), "tokens_issued": len(state.tokens)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="飞书开放接口替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9104)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
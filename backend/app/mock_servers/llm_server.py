@@ -0,0 +1,271 @@
+"""OpenAI兼容的聊天补全替身服务
+
+实现 POST /v1/chat/completions（含 stream=true 的SSE流式输出），用于在本地压测AI调用链路：
+
+- 耗时分布：MOCK_LLM_LATENCY，如 "constant:0.2"、"uniform:0.1,0.5"、"normal:0.3,0.05"、
+  "lognormal:0.3,0.5"（中位数,对数标准差）、"exponential:0.3"；流式输出时为首Token延迟；
+- 输出Token数：MOCK_LLM_COMPLETION_TOKENS，格式同耗时分布（取整），流式输出速度 MOCK_LLM_TOKENS_PER_SECOND；
+- 容量：同时处理的请求数达到当前容量时返回429，耗时随负载升高（乘以 1 + 在途请求数 / 容量）。
+  容量按时间表变化，格式为"起始秒:容量"，逗号分隔，例如 "0:8,30:3,60:12"；
+- 429注入：MOCK_LLM_ERROR_RATE 为随机返回429的比例；
+- 提示词缓存：与之前请求相同的提示词前缀（按256字符分块）在usage.prompt_tokens_details.cached_tokens中返回。
+
+随机数使用固定种子（MOCK_LLM_SEED），同样的请求序列得到同样的结果。启动方式：
+
+    MOCK_LLM_LATENCY=lognormal:0.3,0.5 python -m app.mock_servers.llm_server --port 9102
+
+也可在进程内通过 configure() 调整配置后，用uvicorn.Server在同一事件循环中启动。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 提示词缓存的分块大小（字符）
+PREFIX_BLOCK_CHARS = 256
+
+
+def parse_schedule(value: str) -> List[Tuple[float, int]]:
+    """解析容量时间表"""
+    schedule = []
+    for item in value.split(","):
+        if item.strip():
+            start, capacity = item.split(":")
+            schedule.append((float(start), int(capacity)))
+    return sorted(schedule) or [(0.0, 8)]
+
+
+class Distribution:
+    """随机分布，格式为 "类型:参数1,参数2" """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("constant", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"不支持的分布类型: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "constant":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(p[0]), p[1])
+        else:
+            value = rng.expovariate(1 / p[0])
+        return max(value, 0.0)
+
+
+@dataclass
+class MockLLMConfig:
+    """替身服务配置"""
+
+    capacity_schedule: List[Tuple[float, int]] = field(
+        default_factory=lambda: parse_schedule(os.getenv("MOCK_LLM_CAPACITY_SCHEDULE", "0:1000"))
+    )
+    latency: str = os.getenv("MOCK_LLM_LATENCY", "constant:0.2")
+    completion_tokens: str = os.getenv("MOCK_LLM_COMPLETION_TOKENS", "constant:20")
+    tokens_per_second: float = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50"))
+    error_rate: float = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+    reply: str = os.getenv("MOCK_LLM_REPLY", "通过")
+    seed: int = int(os.getenv("MOCK_LLM_SEED", "42"))
+
+    def __post_init__(self):
+        self.latency_distribution = Distribution(self.latency)
+        self.tokens_distribution = Distribution(self.completion_tokens)
+
+
+class MockLLMState:
+    """运行状态与统计"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.started_at = time.monotonic()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.injected_errors = 0
+        self.prefix_blocks: Set[str] = set()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+config = MockLLMConfig()
+state = MockLLMState(config.seed)
+
+app = FastAPI(title="Mock LLM API")
+
+
+def configure(**kwargs):
+    """进程内修改配置并重置状态"""
+    global config, state
+    config = MockLLMConfig(**kwargs)
+    state = MockLLMState(config.seed)
+
+
+def current_capacity() -> int:
+    """按时间表取当前容量"""
+    elapsed = state.elapsed()
+    capacity = config.capacity_schedule[0][1]
+    for start, value in config.capacity_schedule:
+        if elapsed >= start:
+            capacity = value
+    return capacity
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    return "".join(f"{m.get('role')}:{m.get('content') or ''}\n" for m in body.get("messages", []))
+
+
+def _cached_chars(prompt: str) -> int:
+    """计算与历史请求相同的前缀长度（按块），并记录本次请求的前缀块"""
+    digest = hashlib.sha256()
+    cached = 0
+    matching = True
+    for end in range(PREFIX_BLOCK_CHARS, len(prompt) + 1, PREFIX_BLOCK_CHARS):
+        digest.update(prompt[end - PREFIX_BLOCK_CHARS:end].encode("utf-8"))
+        block = digest.hexdigest()
+        if matching and block in state.prefix_blocks:
+            cached = end
+        else:
+            matching = False
+            state.prefix_blocks.add(block)
+    return cached
+
+
+def _usage(prompt: str, completion_tokens: int) -> Dict[str, Any]:
+    prompt_tokens = max(len(prompt) // 2, 1)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": _cached_chars(prompt) // 2},
+    }
+
+
+def _reply_tokens(count: int) -> List[str]:
+    """生成指定数量的输出片段（每个片段视为一个Token），以固定回复开头"""
+    tokens = list(config.reply)
+    while len(tokens) < count:
+        tokens.append("。" if len(tokens) % 20 == 19 else "好")
+    return tokens[:max(count, 1)]
+
+
+def _rate_limited(message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"type": "rate_limit_exceeded", "message": message}},
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _stream(body: Dict[str, Any], prompt: str, tokens: List[str], delay: float):
+    """SSE流式输出，结束后释放在途名额"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = body.get("model", "mock-model")
+    try:
+        await asyncio.sleep(delay)
+        interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(interval)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [], "usage": _usage(prompt, len(tokens))}
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+        state.completed += 1
+    finally:
+        state.in_flight -= 1
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: Dict[str, Any]):
+    capacity = current_capacity()
+    if state.in_flight >= capacity:
+        state.rejected += 1
+        return _rate_limited("too many concurrent requests")
+    if config.error_rate and state.rng.random() < config.error_rate:
+        state.injected_errors += 1
+        return _rate_limited("injected rate limit")
+
+    state.in_flight += 1
+    delay = config.latency_distribution.sample(state.rng) * (1 + state.in_flight / capacity)
+    tokens = _reply_tokens(int(config.tokens_distribution.sample(state.rng)))
+    prompt = _prompt_text(body)
+
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, prompt, tokens, delay), media_type="text/event-stream")
+
+    try:
+        await asyncio.sleep(delay)
+        state.completed += 1
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt, len(tokens)),
+        }
+    finally:
+        state.in_flight -= 1
+
+
+@app.get("/stats")
+async def stats():
+    """替身服务统计"""
+    return {
+        "elapsed": round(state.elapsed(), 3),
+        "capacity": current_capacity(),
+        "in_flight": state.in_flight,
+        "completed": state.completed,
+        "rejected": state.rejected,
+        "injected_errors": state.injected_errors,
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="聊天补全替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9102)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,164 @@
+"""本地替身服务组合
+
+一次启动聊天补全、离线批量、网盘存储（HTTP/WebDAV，可选FTP）与飞书接口替身服务，
+可在当前事件循环内运行（压测脚本使用），也可作为子进程运行：
+
+    async with MockStack() as stack:
+        model.api_endpoint = stack.urls["llm"]
+        ...
+
+    python -m app.mock_servers.stack             # 子进程方式启动全部服务，Ctrl+C停止
+"""
+
+import argparse
+import asyncio
+import importlib
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+# 服务名 -> (模块, 默认端口)
+SERVICES = {
+    "batch": ("app.mock_servers.batch_server", 9101),
+    "llm": ("app.mock_servers.llm_server", 9102),
+    "storage": ("app.mock_servers.storage_server", 9103),
+    "feishu": ("app.mock_servers.feishu_server", 9104),
+}
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 10.0):
+    """等待端口可连接"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            sock.settimeout(0.2)
+            if sock.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.05)
+    raise TimeoutError(f"替身服务未在{timeout}秒内启动: {host}:{port}")
+
+
+class MockStack:
+    """替身服务组合"""
+
+    def __init__(
+        self,
+        services: Optional[List[str]] = None,
+        host: str = "127.0.0.1",
+        ports: Optional[Dict[str, int]] = None,
+        ftp_port: int = 0,
+    ):
+        self.services = services or list(SERVICES)
+        self.host = host
+        self.ports = {name: (ports or {}).get(name, SERVICES[name][1]) for name in self.services}
+        self.ftp_port = ftp_port
+        self._servers: List[uvicorn.Server] = []
+        self._tasks: List[asyncio.Task] = []
+        self._processes: List[subprocess.Popen] = []
+        self._ftp = None
+
+    @property
+    def urls(self) -> Dict[str, str]:
+        """各服务的访问地址"""
+        base = {name: f"http://{self.host}:{port}" for name, port in self.ports.items()}
+        urls = {}
+        if "llm" in base:
+            urls["llm"] = f"{base['llm']}/v1/chat/completions"
+        if "batch" in base:
+            urls["batch"] = f"{base['batch']}/v1/chat/completions"
+        if "storage" in base:
+            urls["storage_http"] = f"{base['storage']}/files"
+            urls["storage_webdav"] = f"{base['storage']}/webdav"
+            urls["storage_synthetic"] = f"{base['storage']}/synthetic"
+        if "feishu" in base:
+            urls["feishu_open_api"] = f"{base['feishu']}/open-apis"
+            urls["feishu_project"] = base["feishu"]
+        if self.ftp_port:
+            urls["storage_ftp"] = f"ftp://{self.host}:{self.ftp_port}"
+        return urls
+
+    async def start(self):
+        """在当前事件循环中启动"""
+        for name in self.services:
+            module = importlib.import_module(SERVICES[name][0])
+            server = uvicorn.Server(uvicorn.Config(
+                module.app, host=self.host, port=self.ports[name], log_level="warning", lifespan="off"
+            ))
+            self._servers.append(server)
+            self._tasks.append(asyncio.create_task(server.serve()))
+
+        for server in self._servers:
+            while not server.started:
+                await asyncio.sleep(0.02)
+        self._start_ftp()
+
+    async def stop(self):
+        for server in self._servers:
+            server.should_exit = True
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._servers.clear()
+        self._tasks.clear()
+        self._stop_ftp()
+
+    def start_subprocesses(self):
+        """以子进程方式启动"""
+        for name in self.services:
+            command = [sys.executable, "-m", SERVICES[name][0], "--host", self.host, "--port", str(self.ports[name])]
+            self._processes.append(subprocess.Popen(command))
+        for name in self.services:
+            _wait_for_port(self.host, self.ports[name])
+        self._start_ftp()
+
+    def stop_subprocesses(self):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes.clear()
+        self._stop_ftp()
+
+    def _start_ftp(self):
+        if self.ftp_port:
+            from app.mock_servers.storage_server import start_ftp_server
+
+            self._ftp = start_ftp_server(self.host, self.ftp_port)
+
+    def _stop_ftp(self):
+        if self._ftp is not None:
+            self._ftp.close_all()
+            self._ftp = None
+
+    async def __aenter__(self) -> "MockStack":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动本地替身服务组合")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--services", default=",".join(SERVICES), help="逗号分隔的服务名")
+    parser.add_argument("--ftp-port", type=int, default=0, help="大于0时同时启动FTP服务")
+    args = parser.parse_args()
+
+    stack = MockStack(services=args.services.split(","), host=args.host, ftp_port=args.ftp_port)
+    stack.start_subprocesses()
+    for name, url in stack.urls.items():
+        print(f"{name:<20}{url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stack.stop_subprocesses()
@@ -0,0 +1,217 @@
+"""网盘存储替身服务
+
+以本地目录为根，提供HTTP和WebDAV两种访问方式，另可启动FTP服务（需安装pyftpdlib）：
+
+- GET  /files/{path}               HTTP下载
+- OPTIONS / PROPFIND / GET / PUT / DELETE  /webdav/{path}   WebDAV最小子集（PROPFIND支持Depth 0/1）
+- GET  /synthetic/{size}           按大小生成内容固定的合成文件（如 /synthetic/10MB），无需准备测试数据
+
+MOCK_STORAGE_LATENCY 为每个请求附加的首字节延迟（秒），MOCK_STORAGE_BANDWIDTH 为限速（字节/秒，0不限速）。
+启动方式：
+
+    MOCK_STORAGE_ROOT=/tmp/mock_storage python -m app.mock_servers.storage_server --port 9103 --ftp-port 2121
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from xml.sax.saxutils import escape
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_SIZE_PATTERN = re.compile(r"^(\d+)(B|KB|MB|GB)?$", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+@dataclass
+class MockStorageConfig:
+    """替身服务配置"""
+
+    root: Path = field(default_factory=lambda: Path(os.getenv("MOCK_STORAGE_ROOT", "/tmp/mock_storage")))
+    latency: float = float(os.getenv("MOCK_STORAGE_LATENCY", "0"))
+    bandwidth: int = int(os.getenv("MOCK_STORAGE_BANDWIDTH", "0"))
+
+    def __post_init__(self):
+        self.root = Path(self.root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+
+config = MockStorageConfig()
+
+app = FastAPI(title="Mock Storage")
+
+
+def configure(**kwargs):
+    """进程内修改配置"""
+    global config
+    config = MockStorageConfig(**kwargs)
+
+
+def _resolve(path: str) -> Path:
+    """把请求路径映射到根目录下，拒绝越界访问"""
+    target = (config.root / path.lstrip("/")).resolve()
+    if target != config.root.resolve() and config.root.resolve() not in target.parents:
+        raise HTTPException(status_code=403, detail="path outside storage root")
+    return target
+
+
+async def _throttle(chunks) -> AsyncIterator[bytes]:
+    """按配置的延迟和带宽输出内容"""
+    if config.latency:
+        await asyncio.sleep(config.latency)
+    for chunk in chunks:
+        yield chunk
+        if config.bandwidth:
+            await asyncio.sleep(len(chunk) / config.bandwidth)
+
+
+def _file_chunks(path: Path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _synthetic_chunks(size: int, seed: str):
+    """生成内容由大小和种子决定的合成数据"""
+    block = hashlib.sha256(seed.encode("utf-8")).digest() * (CHUNK_SIZE // 32)
+    remaining = size
+    while remaining > 0:
+        yield block[:min(remaining, CHUNK_SIZE)]
+        remaining -= CHUNK_SIZE
+
+
+def _download(path: Path) -> StreamingResponse:
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="file not found")
+    return StreamingResponse(
+        _throttle(_file_chunks(path)),
+        media_type="application/octet-stream",
+        headers={"Content-Length": str(path.stat().st_size)},
+    )
+
+
+@app.get("/files/{path:path}")
+async def http_get(path: str):
+    return _download(_resolve(path))
+
+
+@app.get("/synthetic/{size}")
+async def synthetic(size: str, seed: str = "mock"):
+    match = _SIZE_PATTERN.match(size)
+    if not match:
+        raise HTTPException(status_code=400, detail="size must look like 1024, 512KB or 10MB")
+    total = int(match.group(1)) * _SIZE_UNITS[(match.group(2) or "B").upper()]
+    return StreamingResponse(
+        _throttle(_synthetic_chunks(total, seed)),
+        media_type="application/octet-stream",
+        headers={"Content-Length": str(total)},
+    )
+
+
+def _propfind_entry(href: str, path: Path) -> str:
+    stat = path.stat()
+    if path.is_dir():
+        resource_type = "<D:resourcetype><D:collection/></D:resourcetype>"
+        length = ""
+    else:
+        resource_type = "<D:resourcetype/>"
+        length = f"<D:getcontentlength>{stat.st_size}</D:getcontentlength>"
+    return (
+        f"<D:response><D:href>{escape(href)}</D:href><D:propstat><D:prop>"
+        f"<D:displayname>{escape(path.name)}</D:displayname>{resource_type}{length}"
+        f"<D:getlastmodified>{formatdate(stat.st_mtime, usegmt=True)}</D:getlastmodified>"
+        f"</D:prop><D:status>HTTP/1.1 200 OK</D:status></D:propstat></D:response>"
+    )
+
+
+@app.api_route("/webdav/{path:path}", methods=["OPTIONS", "PROPFIND", "GET", "PUT", "DELETE"])
+async def webdav(path: str, request: Request):
+    target = _resolve(path)
+
+    if request.method == "OPTIONS":
+        return Response(headers={"DAV": "1", "Allow": "OPTIONS, PROPFIND, GET, PUT, DELETE"})
+
+    if request.method == "GET":
+        return _download(target)
+
+    if request.method == "PUT":
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+        return Response(status_code=201)
+
+    if request.method == "DELETE":
+        if not target.exists():
+            raise HTTPException(status_code=404, detail="not found")
+        target.unlink()
+        return Response(status_code=204)
+
+    # PROPFIND
+    if not target.exists():
+        raise HTTPException(status_code=404, detail="not found")
+    base = "/webdav/" + path.strip("/")
+    entries = [_propfind_entry(base, target)]
+    if target.is_dir() and request.headers.get("Depth", "1") != "0":
+        for child in sorted(target.iterdir()):
+            entries.append(_propfind_entry(f"{base.rstrip('/')}/{child.name}", child))
+    body = '<?xml version="1.0" encoding="utf-8"?><D:multistatus xmlns:D="DAV:">' + "".join(entries) + "</D:multistatus>"
+    return Response(content=body, status_code=207, media_type="application/xml; charset=utf-8")
+
+
+def start_ftp_server(
+    host: str = "127.0.0.1",
+    port: int = 2121,
+    root: Optional[Path] = None,
+    username: str = "mock",
+    password: str = "mock",
+):
+    """在后台线程启动FTP服务，返回服务对象（调用close_all()停止）"""
+    try:
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.servers import FTPServer
+    except ImportError as e:
+        raise RuntimeError("FTP替身服务需要安装pyftpdlib") from e
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(username, password, str(root or config.root), perm="elradfmw")
+    authorizer.add_anonymous(str(root or config.root))
+    handler = type("MockFTPHandler", (FTPHandler,), {"authorizer": authorizer})
+    if config.bandwidth:
+        from pyftpdlib.handlers import ThrottledDTPHandler
+
+        handler.dtp_handler = type("MockDTPHandler", (ThrottledDTPHandler,), {
+            "read_limit": config.bandwidth,
+            "write_limit": config.bandwidth,
+        })
+
+    server = FTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, kwargs={"handle_exit": False}, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="网盘存储替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9103)
+    parser.add_argument("--ftp-port", type=int, default=0, help="大于0时同时启动FTP服务")
+    args = parser.parse_args()
+    if args.ftp_port:
+        start_ftp_server(args.host, args.ftp_port)
+    uvicorn.run(app, host=args.host, port=args.port)
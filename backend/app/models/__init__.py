@@ -15,6 +15,11 @@ from .analysis_task import AnalysisTask
 from .task_execution import TaskExecution
 from .webhook_log import WebhookLog
 from .system_config import SystemConfig
+from .write_back_record import WriteBackRecord
+from .execution_log import ExecutionLog
+from .execution_span import ExecutionSpan
+from .config_snapshot import ConfigSnapshot
+from .execution_payload import ExecutionPayload
 
 # 导出所有模型
 __all__ = [
@@ -27,6 +32,11 @@ __all__ = [
     "TaskExecution",
     "WebhookLog",
     "SystemConfig",
+    "WriteBackRecord",
+    "ExecutionLog",
+    "ExecutionSpan",
+    "ConfigSnapshot",
+    "ExecutionPayload",
 ]
 
 # 版本信息
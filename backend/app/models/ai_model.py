@@ -51,6 +51,7 @@ class AIModel(Base):
     supports_function_calling = Column(Boolean, default=False, comment="是否支持函数调用")
     supports_vision = Column(Boolean, default=False, comment="是否支持视觉理解")
     supports_multimodal = Column(Boolean, default=False, comment="是否支持多模态")
+    supports_batch = Column(Boolean, default=False, comment="是否支持离线批量推理")
     
     # 限制配置
     rate_limit_per_minute = Column(Integer, default=60, comment="每分钟请求限制")
@@ -60,6 +61,7 @@ class AIModel(Base):
     # 成本配置
     cost_per_1k_input_tokens = Column(String(20), comment="每1K输入token成本")
     cost_per_1k_output_tokens = Column(String(20), comment="每1K输出token成本")
+    cost_per_1k_cached_input_tokens = Column(String(20), comment="每1K命中提示词缓存的输入token成本")
     currency = Column(String(10), default="USD", comment="货币单位")
     
     # 状态字段
@@ -116,11 +118,13 @@ class AIModel(Base):
             "supports_function_calling": self.supports_function_calling,
             "supports_vision": self.supports_vision,
             "supports_multimodal": self.supports_multimodal,
+            "supports_batch": self.supports_batch,
             "rate_limit_per_minute": self.rate_limit_per_minute,
             "rate_limit_per_day": self.rate_limit_per_day,
             "max_concurrent_requests": self.max_concurrent_requests,
             "cost_per_1k_input_tokens": self.cost_per_1k_input_tokens,
             "cost_per_1k_output_tokens": self.cost_per_1k_output_tokens,
+            "cost_per_1k_cached_input_tokens": self.cost_per_1k_cached_input_tokens,
             "currency": self.currency,
             "is_active": self.is_active,
             "is_default": self.is_default,
@@ -166,14 +170,24 @@ class AIModel(Base):
         
         return params
     
-    def calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
-        """计算成本"""
+    def calculate_cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """计算成本
+
+        cached_tokens 为输入token中命中供应商提示词缓存的部分，按缓存价格计费；
+        未配置缓存价格时按普通输入价格计费。
+        """
         try:
             input_cost = 0.0
             output_cost = 0.0
             
             if self.cost_per_1k_input_tokens:
-                input_cost = (input_tokens / 1000) * float(self.cost_per_1k_input_tokens)
+                input_price = float(self.cost_per_1k_input_tokens)
+                cached_price = input_price
+                if self.cost_per_1k_cached_input_tokens:
+                    cached_price = float(self.cost_per_1k_cached_input_tokens)
+                cached_tokens = min(cached_tokens or 0, input_tokens)
+                input_cost = ((input_tokens - cached_tokens) / 1000) * input_price
+                input_cost += (cached_tokens / 1000) * cached_price
             
             if self.cost_per_1k_output_tokens:
                 output_cost = (output_tokens / 1000) * float(self.cost_per_1k_output_tokens)
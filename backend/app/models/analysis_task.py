@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -27,6 +27,10 @@ class AnalysisTask(Base):
     """分析任务模型"""
     
     __tablename__ = "analysis_tasks"
+    __table_args__ = (
+        # 定时触发调度器按更新时间增量同步任务配置
+        Index("ix_analysis_tasks_updated_at", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, comment="任务ID")
     name = Column(String(100), nullable=False, comment="任务名称")
@@ -48,6 +52,7 @@ class AnalysisTask(Base):
     )
     webhook_id = Column(Integer, ForeignKey("webhooks.id"), comment="关联的Webhook ID")
     schedule_config = Column(JSON, comment="定时任务配置")
+    last_scheduled_at = Column(DateTime(timezone=True), comment="上次定时触发的计划时间")
     
     # 数据解析配置
     data_parsing_config = Column(JSON, comment="数据解析配置")
@@ -113,6 +118,7 @@ class AnalysisTask(Base):
     avg_execution_time = Column(String(20), default="0.0", comment="平均执行时间（秒）")
     total_tokens_used = Column(Integer, default=0, comment="总使用token数")
     total_cost = Column(String(20), default="0.00", comment="总成本")
+    skipped_write_backs = Column(Integer, default=0, comment="因字段值未变化而省去的回写调用次数")
     
     # 最后执行信息
     last_execution_at = Column(DateTime(timezone=True), comment="最后执行时间")
@@ -198,6 +204,7 @@ class AnalysisTask(Base):
             "avg_execution_time": self.avg_execution_time,
             "total_tokens_used": self.total_tokens_used,
             "total_cost": self.total_cost,
+            "skipped_write_backs": self.skipped_write_backs,
             "last_execution_at": self.last_execution_at.isoformat() if self.last_execution_at else None,
             "last_success_at": self.last_success_at.isoformat() if self.last_success_at else None,
             "last_failure_at": self.last_failure_at.isoformat() if self.last_failure_at else None,
@@ -218,6 +225,7 @@ class AnalysisTask(Base):
         if include_config:
             data.update({
                 "schedule_config": self.schedule_config,
+                "last_scheduled_at": self.last_scheduled_at.isoformat() if self.last_scheduled_at else None,
                 "data_parsing_config": self.data_parsing_config,
                 "jsonpath_rules": self.jsonpath_rules,
                 "data_validation_rules": self.data_validation_rules,
@@ -314,6 +322,7 @@ class AnalysisTask(Base):
             "avg_execution_time": self.avg_execution_time,
             "total_tokens_used": self.total_tokens_used,
             "total_cost": self.total_cost,
+            "skipped_write_backs": self.skipped_write_backs,
             "last_execution_at": self.last_execution_at.isoformat() if self.last_execution_at else None,
             "last_execution_status": self.last_execution_status,
             "health_status": self.health_status,
@@ -0,0 +1,84 @@
+"""执行子表的追加缓冲
+
+执行日志、执行跨度等只追加的子表行先缓冲在 TaskExecution 对象上，执行所在会话flush或
+提交时按表一次批量插入（Core executemany，不取回主键），追加不会重写已有数据。
+会话回滚时与其他未提交的修改一样丢弃。
+表可以通过 on_rows_inserted() 注册插入后的回调（如按条数上限清理旧日志）。
+"""
+
+from typing import Callable, Dict
+
+from sqlalchemy import Table, event, insert
+from sqlalchemy.orm import Session, object_session
+
+# 会话中有待写入行的执行
+_PENDING_KEY = "pending_execution_rows"
+# 执行对象上的缓冲：{表: [行]}
+_BUFFER_ATTR = "_pending_rows"
+# 各表插入后的回调：{表: func(connection, execution_ids)}
+_AFTER_INSERT: Dict[Table, Callable] = {}
+
+
+def on_rows_inserted(table: Table, callback: Callable):
+    """注册表的插入后回调，参数为会话连接和本次写入了行的执行ID集合"""
+    _AFTER_INSERT[table] = callback
+
+
+def buffer_row(execution, table: Table, row: dict):
+    """缓冲一行，插入时补上 execution_id"""
+    buffer = execution.__dict__.setdefault(_BUFFER_ATTR, {})
+    buffer.setdefault(table, []).append(row)
+    session = object_session(execution)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(execution)
+
+
+def pending_rows(execution, table: Table) -> list:
+    """尚未写入的缓冲行"""
+    return execution.__dict__.get(_BUFFER_ATTR, {}).get(table, [])
+
+
+def write_pending_rows(session: Session):
+    """把会话中已入库执行的缓冲行批量插入"""
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    rows_by_table = {}
+    for execution in list(pending):
+        if execution.id is None:
+            continue
+        pending.discard(execution)
+        for table, rows in (execution.__dict__.pop(_BUFFER_ATTR, None) or {}).items():
+            rows_by_table.setdefault(table, []).extend({**row, "execution_id": execution.id} for row in rows)
+    connection = session.connection()
+    for table, rows in rows_by_table.items():
+        connection.execute(insert(table), rows)
+        callback = _AFTER_INSERT.get(table)
+        if callback is not None:
+            callback(connection, {row["execution_id"] for row in rows})
+
+
+@event.listens_for(Session, "transient_to_pending")
+def _track_added_execution(session, instance):
+    # 加入会话前已缓冲的行
+    if instance.__dict__.get(_BUFFER_ATTR):
+        session.info.setdefault(_PENDING_KEY, set()).add(instance)
+
+
+@event.listens_for(Session, "after_flush")
+def _write_after_flush(session, flush_context):
+    write_pending_rows(session)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_before_commit(session):
+    # 只缓冲了子表行、执行本身没有修改时不会触发flush
+    if session.info.get(_PENDING_KEY):
+        session.flush()
+        write_pending_rows(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    for execution in session.info.pop(_PENDING_KEY, None) or ():
+        execution.__dict__.pop(_BUFFER_ATTR, None)
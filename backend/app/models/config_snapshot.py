@@ -0,0 +1,162 @@
+import copy
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Column, String, Integer, DateTime, JSON, event, insert, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.exc import DetachedInstanceError
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+# 进程内快照内容缓存的条目数（内容按哈希寻址、不会变化，可以一直缓存）
+SNAPSHOT_CACHE_SIZE = 1024
+# 执行对象上尚未写入的快照：{哈希: 内容}
+_PENDING_ATTR = "_pending_snapshots"
+
+_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+
+def canonical_json(content: Any) -> str:
+    """规范化JSON：键排序、无多余空白，相同内容得到相同字符串"""
+    return json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def content_hash(content: Any) -> str:
+    return hashlib.sha256(canonical_json(content).encode("utf-8")).hexdigest()
+
+
+def _remember(digest: str, content: Any):
+    _cache[digest] = content
+    _cache.move_to_end(digest)
+    while len(_cache) > SNAPSHOT_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+class ConfigSnapshot(Base):
+    """配置快照
+
+    执行开始时的任务配置、AI模型配置、存储配置在大多数执行之间完全相同，
+    按内容哈希只保存一份，执行记录中只保存哈希（见 TaskExecution.task_config_hash 等）。
+    快照写入后不再修改，也不随执行删除。
+    """
+
+    __tablename__ = "config_snapshots"
+
+    content_hash = Column(String(64), primary_key=True, comment="内容哈希（规范化JSON的SHA-256）")
+    content = Column(JSON, nullable=False, comment="快照内容")
+    size_bytes = Column(Integer, comment="规范化JSON大小（字节）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+
+    def __repr__(self):
+        return f"<ConfigSnapshot(content_hash='{self.content_hash[:12]}', size_bytes={self.size_bytes})>"
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "content_hash": self.content_hash,
+            "content": self.content,
+            "size_bytes": self.size_bytes,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    @classmethod
+    def load(cls, db, digest: str) -> Optional[Any]:
+        """按哈希读取快照内容（返回副本，调用方修改不影响缓存）"""
+        if digest not in _cache:
+            content = db.execute(select(cls.content).where(cls.content_hash == digest)).scalar_one_or_none()
+            if content is None:
+                return None
+            _remember(digest, content)
+        return copy.deepcopy(_cache[digest])
+
+    @classmethod
+    def store_many(cls, connection, contents: Dict[str, Any]) -> int:
+        """批量写入快照，已存在的哈希跳过，返回新写入的数量"""
+        if not contents:
+            return 0
+        table = cls.__table__
+        existing = set(connection.execute(
+            select(table.c.content_hash).where(table.c.content_hash.in_(list(contents)))
+        ).scalars())
+        rows = [
+            {"content_hash": digest, "content": content, "size_bytes": len(canonical_json(content).encode("utf-8"))}
+            for digest, content in contents.items()
+            if digest not in existing
+        ]
+        if not rows:
+            return 0
+        dialect = connection.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            # 并发写入同一快照时以先写入者为准
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(table).on_conflict_do_nothing(index_elements=["content_hash"])
+        else:
+            statement = insert(table)
+        connection.execute(statement, rows)
+        return len(rows)
+
+
+class snapshot_property:
+    """按哈希引用快照的属性，读写方式与原来的JSON列相同
+
+    赋值时计算内容哈希写入 hash_attr，内容在会话flush前写入 config_snapshots；
+    读取时优先取 hash_attr 引用的快照，未迁移的历史执行读取 inline_attr 中的内联JSON。
+    在类上访问时返回 hash_attr 列，用于查询条件。
+    """
+
+    def __init__(self, hash_attr: str, inline_attr: str):
+        self.hash_attr = hash_attr
+        self.inline_attr = inline_attr
+        self.name = hash_attr
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return getattr(owner, self.hash_attr)
+        digest = getattr(instance, self.hash_attr)
+        if digest is None:
+            return getattr(instance, self.inline_attr)
+        pending = instance.__dict__.get(_PENDING_ATTR, {})
+        if digest in pending:
+            return copy.deepcopy(pending[digest])
+        session = object_session(instance)
+        if session is None:
+            if digest not in _cache:
+                # 与脱离会话的延迟加载属性一致，不返回None以免被当作没有快照
+                raise DetachedInstanceError(
+                    f"{type(instance).__name__} 未绑定会话，无法加载快照 {self.name}（{digest[:12]}）"
+                )
+            return copy.deepcopy(_cache[digest])
+        return ConfigSnapshot.load(session, digest)
+
+    def __set__(self, instance, value):
+        if getattr(instance, self.inline_attr) is not None:
+            setattr(instance, self.inline_attr, None)
+        if value is None:
+            setattr(instance, self.hash_attr, None)
+            return
+        digest = content_hash(value)
+        content = json.loads(canonical_json(value))
+        instance.__dict__.setdefault(_PENDING_ATTR, {})[digest] = content
+        _remember(digest, content)
+        setattr(instance, self.hash_attr, digest)
+
+
+@event.listens_for(Session, "before_flush")
+def _store_pending_snapshots(session, flush_context, instances):
+    # 快照先于引用它的执行写入
+    contents = {}
+    for instance in list(session.new) + list(session.dirty):
+        pending = instance.__dict__.pop(_PENDING_ATTR, None)
+        if pending:
+            contents.update(pending)
+    if contents:
+        ConfigSnapshot.store_many(session.connection(), contents)
@@ -0,0 +1,76 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index, delete, select
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models.append_buffer import on_rows_inserted
+
+
+class ExecutionLog(Base):
+    """执行日志（只追加）
+
+    每条日志一行，追加日志不会重写已有日志。TaskExecution.add_log_entry() 把日志缓冲在
+    执行对象上（见 append_buffer），会话flush或提交时批量插入；
+    按 (execution_id, id) 索引倒序分页读取最近的日志。每个执行只保留最近
+    EXECUTION_LOG_LIMIT 条，写入后删除更早的日志。
+    """
+
+    __tablename__ = "execution_logs"
+    __table_args__ = (
+        Index("ix_execution_logs_execution", "execution_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, comment="日志ID")
+    execution_id = Column(
+        Integer,
+        ForeignKey("task_executions.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="执行ID",
+    )
+
+    # 日志内容
+    level = Column(String(20), nullable=False, comment="日志级别")
+    step = Column(String(50), comment="记录日志时的执行步骤")
+    message = Column(Text, nullable=False, comment="日志消息")
+    details = Column(JSON, comment="日志详情")
+
+    # 时间戳（由应用写入，即日志产生的时间而非插入时间）
+    created_at = Column(DateTime(timezone=True), nullable=False, comment="记录时间")
+
+    def __repr__(self):
+        return f"<ExecutionLog(id={self.id}, execution_id={self.execution_id}, level='{self.level}')>"
+
+    def to_dict(self):
+        """转换为字典（与原 log_entries 条目格式一致）"""
+        data = {
+            "id": self.id,
+            "timestamp": self.created_at.isoformat() if self.created_at else None,
+            "level": self.level,
+            "message": self.message,
+            "step": self.step,
+        }
+        if self.details:
+            data["details"] = self.details
+        return data
+
+    @classmethod
+    def tail(cls, db, execution_id: int, limit: int = 100, before_id: int = None) -> list:
+        """最近的日志（按时间正序返回），before_id 为上一页最早一条的ID，用于继续向前翻页"""
+        query = db.query(cls).filter(cls.execution_id == execution_id)
+        if before_id is not None:
+            query = query.filter(cls.id < before_id)
+        rows = query.order_by(cls.id.desc()).limit(limit).all()
+        return list(reversed(rows))
+
+    @classmethod
+    def prune(cls, connection, execution_ids, keep: int = None):
+        """每个执行只保留最近keep条日志"""
+        keep = keep or settings.EXECUTION_LOG_LIMIT
+        for execution_id in execution_ids:
+            # 第keep+1新的日志ID，日志不足keep+1条时为NULL，不删除
+            boundary = select(cls.id).where(
+                cls.execution_id == execution_id,
+            ).order_by(cls.id.desc()).offset(keep).limit(1).scalar_subquery()
+            connection.execute(delete(cls).where(cls.execution_id == execution_id, cls.id <= boundary))
+
+
+on_rows_inserted(ExecutionLog.__table__, ExecutionLog.prune)
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import (
+    Column, Integer, String, DateTime, LargeBinary, ForeignKey, UniqueConstraint,
+    bindparam, delete, event, insert, select,
+)
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.database import Base
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+# 列中保存的引用：{"__payload_ref__": {"codec": ..., "size": ..., "stored": ..., "digest": ...}}
+REF_KEY = "__payload_ref__"
+# 执行对象上尚未写入的大字段：{字段: 行 或 None（删除）}
+_PENDING_ATTR = "_pending_payloads"
+# 执行对象上已读取的大字段：{字段: (摘要, 值)}
+_CACHE_ATTR = "_loaded_payloads"
+# 会话中有待写入大字段的执行
+_SESSION_KEY = "pending_execution_payloads"
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """压缩，返回 (编码, 数据)"""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=settings.PAYLOAD_COMPRESSION_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("读取zstd压缩的执行数据需要安装zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"未知的压缩编码: {codec}")
+
+
+def is_payload_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and REF_KEY in value
+
+
+class ExecutionPayload(Base):
+    """执行大字段
+
+    超过 PAYLOAD_OFFLOAD_THRESHOLD 的触发数据、解析结果、AI请求/响应、分析结果压缩后存放在这里，
+    task_executions 对应列中只保留引用（编码、大小、摘要），列表查询不再读取这些数据。
+    读取执行的某个大字段时一次加载该执行的全部大字段（见 payload_property）。
+    """
+
+    __tablename__ = "execution_payloads"
+    __table_args__ = (
+        UniqueConstraint("execution_id", "field", name="uq_execution_payload_field"),
+    )
+
+    id = Column(Integer, primary_key=True, comment="ID")
+    execution_id = Column(
+        Integer,
+        ForeignKey("task_executions.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="执行ID",
+    )
+    field = Column(String(50), nullable=False, comment="字段名")
+    codec = Column(String(10), nullable=False, comment="压缩编码：zstd / zlib")
+    size_bytes = Column(Integer, comment="原始JSON大小（字节）")
+    stored_bytes = Column(Integer, comment="压缩后大小（字节）")
+    digest = Column(String(16), comment="原始JSON的SHA-256前缀，与列中引用对应")
+    data = Column(LargeBinary, nullable=False, comment="压缩后的JSON")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+
+    def __repr__(self):
+        return f"<ExecutionPayload(execution_id={self.execution_id}, field='{self.field}', stored_bytes={self.stored_bytes})>"
+
+    def to_dict(self):
+        """转换为字典（不含数据）"""
+        return {
+            "id": self.id,
+            "execution_id": self.execution_id,
+            "field": self.field,
+            "codec": self.codec,
+            "size_bytes": self.size_bytes,
+            "stored_bytes": self.stored_bytes,
+            "digest": self.digest,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    @classmethod
+    def load_all(cls, db, execution_id: int) -> Dict[str, Tuple[str, Any]]:
+        """读取并解压一个执行的全部大字段，返回 {字段: (摘要, 值)}"""
+        rows = db.execute(
+            select(cls.field, cls.digest, cls.codec, cls.data).where(cls.execution_id == execution_id)
+        ).all()
+        return {field: (digest, json.loads(decompress(codec, data))) for field, digest, codec, data in rows}
+
+    @classmethod
+    def preload(cls, db, executions: list, fields: Optional[list] = None):
+        """批量读取多个执行的大字段并缓存到执行对象上，避免逐个执行查询"""
+        by_id = {execution.id: execution for execution in executions if execution.id is not None}
+        ids = list(by_id)
+        for start in range(0, len(ids), 1000):
+            query = select(cls.execution_id, cls.field, cls.digest, cls.codec, cls.data).where(
+                cls.execution_id.in_(ids[start:start + 1000])
+            )
+            if fields:
+                query = query.where(cls.field.in_(fields))
+            for execution_id, field, digest, codec, data in db.execute(query):
+                cache = by_id[execution_id].__dict__.setdefault(_CACHE_ATTR, {})
+                cache[field] = (digest, json.loads(decompress(codec, data)))
+
+
+class payload_property:
+    """超过阈值时转存到 execution_payloads 的JSON属性，读写方式与原来的JSON列相同
+
+    赋值时序列化，超过阈值则压缩并在列中写入引用，压缩数据在执行flush后写入；
+    读取到引用时才查询 execution_payloads，结果缓存在对象上。
+    """
+
+    def __init__(self, column_attr: str, field: str):
+        self.column_attr = column_attr
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            # 类上访问时返回列属性，查询条件（如 isnot(None)）照常可用
+            return getattr(owner, self.column_attr)
+        value = getattr(instance, self.column_attr)
+        if not is_payload_ref(value):
+            return value
+
+        digest = value[REF_KEY]["digest"]
+        cache = instance.__dict__.setdefault(_CACHE_ATTR, {})
+        if self.field not in cache or cache[self.field][0] != digest:
+            session = object_session(instance)
+            if session is None or instance.id is None:
+                return None
+            # 一次加载该执行的全部大字段，详情页通常会读取多个
+            cache.update(ExecutionPayload.load_all(session, instance.id))
+        cached = cache.get(self.field)
+        return cached[1] if cached is not None and cached[0] == digest else None
+
+    def __set__(self, instance, value):
+        previous = getattr(instance, self.column_attr)
+        pending = instance.__dict__.setdefault(_PENDING_ATTR, {})
+        cache = instance.__dict__.setdefault(_CACHE_ATTR, {})
+        encoded = _dumps(value) if value is not None else b""
+        if value is None or len(encoded) <= settings.PAYLOAD_OFFLOAD_THRESHOLD:
+            setattr(instance, self.column_attr, value)
+            cache.pop(self.field, None)
+            if not is_payload_ref(previous):
+                pending.pop(self.field, None)
+                return
+            # 之前已转存，删除旧数据
+            pending[self.field] = None
+        else:
+            codec, data = compress(encoded)
+            digest = hashlib.sha256(encoded).hexdigest()[:16]
+            pending[self.field] = {
+                "field": self.field,
+                "codec": codec,
+                "size_bytes": len(encoded),
+                "stored_bytes": len(data),
+                "digest": digest,
+                "data": data,
+            }
+            cache[self.field] = (digest, value)
+            setattr(instance, self.column_attr, {REF_KEY: {
+                "codec": codec,
+                "size": len(encoded),
+                "stored": len(data),
+                "digest": digest,
+            }})
+
+        session = object_session(instance)
+        if session is not None:
+            session.info.setdefault(_SESSION_KEY, set()).add(instance)
+
+
+def write_pending_payloads(session: Session):
+    """写入会话中已入库执行的待写大字段"""
+    pending_executions = session.info.get(_SESSION_KEY)
+    if not pending_executions:
+        return
+    removed, rows = [], []
+    for execution in list(pending_executions):
+        if execution.id is None:
+            continue
+        pending_executions.discard(execution)
+        for field, row in (execution.__dict__.pop(_PENDING_ATTR, None) or {}).items():
+            removed.append({"target_id": execution.id, "target_field": field})
+            if row is not None:
+                rows.append({**row, "execution_id": execution.id})
+    if not removed:
+        return
+    table = ExecutionPayload.__table__
+    connection = session.connection()
+    connection.execute(
+        delete(table).where(
+            table.c.execution_id == bindparam("target_id"),
+            table.c.field == bindparam("target_field"),
+        ),
+        removed,
+    )
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_pending_payloads(session, flush_context, instances):
+    # 赋值时尚未加入会话的执行
+    for instance in list(session.new) + list(session.dirty):
+        if instance.__dict__.get(_PENDING_ATTR):
+            session.info.setdefault(_SESSION_KEY, set()).add(instance)
+
+
+@event.listens_for(Session, "after_flush")
+def _write_after_flush(session, flush_context):
+    write_pending_payloads(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    for execution in session.info.pop(_SESSION_KEY, None) or ():
+        execution.__dict__.pop(_PENDING_ATTR, None)
+        execution.__dict__.pop(_CACHE_ATTR, None)
@@ -0,0 +1,83 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Index, func, null
+
+from app.core.database import Base
+
+
+class ExecutionSpan(Base):
+    """执行跨度
+
+    执行的每个步骤记录为一个跨度，分段分析、模型请求等作为子跨度（parent_span_id）。
+    耗时由单调时钟计算，started_at 只用于按时间范围筛选。跨度ID在应用侧生成，
+    随执行日志一起批量插入（见 append_buffer）。
+    """
+
+    __tablename__ = "execution_spans"
+    __table_args__ = (
+        # 执行详情按开始顺序读取跨度
+        Index("ix_execution_spans_execution", "execution_id", "start_offset_ms"),
+        # 按步骤、资源统计一段时间内的耗时分布
+        Index("ix_execution_spans_name_time", "name", "started_at"),
+        Index("ix_execution_spans_resource", "name", "resource", "started_at"),
+    )
+
+    span_id = Column(String(16), primary_key=True, comment="跨度ID")
+    execution_id = Column(
+        Integer,
+        ForeignKey("task_executions.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="执行ID",
+    )
+    parent_span_id = Column(String(16), comment="父跨度ID")
+    task_id = Column(Integer, comment="任务ID")
+
+    # 跨度信息
+    name = Column(String(50), nullable=False, comment="跨度名称（步骤名或子操作名）")
+    resource = Column(String(100), comment="关联资源（如 storage_credential:3、ai_model:5），用于按资源聚合")
+    status = Column(String(20), nullable=False, comment="状态：ok / error / cancelled")
+    error = Column(String(500), comment="错误信息")
+    attributes = Column(JSON, comment="属性")
+
+    # 时间信息
+    started_at = Column(DateTime(timezone=True), nullable=False, comment="开始时间")
+    start_offset_ms = Column(Integer, nullable=False, comment="相对执行开始的偏移（毫秒）")
+    duration_ms = Column(Integer, nullable=False, comment="耗时（毫秒）")
+
+    def __repr__(self):
+        return f"<ExecutionSpan(span_id='{self.span_id}', name='{self.name}', duration_ms={self.duration_ms})>"
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "span_id": self.span_id,
+            "execution_id": self.execution_id,
+            "parent_span_id": self.parent_span_id,
+            "task_id": self.task_id,
+            "name": self.name,
+            "resource": self.resource,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "start_offset_ms": self.start_offset_ms,
+            "duration_ms": self.duration_ms,
+        }
+
+    @classmethod
+    def for_execution(cls, db, execution_id: int) -> list:
+        """执行的全部跨度，按开始顺序"""
+        return db.query(cls).filter(cls.execution_id == execution_id).order_by(cls.start_offset_ms).all()
+
+    @classmethod
+    def duration_percentile(cls, db, name: str, since, percentile: float = 0.95, by_resource: bool = True) -> list:
+        """一段时间内某类跨度的耗时分位数（PostgreSQL percentile_cont）
+
+        例如各存储凭证最近24小时下载耗时的p95：
+            ExecutionSpan.duration_percentile(db, "download_file", datetime.utcnow() - timedelta(hours=24))
+        返回 [(resource, 分位数毫秒, 样本数)]，by_resource=False 时 resource 为None。
+        """
+        value = func.percentile_cont(percentile).within_group(cls.duration_ms)
+        resource = cls.resource if by_resource else null()
+        query = db.query(resource, value, func.count()).filter(cls.name == name, cls.started_at >= since)
+        if by_resource:
+            query = query.group_by(cls.resource).order_by(cls.resource)
+        return [(resource, float(result) if result is not None else None, count) for resource, result, count in query.all()]
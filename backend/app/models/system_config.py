@@ -125,7 +125,7 @@ class SystemConfig(Base):
     
     # 标签和元数据
     tags = Column(JSON, comment="标签")
-    metadata = Column(JSON, comment="元数据")
+    extra_metadata = Column("metadata", JSON, comment="元数据")
     custom_fields = Column(JSON, comment="自定义字段")
     
     # 备注信息
@@ -206,7 +206,7 @@ class SystemConfig(Base):
                 "cache_ttl": self.cache_ttl,
                 "cache_key": self.cache_key,
                 "tags": self.tags,
-                "metadata": self.metadata,
+                "metadata": self.extra_metadata,
                 "custom_fields": self.custom_fields,
                 "notes": self.notes,
                 "admin_notes": self.admin_notes,
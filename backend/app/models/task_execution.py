@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import object_session, relationship
 import enum
-from datetime import datetime, timedelta
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from app.core.database import Base
+from app.core.config import settings
+from app.models.append_buffer import buffer_row, pending_rows
+from app.models.config_snapshot import snapshot_property
+from app.models.execution_payload import payload_property
+from app.models.execution_log import ExecutionLog
 
 
 class ExecutionStatus(str, enum.Enum):
@@ -29,10 +36,24 @@ class ExecutionStep(str, enum.Enum):
     CLEANUP = "cleanup"              # 清理
 
 
+class WriteBackStatus(str, enum.Enum):
+    """回写状态枚举（write_back_status取值）"""
+    PENDING = "pending"              # 等待合并回写
+    SUCCESS = "success"              # 回写成功
+    FAILED = "failed"                # 回写失败
+    SKIPPED = "skipped"              # 字段值未变化，跳过回写
+
+
 class TaskExecution(Base):
     """任务执行模型"""
     
     __tablename__ = "task_executions"
+    __table_args__ = (
+        # 执行队列按队列名和状态认领，按优先级和入库时间排序
+        Index("ix_task_executions_queue", "queue_name", "status", "priority", "created_at"),
+        # 重试调度器按状态加载即将到期的重试
+        Index("ix_task_executions_retry", "status", "next_retry_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, comment="执行ID")
     task_id = Column(Integer, ForeignKey("analysis_tasks.id"), nullable=False, comment="任务ID")
@@ -57,16 +78,25 @@ class TaskExecution(Base):
     # 触发信息
     trigger_type = Column(String(20), comment="触发类型")
     trigger_source = Column(String(100), comment="触发源")
-    trigger_data = Column(JSON, comment="触发数据")
+    trigger_data_column = Column("trigger_data", JSON, comment="触发数据（超过阈值时为execution_payloads引用）")
+    trigger_data = payload_property("trigger_data_column", "trigger_data")
     webhook_request_id = Column(String(50), comment="Webhook请求ID")
     
-    # 执行配置快照
-    task_config_snapshot = Column(JSON, comment="任务配置快照")
-    ai_model_config = Column(JSON, comment="AI模型配置")
-    storage_config = Column(JSON, comment="存储配置")
+    # 执行配置快照（内容按哈希保存在config_snapshots表，读写通过下方同名属性）
+    task_config_hash = Column(String(64), comment="任务配置快照哈希")
+    ai_model_config_hash = Column(String(64), comment="AI模型配置快照哈希")
+    storage_config_hash = Column(String(64), comment="存储配置快照哈希")
+    # 迁移前的内联快照（none_as_null：清空时写入SQL NULL）
+    task_config_inline = Column("task_config_snapshot", JSON(none_as_null=True), comment="任务配置快照（历史数据，迁移后清空）")
+    ai_model_config_inline = Column("ai_model_config", JSON(none_as_null=True), comment="AI模型配置（历史数据，迁移后清空）")
+    storage_config_inline = Column("storage_config", JSON(none_as_null=True), comment="存储配置（历史数据，迁移后清空）")
+    task_config_snapshot = snapshot_property("task_config_hash", "task_config_inline")
+    ai_model_config = snapshot_property("ai_model_config_hash", "ai_model_config_inline")
+    storage_config = snapshot_property("storage_config_hash", "storage_config_inline")
     
     # 数据解析结果
-    parsed_data = Column(JSON, comment="解析后的数据")
+    parsed_data_column = Column("parsed_data", JSON, comment="解析后的数据（超过阈值时为execution_payloads引用）")
+    parsed_data = payload_property("parsed_data_column", "parsed_data")
     extracted_fields = Column(JSON, comment="提取的字段")
     validation_results = Column(JSON, comment="验证结果")
     
@@ -79,16 +109,28 @@ class TaskExecution(Base):
     local_file_path = Column(String(500), comment="本地文件路径")
     
     # AI分析信息
-    ai_request_data = Column(JSON, comment="AI请求数据")
-    ai_response_data = Column(JSON, comment="AI响应数据")
+    ai_request_data_column = Column("ai_request_data", JSON, comment="AI请求数据（超过阈值时为execution_payloads引用）")
+    ai_response_data_column = Column("ai_response_data", JSON, comment="AI响应数据（超过阈值时为execution_payloads引用）")
+    ai_request_data = payload_property("ai_request_data_column", "ai_request_data")
+    ai_response_data = payload_property("ai_response_data_column", "ai_response_data")
     ai_model_name = Column(String(100), comment="AI模型名称")
     prompt_tokens = Column(Integer, default=0, comment="提示词token数")
     completion_tokens = Column(Integer, default=0, comment="完成token数")
+    cached_tokens = Column(Integer, default=0, comment="命中供应商提示词缓存的输入token数")
     total_tokens = Column(Integer, default=0, comment="总token数")
     ai_cost = Column(String(20), default="0.00", comment="AI成本")
+    cache_hit = Column(Boolean, default=False, comment="是否命中AI响应缓存")
+    cache_key = Column(String(64), comment="AI响应缓存键")
+    saved_cost = Column(String(20), default="0.00", comment="缓存命中节省的成本")
+    time_to_first_token_ms = Column(Integer, comment="首Token延迟（毫秒）")
+    tokens_per_second = Column(String(20), comment="输出速度（token/秒）")
+    served_model_id = Column(Integer, comment="实际返回结果的AI模型ID")
+    hedged = Column(Boolean, default=False, comment="是否触发了对冲请求")
+    hedge_cost = Column(String(20), default="0.00", comment="对冲中未采用结果的请求成本（已计入ai_cost）")
     
     # 结果信息
-    analysis_result = Column(JSON, comment="分析结果")
+    analysis_result_column = Column("analysis_result", JSON, comment="分析结果（超过阈值时为execution_payloads引用）")
+    analysis_result = payload_property("analysis_result_column", "analysis_result")
     formatted_result = Column(JSON, comment="格式化结果")
     result_summary = Column(Text, comment="结果摘要")
     confidence_score = Column(String(10), comment="置信度分数")
@@ -116,6 +158,7 @@ class TaskExecution(Base):
     retry_count = Column(Integer, default=0, comment="重试次数")
     max_retries = Column(Integer, default=3, comment="最大重试次数")
     next_retry_at = Column(DateTime(timezone=True), comment="下次重试时间")
+    last_retry_delay = Column(Integer, comment="上次重试延迟（秒），下次延迟据此抖动")
     retry_reason = Column(Text, comment="重试原因")
     
     # 资源使用情况
@@ -126,7 +169,7 @@ class TaskExecution(Base):
     
     # 日志信息
     log_level = Column(String(20), default="INFO", comment="日志级别")
-    log_entries = Column(JSON, comment="日志条目")
+    log_entries = Column(JSON, comment="日志条目（历史数据，新日志写入execution_logs表）")
     debug_info = Column(JSON, comment="调试信息")
     
     # 通知信息
@@ -142,6 +185,8 @@ class TaskExecution(Base):
     priority = Column(Integer, default=0, comment="优先级")
     queue_name = Column(String(50), comment="队列名称")
     queue_wait_time = Column(String(20), comment="队列等待时间（秒）")
+    enqueued_at = Column(DateTime(timezone=True), comment="最近一次入队时间（重试、租约过期重新入队时更新）")
+    lease_expires_at = Column(DateTime(timezone=True), comment="队列租约到期时间（超时未续约视为worker崩溃）")
     
     # 标签和分类
     tags = Column(JSON, comment="标签")
@@ -191,8 +236,16 @@ class TaskExecution(Base):
             "ai_model_name": self.ai_model_name,
             "prompt_tokens": self.prompt_tokens,
             "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
             "total_tokens": self.total_tokens,
             "ai_cost": self.ai_cost,
+            "cache_hit": self.cache_hit,
+            "saved_cost": self.saved_cost,
+            "time_to_first_token_ms": self.time_to_first_token_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "served_model_id": self.served_model_id,
+            "hedged": self.hedged,
+            "hedge_cost": self.hedge_cost,
             "result_summary": self.result_summary,
             "confidence_score": self.confidence_score,
             "write_back_status": self.write_back_status,
@@ -211,6 +264,7 @@ class TaskExecution(Base):
             "priority": self.priority,
             "queue_name": self.queue_name,
             "queue_wait_time": self.queue_wait_time,
+            "enqueued_at": self.enqueued_at.isoformat() if self.enqueued_at else None,
             "tags": self.tags,
             "notes": self.notes,
             "created_at": self.created_at.isoformat() if self.created_at else None,
@@ -235,7 +289,7 @@ class TaskExecution(Base):
                 "error_details": self.error_details,
                 "stack_trace": self.stack_trace,
                 "step_timings": self.step_timings,
-                "log_entries": self.log_entries,
+                "log_entries": self.recent_logs(),
                 "debug_info": self.debug_info,
                 "notifications_sent": self.notifications_sent,
                 "execution_environment": self.execution_environment,
@@ -255,6 +309,29 @@ class TaskExecution(Base):
             self.step_timings = {}
         self.step_timings["started_at"] = self.started_at.isoformat()
     
+    def mark_enqueued(self, queue_name: str):
+        """投递到队列：记录队列名和入队时间（每次重新入队都会更新）"""
+        self.queue_name = queue_name
+        self.enqueued_at = datetime.utcnow()
+    
+    def claim(self, worker_id: str, worker_hostname: str = None, queue_name: str = None):
+        """被调度器或队列worker认领：开始执行并记录排队时间
+
+        排队时间从最近一次入队算起，重试的执行不计入之前的运行和退避等待。
+        """
+        self.start_execution()
+        self.worker_id = worker_id
+        self.worker_hostname = worker_hostname
+        if queue_name:
+            self.queue_name = queue_name
+
+        enqueued_at = self.enqueued_at or self.created_at
+        if enqueued_at:
+            if enqueued_at.tzinfo is not None:
+                enqueued_at = enqueued_at.astimezone(timezone.utc).replace(tzinfo=None)
+            wait = (self.started_at - enqueued_at).total_seconds()
+            self.queue_wait_time = f"{max(wait, 0.0):.3f}"
+    
     def complete_execution(self, success: bool = True, error_message: str = None):
         """完成执行"""
         self.completed_at = datetime.utcnow()
@@ -293,25 +370,36 @@ class TaskExecution(Base):
             self.step_timings[step_data_key] = data
     
     def add_log_entry(self, level: str, message: str, details: dict = None):
-        """添加日志条目"""
-        if not self.log_entries:
-            self.log_entries = []
-        
-        log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+        """添加日志条目（缓冲后随会话flush批量插入execution_logs表）"""
+        buffer_row(self, ExecutionLog.__table__, {
+            "created_at": datetime.utcnow(),
             "level": level,
             "message": message,
             "step": self.current_step.value if self.current_step else None,
-        }
-        
-        if details:
-            log_entry["details"] = details
-        
-        self.log_entries.append(log_entry)
-        
-        # 限制日志条目数量
-        if len(self.log_entries) > 1000:
-            self.log_entries = self.log_entries[-1000:]
+            "details": details,
+        })
+    
+    def recent_logs(self, limit: int = None) -> list:
+        """最近的日志（按时间正序），包含尚未写入的缓冲日志；没有新日志时返回历史的 log_entries"""
+        limit = limit or settings.EXECUTION_LOG_TAIL
+        logs = []
+        session = object_session(self)
+        if session is not None and self.id is not None:
+            logs = [log.to_dict() for log in ExecutionLog.tail(session, self.id, limit)]
+        for row in pending_rows(self, ExecutionLog.__table__):
+            entry = {
+                "id": None,
+                "timestamp": row["created_at"].isoformat(),
+                "level": row["level"],
+                "message": row["message"],
+                "step": row["step"],
+            }
+            if row["details"]:
+                entry["details"] = row["details"]
+            logs.append(entry)
+        if not logs:
+            return (self.log_entries or [])[-limit:]
+        return logs[-limit:]
     
     def set_error(self, error_code: str, error_message: str, error_details: dict = None, stack_trace: str = None):
         """设置错误信息"""
@@ -330,8 +418,13 @@ class TaskExecution(Base):
             self.retry_count < self.max_retries
         )
     
-    def schedule_retry(self, delay_seconds: int = None):
-        """安排重试"""
+    def schedule_retry(self, delay_seconds: int = None, base_delay: int = 60, max_delay: int = 3600):
+        """安排重试
+
+        未指定延迟时使用去相关抖动（decorrelated jitter）：
+        延迟在 [base_delay, 上次延迟×3] 内随机取值且不超过 max_delay，
+        故障恢复时大量执行的重试时间自然分散，不会同时涌入。
+        """
         if not self.can_retry():
             return False
         
@@ -340,9 +433,10 @@ class TaskExecution(Base):
         
         # 计算下次重试时间
         if delay_seconds is None:
-            # 指数退避策略
-            delay_seconds = min(60 * (2 ** (self.retry_count - 1)), 3600)  # 最大1小时
+            previous = self.last_retry_delay or base_delay
+            delay_seconds = int(min(max_delay, random.uniform(base_delay, max(previous * 3, base_delay))))
         
+        self.last_retry_delay = delay_seconds
         self.next_retry_at = datetime.utcnow() + timedelta(seconds=delay_seconds)
         
         # 添加重试日志
@@ -354,6 +448,30 @@ class TaskExecution(Base):
         
         return True
     
+    def share_result_from(self, leader: "TaskExecution"):
+        """复用同一文件在途执行（leader）的下载和分析结果
+
+        AI成本记为0，leader的成本记入saved_cost；回写等后续步骤仍由本执行完成。
+        """
+        self.parent_execution_id = leader.id
+        self.file_size = leader.file_size
+        self.file_type = leader.file_type
+        self.file_hash = leader.file_hash
+        self.extracted_fields = leader.extracted_fields
+        self.analysis_result = leader.analysis_result
+        self.formatted_result = leader.formatted_result
+        self.result_summary = leader.result_summary
+        self.confidence_score = leader.confidence_score
+        self.ai_model_name = leader.ai_model_name
+        self.served_model_id = leader.served_model_id
+        self.ai_cost = "0.00"
+        self.saved_cost = leader.ai_cost
+        self.add_log_entry(
+            "INFO",
+            f"复用在途执行 {leader.execution_id} 的分析结果",
+            {"parent_execution_id": leader.id},
+        )
+
     def cancel_execution(self, reason: str = None):
         """取消执行"""
         self.status = ExecutionStatus.CANCELLED
@@ -370,6 +488,23 @@ class TaskExecution(Base):
         # 添加取消日志
         self.add_log_entry("WARNING", f"执行已取消: {reason or '未知原因'}")
     
+    def timeout_execution(self, timeout_seconds: int = None):
+        """执行超时"""
+        self.status = ExecutionStatus.TIMEOUT
+        self.completed_at = datetime.utcnow()
+        
+        # 计算执行时长
+        if self.started_at:
+            duration = self.completed_at - self.started_at
+            self.duration_seconds = f"{duration.total_seconds():.3f}"
+        
+        # 添加超时日志
+        self.add_log_entry(
+            "WARNING",
+            f"执行超时（{timeout_seconds}秒），停止于{self.current_step.value if self.current_step else '未知'}步骤",
+            {"timeout_seconds": timeout_seconds},
+        )
+    
     def is_running(self) -> bool:
         """检查是否正在运行"""
         return self.status == ExecutionStatus.RUNNING
@@ -397,8 +532,12 @@ class TaskExecution(Base):
             "confidence_score": self.confidence_score,
         }
     
-    def get_performance_metrics(self) -> dict:
-        """获取性能指标"""
+    def get_performance_metrics(self, spans: Optional[list] = None) -> dict:
+        """获取性能指标
+
+        步骤耗时优先取顶层跨度（ExecutionSpan.for_execution 的结果），
+        未传入跨度时取 step_timings 中流水线记录的 {步骤}_seconds。
+        """
         metrics = {
             "duration_seconds": self.duration_seconds,
             "memory_usage_mb": self.memory_usage_mb,
@@ -406,24 +545,22 @@ class TaskExecution(Base):
             "disk_usage_mb": self.disk_usage_mb,
             "network_bytes": self.network_bytes,
             "queue_wait_time": self.queue_wait_time,
+            "time_to_first_token_ms": self.time_to_first_token_ms,
+            "tokens_per_second": self.tokens_per_second,
         }
-        
-        # 添加步骤时间分析
-        if self.step_timings:
-            step_durations = {}
-            steps = list(ExecutionStep)
-            
-            for i, step in enumerate(steps):
-                step_start_key = f"{step.value}_at"
-                if step_start_key in self.step_timings:
-                    if i + 1 < len(steps):
-                        next_step_key = f"{steps[i + 1].value}_at"
-                        if next_step_key in self.step_timings:
-                            start_time = datetime.fromisoformat(self.step_timings[step_start_key].replace('Z', '+00:00'))
-                            end_time = datetime.fromisoformat(self.step_timings[next_step_key].replace('Z', '+00:00'))
-                            duration = (end_time - start_time).total_seconds()
-                            step_durations[step.value] = duration
-            
+
+        step_durations = {}
+        if spans:
+            # 同一步骤可能因重新执行出现多次，累加耗时
+            for span in spans:
+                if span.parent_span_id is None:
+                    step_durations[span.name] = step_durations.get(span.name, 0) + span.duration_ms / 1000
+        elif self.step_timings:
+            for step in ExecutionStep:
+                value = self.step_timings.get(f"{step.value}_seconds")
+                if isinstance(value, (int, float)):
+                    step_durations[step.value] = value
+        if step_durations:
             metrics["step_durations"] = step_durations
-        
+
         return metrics
\ No newline at end of file
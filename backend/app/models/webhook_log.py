@@ -145,7 +145,7 @@ class WebhookLog(Base):
     
     # 标签和元数据
     tags = Column(JSON, comment="标签")
-    metadata = Column(JSON, comment="元数据")
+    extra_metadata = Column("metadata", JSON, comment="元数据")
     custom_fields = Column(JSON, comment="自定义字段")
     
     # 归档信息
@@ -255,7 +255,7 @@ class WebhookLog(Base):
                 "error_details": self.error_details,
                 "stack_trace": self.stack_trace,
                 "security_warnings": self.security_warnings,
-                "metadata": self.metadata,
+                "metadata": self.extra_metadata,
                 "custom_fields": self.custom_fields,
                 "admin_notes": self.admin_notes,
             })
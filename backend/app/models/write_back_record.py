@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class WriteBackRecord(Base):
+    """飞书工作项字段最后一次成功回写的值（回写去重缓存的数据库兜底）"""
+
+    __tablename__ = "write_back_records"
+    __table_args__ = (
+        UniqueConstraint("project_key", "work_item_type_key", "work_item_id", "field_key", name="uq_write_back_field"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, comment="记录ID")
+
+    # 字段定位
+    project_key = Column(String(100), nullable=False, comment="飞书项目key")
+    work_item_type_key = Column(String(100), nullable=False, comment="工作项类型key")
+    work_item_id = Column(String(50), nullable=False, index=True, comment="工作项ID")
+    field_key = Column(String(100), nullable=False, comment="字段key")
+
+    # 回写值
+    value_hash = Column(String(64), nullable=False, comment="字段值哈希")
+    value = Column(JSON, comment="字段值")
+    execution_id = Column(Integer, comment="最后一次回写的执行ID")
+
+    # 时间戳
+    written_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        comment="回写时间"
+    )
+
+    def __repr__(self):
+        return f"<WriteBackRecord(work_item_id={self.work_item_id}, field_key='{self.field_key}')>"
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "project_key": self.project_key,
+            "work_item_type_key": self.work_item_type_key,
+            "work_item_id": self.work_item_id,
+            "field_key": self.field_key,
+            "value_hash": self.value_hash,
+            "value": self.value,
+            "execution_id": self.execution_id,
+            "written_at": self.written_at.isoformat() if self.written_at else None,
+        }
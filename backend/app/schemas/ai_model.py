@@ -41,6 +41,7 @@ class AIModelBase(BaseModel):
     supports_function_calling: bool = Field(False, description="支持函数调用")
     supports_vision: bool = Field(False, description="支持视觉")
     supports_multimodal: bool = Field(False, description="支持多模态")
+    supports_batch: bool = Field(False, description="支持离线批量推理")
     
     # 速率限制
     rate_limit_rpm: Optional[int] = Field(None, ge=1, description="每分钟请求限制")
@@ -50,6 +51,7 @@ class AIModelBase(BaseModel):
     # 成本设置
     cost_per_input_token: Optional[float] = Field(None, ge=0, description="输入令牌成本")
     cost_per_output_token: Optional[float] = Field(None, ge=0, description="输出令牌成本")
+    cost_per_cached_input_token: Optional[float] = Field(None, ge=0, description="命中提示词缓存的输入令牌成本")
     
     @validator('api_endpoint')
     def validate_api_endpoint(cls, v):
@@ -101,6 +103,7 @@ class AIModelUpdate(BaseModel):
     supports_function_calling: Optional[bool] = Field(None, description="支持函数调用")
     supports_vision: Optional[bool] = Field(None, description="支持视觉")
     supports_multimodal: Optional[bool] = Field(None, description="支持多模态")
+    supports_batch: Optional[bool] = Field(None, description="支持离线批量推理")
     
     # 速率限制
     rate_limit_rpm: Optional[int] = Field(None, ge=1, description="每分钟请求限制")
@@ -110,6 +113,7 @@ class AIModelUpdate(BaseModel):
     # 成本设置
     cost_per_input_token: Optional[float] = Field(None, ge=0, description="输入令牌成本")
     cost_per_output_token: Optional[float] = Field(None, ge=0, description="输出令牌成本")
+    cost_per_cached_input_token: Optional[float] = Field(None, ge=0, description="命中提示词缓存的输入令牌成本")
     
     # 状态
     is_active: Optional[bool] = Field(None, description="是否激活")
@@ -226,6 +226,7 @@ class AnalysisTaskResponse(AnalysisTaskBase):
     average_execution_time: Optional[float] = Field(None, description="平均执行时间（秒）")
     total_tokens_used: int = Field(0, description="使用令牌总数")
     total_cost: float = Field(0.0, description="总成本")
+    skipped_write_backs: int = Field(0, description="因字段值未变化而省去的回写调用次数")
     last_execution_at: Optional[datetime] = Field(None, description="最后执行时间")
     last_success_at: Optional[datetime] = Field(None, description="最后成功时间")
     last_failure_at: Optional[datetime] = Field(None, description="最后失败时间")
@@ -308,6 +309,7 @@ class AnalysisTaskUsage(BaseModel):
     average_execution_time: Optional[float] = Field(None, description="平均执行时间")
     total_tokens_used: int = Field(0, description="使用令牌总数")
     total_cost: float = Field(0.0, description="总成本")
+    skipped_write_backs: int = Field(0, description="因字段值未变化而省去的回写调用次数")
     last_execution_at: Optional[datetime] = Field(None, description="最后执行时间")
     
     class Config:
@@ -187,8 +187,15 @@ class TaskExecutionResponse(TaskExecutionBase):
     ai_model_used: Optional[str] = Field(None, description="使用的AI模型")
     input_tokens: Optional[int] = Field(None, description="输入令牌数")
     output_tokens: Optional[int] = Field(None, description="输出令牌数")
+    cached_tokens: Optional[int] = Field(None, description="命中提示词缓存的输入令牌数")
     total_tokens: Optional[int] = Field(None, description="总令牌数")
     ai_cost: Optional[float] = Field(None, description="AI成本")
+    cache_hit: bool = Field(False, description="是否命中AI响应缓存")
+    saved_cost: Optional[float] = Field(None, description="缓存命中节省的成本")
+    time_to_first_token_ms: Optional[int] = Field(None, description="首Token延迟（毫秒）")
+    tokens_per_second: Optional[float] = Field(None, description="输出速度（token/秒）")
+    served_model_id: Optional[int] = Field(None, description="实际返回结果的AI模型ID")
+    hedged: bool = Field(False, description="是否触发了对冲请求")
     
     # 分析结果
     analysis_result: Optional[Dict[str, Any]] = Field(None, description="分析结果")
@@ -319,6 +326,7 @@ class TaskExecutionMetrics(BaseModel):
     # AI指标
     input_tokens: Optional[int] = Field(None, description="输入令牌数")
     output_tokens: Optional[int] = Field(None, description="输出令牌数")
+    cached_tokens: Optional[int] = Field(None, description="命中提示词缓存的输入令牌数")
     total_tokens: Optional[int] = Field(None, description="总令牌数")
     ai_cost: Optional[float] = Field(None, description="AI成本")
     
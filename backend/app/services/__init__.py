@@ -0,0 +1,71 @@
+"""业务逻辑服务包
+
+封装AI调用、并发控制、熔断、响应缓存、离线批量推理、飞书回写等核心业务逻辑。
+"""
+
+from .concurrency import DistributedSemaphore, model_semaphore
+from .adaptive_concurrency import AdaptiveConcurrencyLimiter, AIMDController, adaptive_limiter
+from .circuit_breaker import CircuitBreaker, circuit_breaker
+from .latency import LatencyHistogram, ModelRateLimiter, latency_histogram, rate_limiter
+from .progress import ProgressPublisher, progress_channel
+from .ai_cache import AIResponseCache, ai_response_cache
+from .ai_service import AIService, ai_service
+from .batch_inference import BatchInferenceService, batch_inference_service
+from .feishu_service import FeishuService, FeishuTokenManager, feishu_service
+from .write_back_cache import LastWrittenCache, last_written_cache
+from .write_back import WriteBackCoalescer, write_back_coalescer
+from .sandbox import SandboxPool, sandbox_pool
+from .cancellation import CancellationRegistry, cancellation_registry, request_cancel
+from .single_flight import SingleFlight, single_flight
+from .pipeline import PipelineExecutor, build_default_stages
+from .scheduler import ExecutionScheduler, FairQueue
+from .retry_scheduler import HierarchicalTimerWheel, RetryScheduler
+from .leader_election import LeaderElection
+from .cron_scheduler import CronExpression, CronScheduler
+from .snapshot_migration import migrate_inline_snapshots
+
+__all__ = [
+    "DistributedSemaphore",
+    "model_semaphore",
+    "AdaptiveConcurrencyLimiter",
+    "AIMDController",
+    "adaptive_limiter",
+    "CircuitBreaker",
+    "circuit_breaker",
+    "LatencyHistogram",
+    "ModelRateLimiter",
+    "latency_histogram",
+    "rate_limiter",
+    "ProgressPublisher",
+    "progress_channel",
+    "AIResponseCache",
+    "ai_response_cache",
+    "AIService",
+    "ai_service",
+    "BatchInferenceService",
+    "batch_inference_service",
+    "FeishuService",
+    "FeishuTokenManager",
+    "feishu_service",
+    "LastWrittenCache",
+    "last_written_cache",
+    "WriteBackCoalescer",
+    "write_back_coalescer",
+    "SandboxPool",
+    "sandbox_pool",
+    "CancellationRegistry",
+    "cancellation_registry",
+    "request_cancel",
+    "SingleFlight",
+    "single_flight",
+    "PipelineExecutor",
+    "build_default_stages",
+    "ExecutionScheduler",
+    "FairQueue",
+    "HierarchicalTimerWheel",
+    "RetryScheduler",
+    "LeaderElection",
+    "CronExpression",
+    "CronScheduler",
+    "migrate_inline_snapshots",
+]
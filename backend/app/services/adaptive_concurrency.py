@@ -0,0 +1,231 @@
+"""自适应并发控制（AIMD）
+
+按模型动态调整并发上限，取代固定的 AIModel.max_concurrent_requests（该值作为上限）：
+
+- 加性增（Additive Increase）：请求成功且耗时正常时，上限每次增加 increase/limit，
+  约相当于每轮并发全部成功后上限加 increase；
+- 乘性减（Multiplicative Decrease）：遇到429、503、超时或耗时突增（超过平滑耗时的
+  spike_ratio 倍）时，上限乘以 backoff。冷却时间内的连续失败只减一次，避免一次突发把上限压到底。
+
+控制算法（AIMDController）为纯计算逻辑；AdaptiveConcurrencyLimiter 把状态存放在Redis中，
+所有worker共享同一个上限，并记录调整历史和Prometheus指标。
+"""
+
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.core.exceptions import AIServiceError
+from app.core.metrics import AI_CONCURRENCY_ADJUSTMENTS, AI_CONCURRENCY_LIMIT
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# 视为服务端过载的HTTP状态码
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+@dataclass
+class AIMDState:
+    """自适应并发状态"""
+
+    limit: float
+    latency_ewma: Optional[float] = None
+    samples: int = 0
+    last_decrease: float = 0.0
+
+
+class AIMDController:
+    """AIMD并发上限算法"""
+
+    def __init__(
+        self,
+        ceiling: int,
+        floor: Optional[int] = None,
+        increase: Optional[float] = None,
+        backoff: Optional[float] = None,
+        spike_ratio: Optional[float] = None,
+        cooldown_seconds: Optional[float] = None,
+        min_samples: int = 10,
+        ewma_alpha: float = 0.1,
+    ):
+        self.ceiling = max(int(ceiling or 1), 1)
+        self.floor = min(floor or settings.AI_ADAPTIVE_MIN_LIMIT, self.ceiling)
+        self.increase = increase or settings.AI_ADAPTIVE_INCREASE
+        self.backoff = backoff or settings.AI_ADAPTIVE_BACKOFF
+        self.spike_ratio = spike_ratio or settings.AI_ADAPTIVE_LATENCY_SPIKE_RATIO
+        self.cooldown_seconds = (
+            settings.AI_ADAPTIVE_DECREASE_COOLDOWN if cooldown_seconds is None else cooldown_seconds
+        )
+        self.min_samples = min_samples
+        self.ewma_alpha = ewma_alpha
+
+    def initial_state(self) -> AIMDState:
+        return AIMDState(limit=float(self.ceiling))
+
+    def on_success(
+        self, state: AIMDState, latency: Optional[float], now: float
+    ) -> Tuple[AIMDState, Optional[str]]:
+        """成功响应：耗时突增时减小上限，否则加性增；返回新状态和调整原因
+
+        latency 为None时（如流式调用）只做加性增，不参与耗时突增判断。
+        """
+        if latency is not None:
+            spike = (
+                state.samples >= self.min_samples
+                and state.latency_ewma is not None
+                and latency > state.latency_ewma * self.spike_ratio
+            )
+
+            if state.latency_ewma is None:
+                state.latency_ewma = latency
+            else:
+                state.latency_ewma += self.ewma_alpha * (latency - state.latency_ewma)
+            state.samples += 1
+
+            if spike:
+                return self._decrease(state, now, "latency_spike")
+
+        if state.limit >= self.ceiling:
+            state.limit = float(self.ceiling)
+            return state, None
+        state.limit = min(float(self.ceiling), state.limit + self.increase / max(state.limit, 1.0))
+        return state, "increase"
+
+    def on_overload(self, state: AIMDState, reason: str, now: float) -> Tuple[AIMDState, Optional[str]]:
+        """过载信号：乘性减"""
+        return self._decrease(state, now, reason)
+
+    def _decrease(self, state: AIMDState, now: float, reason: str) -> Tuple[AIMDState, Optional[str]]:
+        if now - state.last_decrease < self.cooldown_seconds:
+            return state, None
+        new_limit = max(float(self.floor), state.limit * self.backoff)
+        state.last_decrease = now
+        if new_limit == state.limit:
+            return state, None
+        state.limit = new_limit
+        return state, reason
+
+
+def overload_reason(error: AIServiceError) -> Optional[str]:
+    """判断错误是否为过载信号，返回原因"""
+    if error.details.get("timeout"):
+        return "timeout"
+    status_code = error.details.get("status_code")
+    if status_code in OVERLOAD_STATUS_CODES:
+        return f"http_{status_code}"
+    return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """基于Redis共享状态的模型自适应并发上限"""
+
+    def __init__(self, redis_client=None, prefix: str = "adaptive_concurrency", history_size: Optional[int] = None):
+        self._redis = redis_client
+        self.prefix = prefix
+        self.history_size = history_size or settings.AI_ADAPTIVE_HISTORY_SIZE
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    def _state_key(self, model_id: int) -> str:
+        return f"{self.prefix}:{model_id}:state"
+
+    def _history_key(self, model_id: int) -> str:
+        return f"{self.prefix}:{model_id}:history"
+
+    def controller(self, model) -> AIMDController:
+        return AIMDController(ceiling=model.max_concurrent_requests or 1)
+
+    async def current_limit(self, model) -> int:
+        """当前并发上限（取整，不超过max_concurrent_requests）"""
+        ceiling = max(model.max_concurrent_requests or 1, 1)
+        try:
+            raw = await self.redis.hget(self._state_key(model.id), "limit")
+        except Exception as e:
+            logger.warning(f"读取自适应并发上限失败 {model.id}: {e}")
+            return ceiling
+        if raw is None:
+            return ceiling
+        return max(1, min(ceiling, int(float(raw))))
+
+    async def record_success(self, model, latency: Optional[float]):
+        await self._update(model, lambda c, s, now: c.on_success(s, latency, now))
+
+    async def record_failure(self, model, error: AIServiceError):
+        reason = overload_reason(error)
+        if reason:
+            await self._update(model, lambda c, s, now: c.on_overload(s, reason, now))
+
+    async def _update(self, model, step):
+        """以乐观锁方式读取、计算并写回状态"""
+        controller = self.controller(model)
+        key = self._state_key(model.id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for _ in range(5):
+                    try:
+                        await pipe.watch(key)
+                        raw = await pipe.hgetall(key)
+                        state = self._load(raw) if raw else controller.initial_state()
+                        before = int(state.limit)
+                        state, reason = step(controller, state, time.time())
+
+                        pipe.multi()
+                        pipe.hset(key, mapping={k: json.dumps(v) for k, v in asdict(state).items()})
+                        pipe.expire(key, 7 * 86400)
+                        await pipe.execute()
+                        break
+                    except WatchError:
+                        # 其他worker同时更新，重新读取后重试
+                        continue
+                else:
+                    return
+        except Exception as e:
+            logger.warning(f"更新自适应并发上限失败 {model.id}: {e}")
+            return
+
+        if reason:
+            await self._on_adjusted(model, before, state, reason)
+
+    @staticmethod
+    def _load(raw: Dict[str, str]) -> AIMDState:
+        return AIMDState(**{k: json.loads(v) for k, v in raw.items() if k in AIMDState.__dataclass_fields__})
+
+    async def _on_adjusted(self, model, before: int, state: AIMDState, reason: str):
+        """记录调整：指标与历史（整数上限变化时）"""
+        after = int(state.limit)
+        AI_CONCURRENCY_LIMIT.labels(model_id=str(model.id)).set(after)
+        if after == before:
+            return
+
+        direction = "up" if after > before else "down"
+        AI_CONCURRENCY_ADJUSTMENTS.labels(model_id=str(model.id), direction=direction, reason=reason).inc()
+        entry = json.dumps({"ts": time.time(), "limit": after, "previous": before, "reason": reason})
+        try:
+            pipe = self.redis.pipeline()
+            pipe.lpush(self._history_key(model.id), entry)
+            pipe.ltrim(self._history_key(model.id), 0, self.history_size - 1)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录并发上限调整历史失败 {model.id}: {e}")
+
+        if direction == "down":
+            logger.info(f"AI模型{model.id}并发上限 {before} -> {after}（{reason}）")
+
+    async def history(self, model_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的上限调整记录（新的在前）"""
+        entries = await self.redis.lrange(self._history_key(model_id), 0, limit - 1)
+        return [json.loads(entry) for entry in entries]
+
+
+# 创建全局自适应并发控制实例
+adaptive_limiter = AdaptiveConcurrencyLimiter()
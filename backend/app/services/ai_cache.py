@@ -0,0 +1,174 @@
+"""AI响应缓存
+
+对同一模型（模型ID与接口地址）、请求参数（AIModel.get_request_params()）与渲染后的提示词完全一致的
+请求做精确匹配缓存。缓存存放在Redis中，单条记录带TTL，总大小超过上限时按最近最少使用（LRU）淘汰。
+记录过期后，大小计数在下次未命中或淘汰时修正。
+
+任务通过 analysis_config 开启：
+
+    {"response_cache": {"enabled": true, "ttl_seconds": 86400}}
+"""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_options(task) -> Optional[Dict[str, Any]]:
+    """读取任务的缓存配置，未开启时返回None"""
+    options = (task.analysis_config or {}).get("response_cache")
+    if isinstance(options, bool):
+        options = {"enabled": options}
+    if not options or not options.get("enabled"):
+        return None
+    return options
+
+
+# 写入记录并按新旧大小之差调整总大小，返回调整后的总大小
+# KEYS: lru, sizes, bytes, entry  ARGV: key, value, ttl, timestamp, size
+_SET_SCRIPT = """
+local previous = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[3])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[5])
+return redis.call('INCRBY', KEYS[3], tonumber(ARGV[5]) - previous)
+"""
+
+# 删除记录及其索引并扣减总大小，返回释放的字节数；ARGV[2] 为 1 时仅在记录已过期时删除索引
+# KEYS: lru, sizes, bytes, entry  ARGV: key, expired_only
+_REMOVE_SCRIPT = """
+if ARGV[2] == '1' and redis.call('EXISTS', KEYS[4]) == 1 then
+    return 0
+end
+local size = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+redis.call('DEL', KEYS[4])
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if size > 0 then
+    redis.call('DECRBY', KEYS[3], size)
+end
+return size
+"""
+
+
+def compute_cache_key(model, params: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+    """计算缓存键：模型标识、请求参数与消息列表的规范化JSON的SHA-256
+
+    请求参数中只有模型名，不同接口地址（或同名的不同模型配置）返回的结果不能互相复用。
+    """
+    canonical = json.dumps(
+        {
+            "model": {"id": model.id, "api_endpoint": model.api_endpoint},
+            "params": params,
+            "messages": messages,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    """基于Redis的AI响应缓存"""
+
+    def __init__(self, max_bytes: Optional[int] = None, redis_client=None, prefix: str = "ai_cache"):
+        self.max_bytes = max_bytes or settings.AI_RESPONSE_CACHE_MAX_BYTES
+        self._redis = redis_client
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.sizes_key = f"{prefix}:sizes"
+        self.bytes_key = f"{prefix}:bytes"
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def _keys(self, key: str) -> List[str]:
+        return [self.lru_key, self.sizes_key, self.bytes_key, self._entry_key(key)]
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，命中时刷新访问时间"""
+        try:
+            raw = await self.redis.get(self._entry_key(key))
+            if raw is None:
+                # 记录可能已过期，清理残留索引并修正总大小
+                await self._remove(key, expired_only=True)
+                return None
+            await self.redis.zadd(self.lru_key, {key: time.time()})
+            return json.loads(raw)
+        except Exception as e:
+            # 缓存不可用时不影响正常调用
+            logger.warning(f"读取AI响应缓存失败: {e}")
+            return None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        """写入缓存并在超出大小上限时淘汰旧记录"""
+        try:
+            raw = json.dumps(value, ensure_ascii=False)
+            size = len(raw.encode("utf-8"))
+            if size > self.max_bytes:
+                return
+
+            ttl = int(ttl_seconds or settings.AI_RESPONSE_CACHE_TTL)
+            # 读旧大小、写入、调整总大小在同一脚本中完成，并发写入同一键时计数不会错
+            total = int(await self.redis.eval(
+                _SET_SCRIPT, 4, *self._keys(key), key, raw, ttl, time.time(), size
+            ))
+            if total > self.max_bytes:
+                await self._evict()
+        except Exception as e:
+            logger.warning(f"写入AI响应缓存失败: {e}")
+
+    async def _evict(self):
+        """按最近最少使用顺序淘汰，直到总大小不超过上限
+
+        先清理已过期记录的残留索引，总大小仍超过上限时再淘汰未过期的记录。
+        """
+        total = await self.reconcile()
+        while total > self.max_bytes:
+            oldest = await self.redis.zrange(self.lru_key, 0, 15)
+            if not oldest:
+                # 索引已空但计数残留，重置计数
+                await self.redis.set(self.bytes_key, 0)
+                return
+            for key in oldest:
+                total -= await self._remove(key)
+                if total <= self.max_bytes:
+                    break
+
+    async def _remove(self, key: str, expired_only: bool = False) -> int:
+        """删除一条缓存记录，返回释放的字节数"""
+        if isinstance(key, bytes):
+            key = key.decode()
+        return int(await self.redis.eval(_REMOVE_SCRIPT, 4, *self._keys(key), key, int(expired_only)))
+
+    async def reconcile(self) -> int:
+        """清理已过期记录的残留索引（TTL到期不会扣减总大小），返回修正后的总大小"""
+        async for member, _ in self.redis.zscan_iter(self.lru_key, count=500):
+            await self._remove(member, expired_only=True)
+        return int(await self.redis.get(self.bytes_key) or 0)
+
+    async def stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            "entries": await self.redis.zcard(self.lru_key),
+            "bytes": int(await self.redis.get(self.bytes_key) or 0),
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 创建全局AI响应缓存实例
+ai_response_cache = AIResponseCache()
@@ -0,0 +1,749 @@
+"""AI分析服务
+
+负责构建提示词、调用OpenAI兼容的聊天补全接口，并将Token消耗与成本记录到执行记录。
+所有出站请求都经过模型级分布式信号量，保证不超过AIModel.max_concurrent_requests。
+配置了备用模型链的任务使用对冲请求，降低单一供应商的长尾延迟；
+模型熔断期间请求被快速拒绝，或改由备用模型处理。
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import AIServiceError, CircuitOpenError
+from app.core.security import decrypt_sensitive_data
+from app.services.adaptive_concurrency import adaptive_limiter
+from app.services.ai_cache import ai_response_cache, compute_cache_key, get_cache_options
+from app.services.circuit_breaker import circuit_breaker
+from app.services.concurrency import model_semaphore
+from app.services.hedging import get_fallback_chain, hedge_delay, is_hedging_enabled
+from app.services.latency import latency_histogram, rate_limiter
+from app.services.progress import ProgressPublisher
+from app.services.spans import child_span
+from app.services.token_budget import ChunkPlanner, TokenEstimator, get_prompt_budget
+from app.utils.template_engine import extract_variables, lookup_value, render_template, variable_marker
+
+logger = logging.getLogger(__name__)
+
+# 分段分析后汇总（reduce）步骤的默认提示词
+DEFAULT_REDUCE_TEMPLATE = (
+    "以下是对同一份文档各个分段分别进行分析得到的结果。"
+    "请综合这些分段结果，按照原始分析要求给出针对整份文档的最终结论。\n\n"
+    "原始分析要求：\n{{task_instruction}}\n\n"
+    "分段分析结果：\n{{partial_results}}"
+)
+# 汇总结果仍超预算时最多进行的汇总轮数
+MAX_REDUCE_ROUNDS = 3
+
+# 稳定前缀提示词布局：系统提示词与模板静态文本在前，每次执行的变量取值统一放在末尾，
+# 使同一任务的请求共享相同前缀，命中供应商侧的提示词缓存
+PREFIX_CACHE_LAYOUT = "prefix_cache"
+
+
+def parse_cached_tokens(usage: Dict[str, Any]) -> int:
+    """解析命中供应商提示词缓存的输入token数（兼容各家返回格式）"""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(
+        details.get("cached_tokens")
+        or usage.get("cached_tokens")
+        or usage.get("prompt_cache_hit_tokens")
+        or 0
+    )
+
+
+def _sum_usage(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    """累加多次调用的Token用量"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    for result in results:
+        for key in usage:
+            usage[key] += result["usage"].get(key, 0)
+    return usage
+
+
+class AIService:
+    """AI分析服务"""
+
+    def __init__(self, timeout: Optional[int] = None):
+        self.timeout = timeout or settings.AI_REQUEST_TIMEOUT
+
+    def build_messages(self, task, variables: Dict[str, Any]) -> List[Dict[str, str]]:
+        """根据任务的提示词配置构建消息列表"""
+        analysis_config = task.analysis_config or {}
+        if analysis_config.get("prompt_layout") == PREFIX_CACHE_LAYOUT:
+            return self._build_prefix_messages(task, variables, analysis_config)
+
+        messages = []
+        if task.system_prompt:
+            messages.append({"role": "system", "content": render_template(task.system_prompt, variables)})
+        if task.user_prompt_template:
+            messages.append({"role": "user", "content": render_template(task.user_prompt_template, variables)})
+        return messages
+
+    def _build_prefix_messages(
+        self,
+        task,
+        variables: Dict[str, Any],
+        analysis_config: Dict[str, Any],
+    ) -> List[Dict[str, str]]:
+        """按稳定前缀布局构建消息列表
+
+        模板中引用的变量默认都视为每次执行不同，在模板中替换为引用标记，
+        取值按首次出现的顺序追加到用户消息末尾；analysis_config.static_variables
+        中列出的变量（如任务级固定参数）仍直接展开在前缀中。
+        """
+        static_variables = set(analysis_config.get("static_variables") or [])
+        deferred: List[str] = []
+        for template in (task.system_prompt, task.user_prompt_template):
+            for name in extract_variables(template):
+                if name in static_variables or name in deferred:
+                    continue
+                # 变量名可以是点号路径（如 trigger.title）
+                if lookup_value(variables, name) is not None:
+                    deferred.append(name)
+
+        messages = []
+        if task.system_prompt:
+            messages.append({
+                "role": "system",
+                "content": render_template(task.system_prompt, variables, deferred=deferred),
+            })
+
+        prefix = render_template(task.user_prompt_template, variables, deferred=deferred)
+        tail = "\n\n".join(f"{variable_marker(name)}\n{lookup_value(variables, name)}" for name in deferred)
+        content = "\n\n".join(part for part in (prefix, tail) if part)
+        if content:
+            messages.append({"role": "user", "content": content})
+        return messages
+
+    def build_payload(self, model, messages: List[Dict[str, str]], custom_params: Optional[dict] = None) -> dict:
+        """构建请求体"""
+        payload = model.get_request_params(custom_params)
+        payload["messages"] = messages
+        return payload
+
+    def _headers(self, model) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if model.api_key_encrypted:
+            headers["Authorization"] = f"Bearer {decrypt_sensitive_data(model.api_key_encrypted)}"
+        return headers
+
+    async def _post_chat(self, model, payload: dict) -> dict:
+        """发送聊天补全请求"""
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(model.api_endpoint, json=payload, headers=self._headers(model))
+        except httpx.TimeoutException as e:
+            raise AIServiceError(f"AI请求超时: {model.name}", {"model_id": model.id, "timeout": True}) from e
+        except httpx.HTTPError as e:
+            raise AIServiceError(f"AI请求失败: {e}", {"model_id": model.id}) from e
+
+        if response.status_code >= 400:
+            raise AIServiceError(
+                f"AI接口返回错误状态码: {response.status_code}",
+                {"model_id": model.id, "status_code": response.status_code, "body": response.text[:1000]},
+            )
+        return response.json()
+
+    def parse_response(self, response: dict, latency: float) -> Dict[str, Any]:
+        """解析聊天补全响应"""
+        choices = response.get("choices") or []
+        content = ""
+        finish_reason = None
+        if choices:
+            content = (choices[0].get("message") or {}).get("content") or ""
+            finish_reason = choices[0].get("finish_reason")
+
+        usage = response.get("usage") or {}
+        return {
+            "content": content,
+            "finish_reason": finish_reason,
+            "model": response.get("model"),
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+                "cached_tokens": parse_cached_tokens(usage),
+            },
+            "latency_seconds": latency,
+            "raw": response,
+        }
+
+    async def chat_completion(
+        self,
+        model,
+        messages: List[Dict[str, str]],
+        priority: int = 0,
+        custom_params: Optional[dict] = None,
+    ) -> Dict[str, Any]:
+        """调用聊天补全接口（受模型并发名额限制）"""
+        payload = self.build_payload(model, messages, custom_params)
+
+        await circuit_breaker.before_call(model)
+        async with model_semaphore(model).hold(priority=priority):
+            start = time.monotonic()
+            try:
+                response = await self._post_chat(model, payload)
+            except AIServiceError as e:
+                await self._on_call_failure(model, e, time.monotonic() - start)
+                raise
+            except asyncio.CancelledError:
+                # 被取消（如对冲中落败）的请求耗时至少为已等待的时间，同样计入延迟直方图
+                await latency_histogram.observe(model.id, time.monotonic() - start)
+                raise
+            latency = time.monotonic() - start
+
+        await self._on_call_success(model, latency)
+        return self.parse_response(response, latency)
+
+    async def _on_call_success(self, model, latency: float, streaming: bool = False):
+        """上报成功调用：熔断统计、自适应并发与延迟直方图
+
+        流式调用传入首Token延迟，与非流式的完整耗时不可比，不计入延迟直方图和耗时突增判断。
+        """
+        await circuit_breaker.record_success(model, latency)
+        await adaptive_limiter.record_success(model, None if streaming else latency)
+        if not streaming:
+            await latency_histogram.observe(model.id, latency)
+
+    async def _on_call_failure(self, model, error: AIServiceError, latency: Optional[float] = None):
+        """上报失败调用：熔断统计与自适应并发
+
+        传入耗时（非流式调用）时同样计入延迟直方图，超时和报错的请求不计入会使分位数偏低。
+        """
+        await circuit_breaker.record_failure(model, error)
+        await adaptive_limiter.record_failure(model, error)
+        if latency is not None:
+            await latency_histogram.observe(model.id, latency)
+
+    async def hedged_completion(
+        self,
+        models: List[Any],
+        messages: List[Dict[str, str]],
+        priority: int = 0,
+        custom_params: Optional[dict] = None,
+        hedging: bool = True,
+        losers: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """沿模型链发起对冲请求
+
+        当前最后发出的请求超过其模型的p95耗时仍未返回时，向链上下一个模型发出同样的请求；
+        任一请求报错时立即切换。先成功返回者胜出，其余在途请求被取消。
+        熔断中或超出调用频率限制的模型会被跳过。返回结果中带有胜出模型（served_model）和各次尝试记录。
+        未采用结果但同样会被计费的请求追加到调用方传入的losers中（被取消的请求按提示词估算Token），
+        请求链成功、失败或被取消时都会填充。
+        """
+        start = time.monotonic()
+        candidates = list(models)
+        in_flight: Dict[asyncio.Task, Any] = {}
+        attempts: List[Dict[str, Any]] = []
+        losers = losers if losers is not None else []
+        last_error: Optional[AIServiceError] = None
+        last_model = None
+
+        async def launch_next() -> bool:
+            nonlocal last_model
+            while candidates:
+                model = candidates.pop(0)
+                if not await circuit_breaker.allows(model):
+                    attempts.append({"model_id": model.id, "skipped": "circuit_open"})
+                    continue
+                if not await rate_limiter.try_acquire(model):
+                    attempts.append({"model_id": model.id, "skipped": "rate_limited"})
+                    continue
+                task = asyncio.create_task(self._attempt(model, messages, priority, custom_params))
+                in_flight[task] = model
+                attempts.append({"model_id": model.id, "started_at": round(time.monotonic() - start, 3)})
+                last_model = model
+                return True
+            return False
+
+        try:
+            await launch_next()
+            while in_flight:
+                timeout = await hedge_delay(last_model) if hedging and candidates else None
+                done, _ = await asyncio.wait(in_flight.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 超过p95仍未返回，发出对冲请求
+                    await launch_next()
+                    continue
+
+                winner = None
+                for task in done:
+                    model = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except AIServiceError as e:
+                        last_error = e
+                        attempts.append({"model_id": model.id, "error": e.message})
+                        logger.warning(f"模型{model.id}请求失败，切换备用模型: {e.message}")
+                        continue
+
+                    if winner is not None:
+                        # 同时返回的其他请求，结果不用但已产生费用
+                        losers.append({"model": model, "usage": result["usage"], "estimated": False})
+                        continue
+                    attempts.append({"model_id": model.id, "won_at": round(time.monotonic() - start, 3)})
+                    winner = result
+                    winner["served_model"] = model
+                    winner["hedge_attempts"] = attempts
+
+                if winner is not None:
+                    return winner
+
+                # 完成的请求均失败，立即切换到下一个模型
+                await launch_next()
+        finally:
+            if in_flight:
+                for task in in_flight:
+                    task.cancel()
+                # 等待取消完成，释放并发名额并记录耗时
+                await asyncio.gather(*in_flight, return_exceptions=True)
+                for task, model in in_flight.items():
+                    if task.cancelled():
+                        # 被取消的请求供应商通常已按提示词计费，输出Token未知记为0
+                        attempts.append({"model_id": model.id, "cancelled_at": round(time.monotonic() - start, 3)})
+                        prompt_tokens = TokenEstimator(model.model_name or model.name).count_messages(messages)
+                        losers.append({
+                            "model": model,
+                            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 0, "total_tokens": prompt_tokens},
+                            "estimated": True,
+                        })
+                    elif task.exception() is not None:
+                        attempts.append({"model_id": model.id, "error": str(task.exception())})
+                    else:
+                        # 取消前已返回
+                        losers.append({"model": model, "usage": task.result()["usage"], "estimated": False})
+
+        if last_error is not None:
+            raise AIServiceError(f"模型链全部请求失败: {last_error.message}", {"attempts": attempts})
+        raise CircuitOpenError("模型链中没有可用的模型（均已熔断或超出调用频率限制）", {"attempts": attempts})
+
+    async def _attempt(self, model, messages: List[Dict[str, str]], priority: int, custom_params: Optional[dict]):
+        """模型链中的一次请求，记录为子跨度"""
+        with child_span("ai_attempt", resource=f"ai_model:{model.id}"):
+            return await self.chat_completion(model, messages, priority, custom_params)
+
+    async def stream_completion(
+        self,
+        model,
+        messages: List[Dict[str, str]],
+        priority: int = 0,
+        custom_params: Optional[dict] = None,
+        publisher: Optional[ProgressPublisher] = None,
+        stop_pattern: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """以流式方式调用聊天补全接口
+
+        增量输出推送到进度频道；配置了stop_pattern时，一旦已生成内容匹配到结论即断开连接，
+        提前结束生成以节省延迟和输出Token。
+        """
+        payload = self.build_payload(model, messages, custom_params)
+        payload["stream"] = True
+        payload.setdefault("stream_options", {"include_usage": True})
+        pattern = re.compile(stop_pattern) if stop_pattern else None
+
+        parts: List[str] = []
+        usage = None
+        finish_reason = None
+        verdict = None
+        first_token_at = None
+
+        await circuit_breaker.before_call(model)
+        async with model_semaphore(model).hold(priority=priority):
+            start = time.monotonic()
+            try:
+                async with httpx.AsyncClient(timeout=self.timeout) as client:
+                    async with client.stream(
+                        "POST", model.api_endpoint, json=payload, headers=self._headers(model)
+                    ) as response:
+                        if response.status_code >= 400:
+                            body = (await response.aread()).decode("utf-8", errors="replace")
+                            raise AIServiceError(
+                                f"AI接口返回错误状态码: {response.status_code}",
+                                {"model_id": model.id, "status_code": response.status_code, "body": body[:1000]},
+                            )
+
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            try:
+                                event = json.loads(data)
+                            except ValueError:
+                                continue
+
+                            if event.get("usage"):
+                                usage = event["usage"]
+
+                            new_content = False
+                            for choice in event.get("choices") or []:
+                                if choice.get("finish_reason"):
+                                    finish_reason = choice["finish_reason"]
+                                delta = (choice.get("delta") or {}).get("content")
+                                if delta:
+                                    if first_token_at is None:
+                                        first_token_at = time.monotonic()
+                                    parts.append(delta)
+                                    new_content = True
+
+                            if not new_content:
+                                continue
+                            if publisher is not None:
+                                await publisher.delta(parts[-1], sum(len(p) for p in parts))
+                            if pattern is not None:
+                                match = pattern.search("".join(parts))
+                                if match:
+                                    verdict = match.group(1) if match.groups() else match.group(0)
+                                    finish_reason = "early_stop"
+                                    break
+            except httpx.TimeoutException as e:
+                error = AIServiceError(f"AI请求超时: {model.name}", {"model_id": model.id, "timeout": True})
+                await self._on_call_failure(model, error)
+                raise error from e
+            except httpx.HTTPError as e:
+                error = AIServiceError(f"AI请求失败: {e}", {"model_id": model.id})
+                await self._on_call_failure(model, error)
+                raise error from e
+            except AIServiceError as e:
+                await self._on_call_failure(model, e)
+                raise
+            end = time.monotonic()
+
+        content = "".join(parts)
+        if publisher is not None:
+            await publisher.flush(len(content))
+            await publisher.publish("ai_done", {"finish_reason": finish_reason, "verdict": verdict})
+
+        if not usage:
+            # 提前结束或服务端不返回用量时按本地估算
+            estimator = TokenEstimator(model.model_name or model.name)
+            prompt_tokens = estimator.count_messages(messages)
+            completion_tokens = estimator.count(content)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "estimated": True,
+            }
+
+        ttft = (first_token_at - start) if first_token_at is not None else None
+        # 流式输出的总耗时随输出长度变化，以首Token延迟反映服务端负载
+        await self._on_call_success(model, ttft if ttft is not None else end - start, streaming=True)
+        generation_time = end - (first_token_at or start)
+        completion_tokens = usage.get("completion_tokens", 0)
+        tokens_per_second = completion_tokens / generation_time if generation_time > 0 else None
+
+        return {
+            "content": content,
+            "finish_reason": finish_reason,
+            "model": payload.get("model"),
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": completion_tokens,
+                "total_tokens": usage.get("total_tokens", 0),
+                "cached_tokens": parse_cached_tokens(usage),
+            },
+            "latency_seconds": end - start,
+            "time_to_first_token_ms": int(ttft * 1000) if ttft is not None else None,
+            "tokens_per_second": tokens_per_second,
+            "verdict": verdict,
+            "raw": {
+                "stream": True,
+                "content": content,
+                "finish_reason": finish_reason,
+                "usage": usage,
+            },
+        }
+
+    def record_result(self, execution, model, payload: dict, result: Dict[str, Any], cache_hit: bool = False):
+        """将AI调用结果记录到执行记录和模型统计
+
+        缓存命中时成本记为0，按原始Token数计算的成本记入saved_cost，且不计入模型使用统计。
+        """
+        usage = result["usage"]
+        cached_tokens = usage.get("cached_tokens", 0)
+        cost = model.calculate_cost(usage["prompt_tokens"], usage["completion_tokens"], cached_tokens)
+
+        execution.ai_request_data = payload
+        execution.ai_response_data = result["raw"]
+        execution.ai_model_name = model.model_name or model.name
+        execution.served_model_id = model.id
+        execution.prompt_tokens = usage["prompt_tokens"]
+        execution.completion_tokens = usage["completion_tokens"]
+        execution.cached_tokens = cached_tokens
+        execution.total_tokens = usage["total_tokens"]
+        execution.cache_hit = cache_hit
+
+        if cache_hit:
+            execution.ai_cost = "0.00"
+            execution.saved_cost = f"{cost:.6f}"
+        else:
+            execution.ai_cost = f"{cost:.6f}"
+            model.update_usage_stats(usage["total_tokens"], cost)
+
+    def record_hedge_losers(self, execution, losers: List[Dict[str, Any]]):
+        """对冲中未采用结果的请求同样计费：Token和成本计入执行（ai_cost、total_tokens）及对应模型的使用统计"""
+        if not losers:
+            return
+        total_cost = 0.0
+        total_tokens = 0
+        for loser in losers:
+            model, usage = loser["model"], loser["usage"]
+            cost = model.calculate_cost(usage["prompt_tokens"], usage["completion_tokens"], usage.get("cached_tokens", 0))
+            model.update_usage_stats(usage["total_tokens"], cost)
+            total_cost += cost
+            total_tokens += usage["total_tokens"]
+        execution.hedge_cost = f"{total_cost:.6f}"
+        execution.ai_cost = f"{float(execution.ai_cost or 0) + total_cost:.6f}"
+        execution.total_tokens = (execution.total_tokens or 0) + total_tokens
+
+    async def analyze(self, task, execution, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """执行任务的AI分析步骤
+
+        提示词超出Token预算时，将文件内容分段并发分析后再汇总；
+        analysis_config.streaming开启且模型支持时使用流式输出。
+        """
+        model = task.ai_model
+        if model is None or not model.is_active:
+            raise AIServiceError("任务未配置可用的AI模型", {"task_id": task.id})
+
+        analysis_config = task.analysis_config or {}
+        custom_params = analysis_config.get("model_params")
+        messages = self.build_messages(task, variables)
+
+        estimator = TokenEstimator(model.model_name or model.name)
+        budget = get_prompt_budget(model, analysis_config)
+        content_variable = analysis_config.get("content_variable", "file_content")
+        if estimator.count_messages(messages) > budget and variables.get(content_variable):
+            return await self._analyze_chunked(task, execution, variables, content_variable, estimator, budget)
+
+        payload = self.build_payload(model, messages, custom_params)
+        losers: List[Dict[str, Any]] = []
+
+        cache_options = get_cache_options(task)
+        cache_key = None
+        if cache_options:
+            cache_key = compute_cache_key(model, model.get_request_params(custom_params), messages)
+            execution.cache_key = cache_key
+            cached = await ai_response_cache.get(cache_key)
+            if cached is not None:
+                cached["latency_seconds"] = 0.0
+                self.record_result(execution, model, payload, cached, cache_hit=True)
+                execution.add_log_entry("INFO", "命中AI响应缓存", {"cache_key": cache_key, "usage": cached["usage"]})
+                return cached
+
+        if analysis_config.get("streaming") and model.supports_streaming:
+            result = await self.stream_completion(
+                model,
+                messages,
+                priority=task.queue_priority or 0,
+                custom_params=custom_params,
+                publisher=ProgressPublisher(execution.execution_id),
+                stop_pattern=analysis_config.get("result_pattern"),
+            )
+            execution.time_to_first_token_ms = result["time_to_first_token_ms"]
+            if result["tokens_per_second"] is not None:
+                execution.tokens_per_second = f"{result['tokens_per_second']:.2f}"
+        else:
+            chain = get_fallback_chain(task)
+            if len(chain) > 1:
+                try:
+                    result = await self.hedged_completion(
+                        chain,
+                        messages,
+                        priority=task.queue_priority or 0,
+                        custom_params=custom_params,
+                        hedging=is_hedging_enabled(task),
+                        losers=losers,
+                    )
+                except BaseException:
+                    # 请求链失败或被取消时，已发出的请求同样计费
+                    self.record_hedge_losers(execution, losers)
+                    raise
+                model = result.pop("served_model")
+                payload = self.build_payload(model, messages, custom_params)
+                execution.hedged = sum(1 for a in result["hedge_attempts"] if "started_at" in a) > 1
+                execution.add_log_entry("INFO", f"模型链请求由模型{model.id}返回", {"attempts": result["hedge_attempts"]})
+            else:
+                result = await self.chat_completion(
+                    model,
+                    messages,
+                    priority=task.queue_priority or 0,
+                    custom_params=custom_params,
+                )
+        self.record_result(execution, model, payload, result)
+        self.record_hedge_losers(execution, losers)
+
+        if cache_key:
+            await ai_response_cache.set(
+                cache_key,
+                {key: result[key] for key in ("content", "finish_reason", "model", "usage", "raw")},
+                ttl_seconds=cache_options.get("ttl_seconds"),
+            )
+
+        execution.add_log_entry(
+            "INFO",
+            f"AI分析完成，耗时{result['latency_seconds']:.3f}秒",
+            {"model": execution.ai_model_name, "usage": result["usage"]},
+        )
+        return result
+
+    async def _analyze_chunked(
+        self,
+        task,
+        execution,
+        variables: Dict[str, Any],
+        content_variable: str,
+        estimator: TokenEstimator,
+        budget: int,
+    ) -> Dict[str, Any]:
+        """分段分析（map）后汇总（reduce）"""
+        model = task.ai_model
+        analysis_config = task.analysis_config or {}
+        custom_params = analysis_config.get("model_params")
+        priority = task.queue_priority or 0
+
+        base_tokens = estimator.count_messages(self.build_messages(task, {**variables, content_variable: ""}))
+        chunk_budget = budget - base_tokens
+        if chunk_budget <= 0:
+            raise AIServiceError("提示词模板本身已超出Token预算", {"budget": budget, "template_tokens": base_tokens})
+
+        try:
+            chunks = ChunkPlanner(estimator).plan(str(variables[content_variable]), chunk_budget)
+        except ValueError as e:
+            raise AIServiceError(str(e), {"budget": budget}) from e
+
+        chunk_count = len(chunks)
+        execution.add_log_entry("INFO", f"内容超出Token预算，拆分为{chunk_count}个分段分析", {"budget": budget})
+
+        # 本地再限制一次并发，避免一次性向分布式信号量排入过多等待者
+        local_limit = asyncio.Semaphore(model.max_concurrent_requests or 1)
+
+        async def run_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            chunk_variables = {
+                **variables,
+                content_variable: chunk,
+                "chunk_index": index + 1,
+                "chunk_count": chunk_count,
+            }
+            async with local_limit:
+                with child_span("ai_chunk", resource=f"ai_model:{model.id}", chunk_index=index + 1):
+                    return await self.chat_completion(
+                        model,
+                        self.build_messages(task, chunk_variables),
+                        priority=priority,
+                        custom_params=custom_params,
+                    )
+
+        partials = await asyncio.gather(*(run_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        reduce_results = await self._reduce(task, variables, content_variable, partials, estimator, budget)
+        final = reduce_results[-1]
+
+        all_results = list(partials) + reduce_results
+        result = {
+            **final,
+            "usage": _sum_usage(all_results),
+            "latency_seconds": sum(r["latency_seconds"] for r in all_results),
+            "raw": {"chunks": [r["raw"] for r in partials], "reduce": [r["raw"] for r in reduce_results]},
+            "chunk_count": chunk_count,
+        }
+
+        payload = {
+            "mode": "map_reduce",
+            "chunk_count": chunk_count,
+            "prompt_budget": budget,
+            "params": model.get_request_params(custom_params),
+        }
+        self.record_result(execution, model, payload, result)
+
+        timings = dict(execution.step_timings or {})
+        timings["ai_analysis_chunks"] = {
+            "chunk_count": chunk_count,
+            "chunk_tokens": [estimator.count(chunk) for chunk in chunks],
+            "chunk_latencies": [round(r["latency_seconds"], 3) for r in partials],
+            "reduce_calls": len(reduce_results),
+            "reduce_latency": round(sum(r["latency_seconds"] for r in reduce_results), 3),
+        }
+        execution.step_timings = timings
+
+        execution.add_log_entry(
+            "INFO",
+            f"分段AI分析完成，共{chunk_count}个分段，{len(reduce_results)}次汇总",
+            {"model": execution.ai_model_name, "usage": result["usage"]},
+        )
+        return result
+
+    async def _reduce(
+        self,
+        task,
+        variables: Dict[str, Any],
+        content_variable: str,
+        partials: List[Dict[str, Any]],
+        estimator: TokenEstimator,
+        budget: int,
+    ) -> List[Dict[str, Any]]:
+        """汇总分段结果，结果过长时分组逐轮汇总，返回所有汇总调用结果（最后一个为最终结果）"""
+        model = task.ai_model
+        analysis_config = task.analysis_config or {}
+        custom_params = analysis_config.get("model_params")
+        reduce_template = analysis_config.get("reduce_prompt_template") or DEFAULT_REDUCE_TEMPLATE
+        task_instruction = self.build_messages(
+            task, {**variables, content_variable: "（文档内容已分段分析，见下方分段结果）"}
+        )[-1]["content"] if task.user_prompt_template else ""
+
+        def reduce_messages(partial_results: str) -> List[Dict[str, str]]:
+            messages = []
+            if task.system_prompt:
+                messages.append({"role": "system", "content": render_template(task.system_prompt, variables)})
+            messages.append({
+                "role": "user",
+                "content": render_template(
+                    reduce_template,
+                    {**variables, "task_instruction": task_instruction, "partial_results": partial_results},
+                ),
+            })
+            return messages
+
+        async def reduce_call(messages: List[Dict[str, str]], round_index: int) -> Dict[str, Any]:
+            with child_span("ai_reduce", resource=f"ai_model:{model.id}", round=round_index + 1):
+                return await self.chat_completion(
+                    model, messages, priority=task.queue_priority or 0, custom_params=custom_params
+                )
+
+        calls: List[Dict[str, Any]] = []
+        contents = [r["content"] for r in partials]
+        for round_index in range(MAX_REDUCE_ROUNDS):
+            combined = "\n\n".join(
+                f"【分段{i + 1}/{len(contents)}】\n{content}" for i, content in enumerate(contents)
+            )
+            messages = reduce_messages(combined)
+            if estimator.count_messages(messages) <= budget or len(contents) <= 1:
+                calls.append(await reduce_call(messages, round_index))
+                return calls
+
+            # 分组汇总后进入下一轮
+            group_budget = budget - estimator.count_messages(reduce_messages(""))
+            try:
+                groups = ChunkPlanner(estimator).plan(combined, max(group_budget, 1))
+            except ValueError as e:
+                raise AIServiceError(str(e), {"budget": budget, "round": round_index + 1}) from e
+            group_results = await asyncio.gather(*(
+                reduce_call(reduce_messages(group), round_index) for group in groups
+            ))
+            calls.extend(group_results)
+            contents = [r["content"] for r in group_results]
+
+        raise AIServiceError("分段汇总结果仍超出Token预算", {"budget": budget, "rounds": MAX_REDUCE_ROUNDS})
+
+
+# 创建全局AI服务实例
+ai_service = AIService()
@@ -0,0 +1,338 @@
+"""离线批量推理
+
+非实时任务（analysis_config.batch_mode 为真）在AI分析步骤不直接调用模型，
+而是把请求体暂存到执行记录并标记为批量队列。批量服务周期性地：
+
+1. 把待提交的请求按模型汇总成JSONL批次文件，通过供应商批量接口提交；
+2. 轮询批次状态，完成后下载结果并回填到对应的TaskExecution。
+
+供应商批量接口通过 BatchProvider 抽象，默认实现为OpenAI兼容的 Files + Batches 接口，
+可用 app.mock_servers.batch_server 在本地联调。
+
+AI分析步骤（app.services.pipeline.ai_stage）对可延后的执行调用 enqueue；结果回填后
+由 pipeline.resume_deferred 继续回写并结束执行。
+
+    python -m app.services.batch_inference     # 启动批量推理服务
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.exceptions import AIServiceError
+from app.models.ai_model import ModelType
+from app.models.analysis_task import AnalysisTask
+from app.models.execution_payload import ExecutionPayload
+from app.models.task_execution import ExecutionStatus, ExecutionStep, TaskExecution
+from app.services.ai_service import AIService, ai_service
+
+logger = logging.getLogger(__name__)
+
+# 批量推理使用的队列名
+BATCH_QUEUE_NAME = "ai_batch"
+
+# 批次终止状态
+BATCH_FAILED_STATUSES = {"failed", "expired", "cancelled"}
+
+ResultHandler = Callable[[TaskExecution, Dict[str, Any]], Awaitable[None]]
+
+
+def is_deferrable(task, execution=None) -> bool:
+    """判断执行是否可以走离线批量推理"""
+    if execution is not None and execution.queue_name == BATCH_QUEUE_NAME:
+        return True
+    model = task.ai_model
+    return bool((task.analysis_config or {}).get("batch_mode")) and model is not None and bool(model.supports_batch)
+
+
+class BatchProvider(ABC):
+    """供应商批量接口"""
+
+    @abstractmethod
+    async def submit(self, model, input_path: Path) -> str:
+        """提交批次文件，返回供应商批次ID"""
+
+    @abstractmethod
+    async def poll(self, model, batch_id: str) -> Dict[str, Any]:
+        """查询批次状态"""
+
+    @abstractmethod
+    async def fetch_results(self, model, batch_info: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """下载批次结果，返回 custom_id -> 结果 的映射"""
+
+
+class OpenAICompatibleBatchProvider(BatchProvider):
+    """OpenAI兼容的 Files + Batches 批量接口"""
+
+    def __init__(self, ai: AIService = None, timeout: int = 60):
+        self.ai = ai or ai_service
+        self.timeout = timeout
+
+    def _base_url(self, model) -> str:
+        """由聊天补全端点推导API根路径"""
+        endpoint = model.api_endpoint.rstrip("/")
+        suffix = "/chat/completions"
+        if endpoint.endswith(suffix):
+            endpoint = endpoint[: -len(suffix)]
+        return endpoint
+
+    def _auth_headers(self, model) -> Dict[str, str]:
+        headers = self.ai._headers(model)
+        headers.pop("Content-Type", None)
+        return headers
+
+    async def _request(self, model, method: str, path: str, **kwargs) -> httpx.Response:
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.request(
+                    method, f"{self._base_url(model)}{path}", headers=self._auth_headers(model), **kwargs
+                )
+        except httpx.HTTPError as e:
+            raise AIServiceError(f"批量接口请求失败: {e}", {"model_id": model.id, "path": path}) from e
+
+        if response.status_code >= 400:
+            raise AIServiceError(
+                f"批量接口返回错误状态码: {response.status_code}",
+                {"model_id": model.id, "path": path, "body": response.text[:1000]},
+            )
+        return response
+
+    async def submit(self, model, input_path: Path) -> str:
+        with open(input_path, "rb") as f:
+            upload = await self._request(
+                model, "POST", "/files",
+                files={"file": (input_path.name, f, "application/jsonl")},
+                data={"purpose": "batch"},
+            )
+        file_id = upload.json()["id"]
+
+        batch = await self._request(model, "POST", "/batches", json={
+            "input_file_id": file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": settings.AI_BATCH_COMPLETION_WINDOW,
+        })
+        return batch.json()["id"]
+
+    async def poll(self, model, batch_id: str) -> Dict[str, Any]:
+        response = await self._request(model, "GET", f"/batches/{batch_id}")
+        return response.json()
+
+    async def fetch_results(self, model, batch_info: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        for key in ("output_file_id", "error_file_id"):
+            file_id = batch_info.get(key)
+            if not file_id:
+                continue
+            response = await self._request(model, "GET", f"/files/{file_id}/content")
+            for line in response.text.splitlines():
+                if line.strip():
+                    item = json.loads(line)
+                    results[item["custom_id"]] = item
+        return results
+
+
+_providers: Dict[ModelType, BatchProvider] = {}
+_default_provider = OpenAICompatibleBatchProvider()
+
+
+def register_batch_provider(model_type: ModelType, provider: BatchProvider):
+    """为某类模型注册批量接口实现"""
+    _providers[model_type] = provider
+
+
+def get_batch_provider(model) -> BatchProvider:
+    """获取模型对应的批量接口实现"""
+    return _providers.get(model.model_type, _default_provider)
+
+
+class BatchInferenceService:
+    """离线批量推理服务"""
+
+    def __init__(self, ai: AIService = None, work_dir: Optional[str] = None):
+        self.ai = ai or ai_service
+        self.work_dir = Path(work_dir or settings.TEMP_DIR) / "batches"
+
+    def enqueue(self, task, execution: TaskExecution, variables: Dict[str, Any]):
+        """将执行的AI请求暂存，等待下一个批次提交"""
+        messages = self.ai.build_messages(task, variables)
+        custom_params = (task.analysis_config or {}).get("model_params")
+
+        execution.ai_request_data = self.ai.build_payload(task.ai_model, messages, custom_params)
+        execution.queue_name = BATCH_QUEUE_NAME
+        execution.batch_id = None
+        execution.update_step(ExecutionStep.AI_ANALYSIS, {"deferred": True})
+        execution.add_log_entry("INFO", "AI请求已加入离线批量队列")
+
+    def _pending_query(self, db: Session):
+        return (
+            db.query(TaskExecution)
+            .join(AnalysisTask, TaskExecution.task_id == AnalysisTask.id)
+            .filter(
+                TaskExecution.queue_name == BATCH_QUEUE_NAME,
+                TaskExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING]),
+                TaskExecution.batch_id.is_(None),
+                TaskExecution.ai_request_data.isnot(None),
+            )
+        )
+
+    async def submit_pending(self, db: Session) -> List[str]:
+        """把暂存的请求按模型打包提交，返回提交的批次ID列表"""
+        groups: Dict[int, List[TaskExecution]] = {}
+        for execution in self._pending_query(db).limit(settings.AI_BATCH_MAX_REQUESTS * 10).all():
+            groups.setdefault(execution.task.ai_model_id, []).append(execution)
+
+        submitted = []
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        for executions in groups.values():
+            model = executions[0].task.ai_model
+            for start in range(0, len(executions), settings.AI_BATCH_MAX_REQUESTS):
+                batch = executions[start:start + settings.AI_BATCH_MAX_REQUESTS]
+                ExecutionPayload.preload(db, batch, ["ai_request_data"])
+                input_path = self.work_dir / f"batch_{uuid.uuid4().hex}.jsonl"
+                with open(input_path, "w", encoding="utf-8") as f:
+                    for execution in batch:
+                        f.write(json.dumps({
+                            "custom_id": execution.execution_id,
+                            "method": "POST",
+                            "url": "/v1/chat/completions",
+                            "body": execution.ai_request_data,
+                        }, ensure_ascii=False) + "\n")
+
+                try:
+                    batch_id = await get_batch_provider(model).submit(model, input_path)
+                except AIServiceError as e:
+                    logger.error(f"提交批次失败，模型{model.id}: {e.message}")
+                    continue
+                finally:
+                    input_path.unlink(missing_ok=True)
+
+                for execution in batch:
+                    execution.batch_id = batch_id
+                    execution.add_log_entry("INFO", f"已提交离线批次 {batch_id}")
+                db.commit()
+                submitted.append(batch_id)
+                logger.info(f"提交离线批次 {batch_id}，模型{model.id}，请求数{len(batch)}")
+
+        return submitted
+
+    async def poll_batches(self, db: Session, result_handler: Optional[ResultHandler] = None) -> int:
+        """轮询进行中的批次并回填结果，返回处理完成的执行数"""
+        rows = (
+            db.query(TaskExecution.batch_id)
+            .filter(
+                TaskExecution.queue_name == BATCH_QUEUE_NAME,
+                TaskExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING]),
+                TaskExecution.batch_id.isnot(None),
+            )
+            .distinct()
+            .all()
+        )
+
+        handled = 0
+        for (batch_id,) in rows:
+            executions = db.query(TaskExecution).filter(
+                TaskExecution.batch_id == batch_id,
+                TaskExecution.queue_name == BATCH_QUEUE_NAME,
+                TaskExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING]),
+            ).all()
+            if not executions:
+                continue
+
+            model = executions[0].task.ai_model
+            provider = get_batch_provider(model)
+            try:
+                info = await provider.poll(model, batch_id)
+            except AIServiceError as e:
+                logger.warning(f"查询批次状态失败 {batch_id}: {e.message}")
+                continue
+
+            status = info.get("status")
+            if status == "completed":
+                results = await provider.fetch_results(model, info)
+                for execution in executions:
+                    await self._apply_result(execution, model, results.get(execution.execution_id), result_handler)
+                    handled += 1
+            elif status in BATCH_FAILED_STATUSES:
+                for execution in executions:
+                    execution.set_error("AI_BATCH_FAILED", f"离线批次{status}: {batch_id}", {"batch": info})
+                    self._finish(execution, success=False)
+                    handled += 1
+            db.commit()
+
+        return handled
+
+    async def _apply_result(
+        self,
+        execution: TaskExecution,
+        model,
+        item: Optional[Dict[str, Any]],
+        result_handler: Optional[ResultHandler],
+    ):
+        """回填单个执行的批量结果"""
+        response = (item or {}).get("response") or {}
+        if not item or item.get("error") or response.get("status_code", 500) >= 400:
+            execution.set_error("AI_BATCH_REQUEST_FAILED", "离线批次中的请求失败", {"item": item})
+            self._finish(execution, success=False)
+            return
+
+        latency = 0.0
+        if execution.started_at:
+            latency = (datetime.utcnow() - execution.started_at.replace(tzinfo=None)).total_seconds()
+        result = self.ai.parse_response(response.get("body") or {}, latency)
+        self.ai.record_result(execution, model, execution.ai_request_data, result)
+        execution.analysis_result = {"content": result["content"], "finish_reason": result["finish_reason"]}
+        execution.add_log_entry("INFO", f"离线批次结果已回填 {execution.batch_id}", {"usage": result["usage"]})
+
+        if result_handler is not None:
+            await result_handler(execution, result)
+        else:
+            execution.result_summary = result["content"][:500]
+            self._finish(execution, success=True)
+
+    def _finish(self, execution: TaskExecution, success: bool):
+        """结束执行并更新任务统计"""
+        execution.complete_execution(success=success)
+        execution.task.update_execution_stats(
+            success,
+            execution_time=float(execution.duration_seconds or 0),
+            tokens_used=execution.total_tokens or 0,
+            cost=float(execution.ai_cost or 0),
+        )
+
+    async def run_forever(self, session_factory, result_handler: Optional[ResultHandler] = None):
+        """后台循环：提交暂存请求并轮询批次"""
+        while True:
+            db = session_factory()
+            try:
+                await self.submit_pending(db)
+                await self.poll_batches(db, result_handler)
+            except Exception as e:
+                logger.error(f"离线批量推理循环异常: {e}")
+                db.rollback()
+            finally:
+                db.close()
+            await asyncio.sleep(settings.AI_BATCH_POLL_INTERVAL)
+
+
+# 创建全局批量推理服务实例
+batch_inference_service = BatchInferenceService()
+
+
+async def main():
+    from app.core.database import SessionLocal
+    from app.services.pipeline import resume_deferred
+
+    await batch_inference_service.run_forever(SessionLocal, resume_deferred)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
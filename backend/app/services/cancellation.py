@@ -0,0 +1,121 @@
+"""执行取消
+
+request_cancel() 取消一个执行：尚未开始（PENDING/RETRY）的直接置为CANCELLED；
+运行中的通过Redis发布取消消息，运行该执行的进程收到后取消当前步骤中进行中的I/O
+（存储读取、AI调用、回写等待），执行随后以CANCELLED结束并释放worker名额。
+
+取消消息发布的同时写入 execution_cancel:{execution_id} 标记，
+执行在消息发布后才登记（刚被认领）时也能检查到取消请求。
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.models.task_execution import ExecutionStatus, TaskExecution
+
+logger = logging.getLogger(__name__)
+
+CANCEL_CHANNEL = "execution_cancel"
+
+
+def cancel_key(execution_id: int) -> str:
+    """取消标记键名"""
+    return f"execution_cancel:{execution_id}"
+
+
+async def request_cancel(db, execution_id: int, reason: Optional[str] = None) -> bool:
+    """请求取消执行，执行已结束或不存在时返回False"""
+    reason = reason or "用户取消"
+    cancelled = db.query(TaskExecution).filter(
+        TaskExecution.id == execution_id,
+        TaskExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RETRY]),
+    ).update({TaskExecution.status: ExecutionStatus.CANCELLED}, synchronize_session=False)
+    if cancelled:
+        execution = db.get(TaskExecution, execution_id)
+        execution.cancel_execution(reason)
+        db.commit()
+        return True
+
+    execution = db.get(TaskExecution, execution_id)
+    if execution is None or execution.status != ExecutionStatus.RUNNING:
+        db.commit()
+        return False
+
+    redis = get_async_redis()
+    await redis.set(cancel_key(execution_id), reason, ex=settings.TASK_TIMEOUT)
+    await redis.publish(CANCEL_CHANNEL, f"{execution_id}:{reason}")
+    return True
+
+
+class CancellationRegistry:
+    """本进程中运行的执行，收到取消消息时取消对应的执行上下文"""
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._contexts: Dict[int, object] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def register(self, execution_id: int, ctx):
+        """登记执行上下文（ctx需提供cancel(reason)），已有取消请求时立即取消"""
+        self._contexts[execution_id] = ctx
+        self._ensure_listener()
+        try:
+            reason = await self.redis.get(cancel_key(execution_id))
+        except Exception as e:
+            logger.warning(f"检查执行取消标记失败 {execution_id}: {e}")
+            return
+        if reason is not None:
+            ctx.cancel(reason.decode() if isinstance(reason, bytes) else reason)
+
+    def unregister(self, execution_id: int):
+        self._contexts.pop(execution_id, None)
+
+    def cancel(self, execution_id: int, reason: str) -> bool:
+        ctx = self._contexts.get(execution_id)
+        if ctx is None:
+            return False
+        ctx.cancel(reason)
+        return True
+
+    def _ensure_listener(self):
+        # 每个事件循环各自订阅（Celery任务中每次执行都是新的事件循环）
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(CANCEL_CHANNEL)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        data = message["data"]
+                        if isinstance(data, bytes):
+                            data = data.decode()
+                        execution_id, _, reason = data.partition(":")
+                        if execution_id.isdigit() and self.cancel(int(execution_id), reason):
+                            logger.info(f"执行 {execution_id} 收到取消请求: {reason}")
+                finally:
+                    await pubsub.unsubscribe(CANCEL_CHANNEL)
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"订阅执行取消消息失败，稍后重试: {e}")
+                await asyncio.sleep(5)
+
+
+# 创建全局取消登记实例
+cancellation_registry = CancellationRegistry()
@@ -0,0 +1,262 @@
+"""模型级熔断器
+
+每个AIModel一个熔断器，状态保存在Redis中供所有worker共享：
+
+- closed：正常放行，按时间分桶统计滑动窗口内的失败与慢调用；
+  调用数达到下限且失败（含慢调用）比例超过阈值时熔断（open）。
+- open：直接拒绝请求（CircuitOpenError），配置了备用模型链的任务改走备用模型；
+  熔断时长结束后进入half_open。
+- half_open：只放行一个探测请求，成功则恢复closed，失败则重新熔断。
+
+状态变化时同步更新 AIModel.health_status / health_message。
+"""
+
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.core.exceptions import AIServiceError, CircuitOpenError
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 熔断状态对应的模型健康状态
+HEALTH_BY_STATE = {
+    CLOSED: "healthy",
+    OPEN: "unhealthy",
+    HALF_OPEN: "degraded",
+}
+
+# 判断是否放行：open到期后转为half_open并放行一个探测请求
+# 返回 {状态, 是否放行, 状态是否变化}
+_ALLOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local probe_ms = tonumber(ARGV[1])
+
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state or state == 'closed' then
+    return {'closed', 1, 0}
+end
+
+if state == 'open' then
+    local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+    if now < open_until then
+        return {'open', 0, 0}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', now + probe_ms)
+    return {'half_open', 1, 1}
+end
+
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now >= probe_until then
+    -- 上一个探测请求未回报结果（如被取消），重新放行一个
+    redis.call('HSET', KEYS[1], 'probe_until', now + probe_ms)
+    return {'half_open', 1, 0}
+end
+return {'half_open', 0, 0}
+"""
+
+# 只读检查：before_call此刻是否会放行（open到期、half_open探测空闲时视为可放行），不修改状态
+_PEEK_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state or state == 'closed' then
+    return 1
+end
+if state == 'open' then
+    local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+    return now >= open_until and 1 or 0
+end
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+return now >= probe_until and 1 or 0
+"""
+
+# 记录调用结果并计算状态转换，返回 {状态, 状态是否变化}
+_RECORD_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local failed = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local bucket_ms = tonumber(ARGV[3])
+local min_calls = tonumber(ARGV[4])
+local failure_rate = tonumber(ARGV[5])
+local open_ms = tonumber(ARGV[6])
+local reason = ARGV[7]
+
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+
+if state == 'half_open' then
+    if failed == 0 then
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return {'closed', 1}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', now + open_ms, 'reason', reason)
+    return {'open', 1}
+end
+
+if state == 'open' then
+    -- 熔断前发出的请求陆续返回，不影响状态
+    return {'open', 0}
+end
+
+local bucket = math.floor(now / bucket_ms)
+redis.call('HINCRBY', KEYS[2], bucket .. ':t', 1)
+if failed == 1 then
+    redis.call('HINCRBY', KEYS[2], bucket .. ':f', 1)
+end
+redis.call('PEXPIRE', KEYS[2], window_ms * 2)
+
+local oldest = math.floor((now - window_ms) / bucket_ms)
+local total = 0
+local failures = 0
+local fields = redis.call('HGETALL', KEYS[2])
+for i = 1, #fields, 2 do
+    local field = fields[i]
+    local sep = string.find(field, ':')
+    local b = tonumber(string.sub(field, 1, sep - 1))
+    if b <= oldest then
+        redis.call('HDEL', KEYS[2], field)
+    elseif string.sub(field, sep + 1) == 't' then
+        total = total + tonumber(fields[i + 1])
+    else
+        failures = failures + tonumber(fields[i + 1])
+    end
+end
+
+if total >= min_calls and failures / total >= failure_rate then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', now + open_ms,
+        'reason', reason .. ' (' .. failures .. '/' .. total .. ')')
+    redis.call('DEL', KEYS[2])
+    return {'open', 1}
+end
+return {'closed', 0}
+"""
+
+
+def _is_provider_failure(error: AIServiceError) -> bool:
+    """判断错误是否反映供应商故障（请求本身有误的4xx不计入）"""
+    status_code = error.details.get("status_code")
+    if status_code is None:
+        return True
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class CircuitBreaker:
+    """基于Redis共享状态的模型熔断器"""
+
+    def __init__(self, redis_client=None, prefix: str = "circuit"):
+        self._redis = redis_client
+        self.prefix = prefix
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    def _keys(self, model_id: int):
+        return f"{self.prefix}:{model_id}:state", f"{self.prefix}:{model_id}:window"
+
+    async def state(self, model) -> str:
+        """读取当前熔断状态"""
+        try:
+            state = await self.redis.hget(self._keys(model.id)[0], "state")
+        except Exception as e:
+            logger.warning(f"读取熔断状态失败 {model.id}: {e}")
+            return CLOSED
+        return state or CLOSED
+
+    async def allows(self, model) -> bool:
+        """before_call此刻是否会放行该模型（不触发状态转换）
+
+        熔断时长已结束的模型视为可放行，由随后的 before_call 转为half_open并发出探测请求。
+        """
+        try:
+            return bool(await self.redis.eval(_PEEK_SCRIPT, 1, self._keys(model.id)[0]))
+        except Exception as e:
+            logger.warning(f"检查熔断状态失败 {model.id}: {e}")
+            return True
+
+    async def before_call(self, model):
+        """请求前检查，熔断中时立即抛出CircuitOpenError"""
+        try:
+            state, allowed, changed = await self.redis.eval(
+                _ALLOW_SCRIPT,
+                1,
+                self._keys(model.id)[0],
+                int((settings.AI_REQUEST_TIMEOUT + 5) * 1000),
+            )
+        except Exception as e:
+            # 熔断器不可用时放行，避免Redis故障扩大影响
+            logger.warning(f"检查熔断状态失败 {model.id}: {e}")
+            return
+
+        if changed:
+            self._update_health(model, state, "熔断时长结束，放行探测请求")
+        if not allowed:
+            raise CircuitOpenError(
+                f"AI模型已熔断: {model.name}",
+                {"model_id": model.id, "state": state},
+            )
+
+    async def record_success(self, model, latency: float):
+        """记录成功调用，耗时超过慢调用阈值时按失败计"""
+        if latency >= settings.AI_CIRCUIT_SLOW_CALL_SECONDS:
+            await self._record(model, True, f"慢调用 {latency:.1f}s")
+        else:
+            await self._record(model, False, "")
+
+    async def record_failure(self, model, error: AIServiceError):
+        """记录失败调用"""
+        if _is_provider_failure(error):
+            await self._record(model, True, error.message)
+
+    async def _record(self, model, failed: bool, reason: str):
+        state_key, window_key = self._keys(model.id)
+        try:
+            state, changed = await self.redis.eval(
+                _RECORD_SCRIPT,
+                2,
+                state_key,
+                window_key,
+                1 if failed else 0,
+                settings.AI_CIRCUIT_WINDOW_SECONDS * 1000,
+                settings.AI_CIRCUIT_BUCKET_SECONDS * 1000,
+                settings.AI_CIRCUIT_MIN_CALLS,
+                settings.AI_CIRCUIT_FAILURE_RATE,
+                settings.AI_CIRCUIT_OPEN_SECONDS * 1000,
+                reason[:200],
+            )
+        except Exception as e:
+            logger.warning(f"记录熔断统计失败 {model.id}: {e}")
+            return
+
+        if changed:
+            message = "探测请求成功，恢复正常" if state == CLOSED else f"失败率或慢调用过高已熔断: {reason}"
+            self._update_health(model, state, message)
+
+    def _update_health(self, model, state: str, message: Optional[str]):
+        """同步模型健康状态，由调用方的数据库会话提交"""
+        from datetime import datetime
+
+        model.health_status = HEALTH_BY_STATE[state]
+        model.health_message = message
+        model.last_health_check = datetime.utcnow()
+        log = logger.warning if state == OPEN else logger.info
+        log(f"AI模型{model.id}熔断状态变为{state}: {message}")
+
+    async def reset(self, model):
+        """手动恢复（如管理员修复配置后）"""
+        await self.redis.delete(*self._keys(model.id))
+        self._update_health(model, CLOSED, "熔断器已手动重置")
+
+
+# 创建全局熔断器实例
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,241 @@
+"""分布式并发控制
+
+基于Redis实现带租约的分布式信号量，用于在所有worker进程之间
+限制同一AI模型的在途请求数（AIModel.max_concurrent_requests）。
+
+等待者按优先级排队（AnalysisTask.queue_priority越大越先获得名额，
+同优先级按入队时间先后），持有者定期续约，进程崩溃后名额随租约过期自动回收。
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ConcurrencyLimitTimeout
+from app.core.redis_client import get_async_redis
+from app.services.adaptive_concurrency import adaptive_limiter
+
+logger = logging.getLogger(__name__)
+
+# 优先级取值范围，保证排序分值在双精度浮点数内不丢失毫秒精度
+MIN_PRIORITY = -100
+MAX_PRIORITY = 100
+
+# 尝试获取名额：清理过期持有者与失联等待者，登记等待者，
+# 当空闲名额数大于等待者排名时授予名额
+_ACQUIRE_SCRIPT = """
+local holders = KEYS[1]
+local waiters = KEYS[2]
+local waiter_ttl = KEYS[3]
+local token = ARGV[1]
+local limit = tonumber(ARGV[2])
+local lease_ms = tonumber(ARGV[3])
+local rank = tonumber(ARGV[4])
+local waiter_ttl_ms = tonumber(ARGV[5])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', holders, '-inf', now)
+local dead = redis.call('ZRANGEBYSCORE', waiter_ttl, '-inf', now)
+for _, w in ipairs(dead) do
+    redis.call('ZREM', waiters, w)
+end
+redis.call('ZREMRANGEBYSCORE', waiter_ttl, '-inf', now)
+
+redis.call('ZADD', waiters, 'NX', rank, token)
+redis.call('ZADD', waiter_ttl, now + waiter_ttl_ms, token)
+
+local free = limit - redis.call('ZCARD', holders)
+if free <= 0 then
+    return 0
+end
+
+local pos = redis.call('ZRANK', waiters, token)
+if pos and pos < free then
+    redis.call('ZADD', holders, now + lease_ms, token)
+    redis.call('ZREM', waiters, token)
+    redis.call('ZREM', waiter_ttl, token)
+    redis.call('PEXPIRE', holders, lease_ms * 2)
+    return 1
+end
+return 0
+"""
+
+# 续约：仅当持有者的租约尚未过期时延长租约，已过期的名额可能已被他人获得，不能复活
+_RENEW_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local expires = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if expires and tonumber(expires) < now then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 0
+end
+if expires then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]) * 2)
+    return 1
+end
+return 0
+"""
+
+
+class DistributedSemaphore:
+    """带租约和优先级排队的分布式信号量"""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        lease_seconds: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        redis_client=None,
+        limit_provider: Optional[Callable[[], Awaitable[int]]] = None,
+    ):
+        self.name = name
+        self.limit = max(int(limit or 1), 1)
+        # 动态上限（如自适应并发），每次尝试获取名额前刷新
+        self.limit_provider = limit_provider
+        self.lease_ms = int((lease_seconds or settings.AI_CONCURRENCY_LEASE_SECONDS) * 1000)
+        self.poll_interval = poll_interval or settings.AI_CONCURRENCY_POLL_INTERVAL
+        self._redis = redis_client
+
+        self.holders_key = f"semaphore:{name}:holders"
+        self.waiters_key = f"semaphore:{name}:waiters"
+        self.waiter_ttl_key = f"semaphore:{name}:waiter_ttl"
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    @staticmethod
+    def _rank(priority: int) -> float:
+        """计算等待者排序分值：优先级高的在前，同优先级先到先得"""
+        priority = max(MIN_PRIORITY, min(MAX_PRIORITY, int(priority or 0)))
+        return -priority * 1e13 + time.time() * 1000
+
+    async def try_acquire(self, token: str, priority: int = 0, rank: Optional[float] = None) -> bool:
+        """尝试获取一个名额（不阻塞）"""
+        if self.limit_provider is not None:
+            self.limit = max(int(await self.limit_provider()), 1)
+        result = await self.redis.eval(
+            _ACQUIRE_SCRIPT,
+            3,
+            self.holders_key,
+            self.waiters_key,
+            self.waiter_ttl_key,
+            token,
+            self.limit,
+            self.lease_ms,
+            rank if rank is not None else self._rank(priority),
+            # 等待者需在此时间内再次轮询，否则视为失联
+            int(max(self.poll_interval * 10, 5) * 1000),
+        )
+        return bool(result)
+
+    async def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> str:
+        """阻塞获取名额，返回持有令牌"""
+        token = uuid.uuid4().hex
+        rank = self._rank(priority)
+        timeout = settings.AI_CONCURRENCY_ACQUIRE_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        try:
+            while True:
+                if await self.try_acquire(token, rank=rank):
+                    return token
+
+                if time.monotonic() >= deadline:
+                    await self.leave_queue(token)
+                    raise ConcurrencyLimitTimeout(
+                        f"等待并发名额超时: {self.name}",
+                        {"limit": self.limit, "timeout": timeout},
+                    )
+
+                # 加入少量抖动，避免大量等待者同时轮询
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+        except asyncio.CancelledError:
+            # 被取消（如对冲请求落败）时立即让出排队位置
+            await self.leave_queue(token)
+            raise
+
+    async def release(self, token: str):
+        """释放名额"""
+        try:
+            await self.redis.zrem(self.holders_key, token)
+        except Exception as e:
+            # 释放失败时依赖租约过期回收
+            logger.warning(f"释放并发名额失败 {self.name}: {e}")
+
+    async def renew(self, token: str) -> bool:
+        """续约"""
+        result = await self.redis.eval(_RENEW_SCRIPT, 1, self.holders_key, token, self.lease_ms)
+        return bool(result)
+
+    async def leave_queue(self, token: str):
+        """放弃排队（try_acquire失败且不再重试时调用）"""
+        try:
+            await self.redis.zrem(self.waiters_key, token)
+            await self.redis.zrem(self.waiter_ttl_key, token)
+        except Exception as e:
+            logger.warning(f"移出等待队列失败 {self.name}: {e}")
+
+    async def _keep_alive(self, token: str):
+        """后台定期续约，直到被取消"""
+        interval = self.lease_ms / 3000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.renew(token):
+                    logger.warning(f"并发名额租约已丢失: {self.name}")
+                    return
+            except Exception as e:
+                logger.warning(f"并发名额续约失败 {self.name}: {e}")
+
+    def start_keep_alive(self, token: str) -> asyncio.Task:
+        """为已获得的名额启动后台续约任务，释放名额前需取消该任务"""
+        return asyncio.create_task(self._keep_alive(token))
+
+    @asynccontextmanager
+    async def hold(self, priority: int = 0, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """在上下文中持有一个名额"""
+        token = await self.acquire(priority=priority, timeout=timeout)
+        keeper = self.start_keep_alive(token)
+        try:
+            yield token
+        finally:
+            keeper.cancel()
+            await self.release(token)
+
+    async def in_flight(self) -> int:
+        """当前未过期的持有者数量"""
+        now_ms = int(time.time() * 1000)
+        return await self.redis.zcount(self.holders_key, now_ms, "+inf")
+
+    async def queue_length(self) -> int:
+        """当前排队的等待者数量"""
+        return await self.redis.zcard(self.waiters_key)
+
+
+def model_semaphore(model) -> DistributedSemaphore:
+    """获取AI模型的并发信号量
+
+    名额上限为AIModel.max_concurrent_requests；开启自适应并发时使用AIMD动态上限（不超过该值）。
+    """
+    limit_provider = None
+    if settings.AI_ADAPTIVE_CONCURRENCY_ENABLED:
+        async def limit_provider() -> int:
+            return await adaptive_limiter.current_limit(model)
+
+    return DistributedSemaphore(
+        name=f"ai_model:{model.id}",
+        limit=model.max_concurrent_requests or 1,
+        limit_provider=limit_provider,
+    )
@@ -0,0 +1,484 @@
+"""定时触发调度器
+
+为 trigger_type=SCHEDULE 且已激活的任务按 schedule_config 定时创建执行：
+
+    {"cron_expression": "*/5 * * * *", "timezone": "Asia/Shanghai", "misfire_policy": "fire_once"}
+    {"interval_seconds": 300}
+
+- 调度配置只在加载时解析一次，每个任务的下次触发时间放在最小堆中，调度循环精确睡眠到
+  最近的触发时间，不逐秒扫描数据库；
+- 启动（成为主节点）时全量加载一次，之后每隔 CRON_SYNC_INTERVAL 只查询 updated_at
+  变化的任务，增删改在堆中惰性生效；
+- 多个实例通过Redis选举主节点，只有主节点触发；执行的 execution_id 由任务ID和计划时间
+  确定，主节点切换期间的重复触发被唯一约束拦截，每个计划时间只产生一个执行；
+- 计划时间已过去超过 CRON_MISFIRE_GRACE（停机、主节点切换）视为错过，按 misfire_policy 处理：
+  skip 跳过错过的触发；fire_once 合并为一次补触发；fire_all 逐个补触发，
+  连续补触发 CRON_MAX_CATCHUP 次后其余错过的触发合并为一次。
+
+    python -m app.services.cron_scheduler
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.analysis_task import AnalysisTask, TaskStatus, TriggerType
+from app.models.task_execution import ExecutionStatus, TaskExecution
+from app.services.job_queue import get_job_queue
+from app.services.leader_election import LeaderElection
+
+logger = logging.getLogger(__name__)
+
+MISFIRE_POLICIES = ("skip", "fire_once", "fire_all")
+
+_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+_MONTH_NAMES = {name: index for index, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+_DOW_NAMES = {name: index for index, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+
+def _parse_field(text: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> Set[int]:
+    values: Set[int] = set()
+    for part in text.lower().split(","):
+        expr, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if step <= 0:
+            raise ValueError(f"无效的步长: {part}")
+        if expr == "*":
+            start, end = low, high
+        else:
+            start_text, _, end_text = expr.partition("-")
+            start = names.get(start_text, None) if names else None
+            start = int(start_text) if start is None else start
+            if end_text:
+                end = names.get(end_text) if names else None
+                end = int(end_text) if end is None else end
+            else:
+                end = high if step_text else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"取值超出范围[{low}, {high}]: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """五段式cron表达式（分 时 日 月 周），支持 * , - / 、月份和星期英文缩写及 @daily 等别名
+
+    日和周都被限定时两者满足其一即触发（与Vixie cron一致）。
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = _ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron表达式需要5个字段: {expression}")
+        minute, hour, day, month, weekday = fields
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(day, 1, 31)
+        self.months = _parse_field(month, 1, 12, _MONTH_NAMES)
+        # 7也表示星期日
+        self.weekdays = {value % 7 for value in _parse_field(weekday, 0, 7, _DOW_NAMES)}
+        # 以*开头（含 */n）的字段视为不限定，与Vixie cron一致
+        self._day_any = day.startswith("*")
+        # 小时字段为通配时，夏令时结束重复的墙上时间两次出现都触发（与Vixie cron一致）
+        self.every_hour = hour.startswith("*")
+        self._weekday_any = weekday.startswith("*")
+        self._sorted_minutes = sorted(self.minutes)
+        self._sorted_hours = sorted(self.hours)
+
+    def _day_matches(self, value: datetime) -> bool:
+        day_ok = value.day in self.days
+        # Python的weekday()周一为0，cron周日为0
+        weekday_ok = (value.weekday() + 1) % 7 in self.weekdays
+        if self._day_any or self._weekday_any:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """严格晚于after的下一个触发时间（after为本地墙上时间，不带时区）"""
+        value = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = value.year + 5
+        while value.year <= limit:
+            if value.month not in self.months:
+                year, month = (value.year + 1, 1) if value.month == 12 else (value.year, value.month + 1)
+                value = datetime(year, month, 1)
+                continue
+            if not self._day_matches(value):
+                value = datetime(value.year, value.month, value.day) + timedelta(days=1)
+                continue
+            if value.hour not in self.hours:
+                later = [hour for hour in self._sorted_hours if hour > value.hour]
+                if not later:
+                    value = datetime(value.year, value.month, value.day) + timedelta(days=1)
+                else:
+                    value = value.replace(hour=later[0], minute=0)
+                continue
+            if value.minute not in self.minutes:
+                later = [minute for minute in self._sorted_minutes if minute > value.minute]
+                if not later:
+                    value = value.replace(minute=0) + timedelta(hours=1)
+                else:
+                    value = value.replace(minute=later[0])
+                continue
+            return value
+        raise ValueError(f"cron表达式在5年内没有触发时间: {self.expression}")
+
+
+class ScheduleSpec:
+    """解析后的调度配置，next_fire() 基于UTC时间戳计算下次触发"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.cron: Optional[CronExpression] = None
+        self.interval: Optional[float] = None
+        if config.get("cron_expression"):
+            self.cron = CronExpression(config["cron_expression"])
+            self.zone = ZoneInfo(config.get("timezone") or settings.CRON_TIMEZONE)
+        elif config.get("interval_seconds"):
+            self.interval = float(config["interval_seconds"])
+            if self.interval <= 0:
+                raise ValueError("interval_seconds必须大于0")
+        else:
+            raise ValueError("定时触发需要指定cron_expression或interval_seconds")
+
+        self.misfire_policy = config.get("misfire_policy") or settings.CRON_MISFIRE_POLICY
+        if self.misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"misfire_policy必须是以下之一: {', '.join(MISFIRE_POLICIES)}")
+
+    def next_fire(self, after: float) -> float:
+        """严格晚于after（UTC时间戳）的下次触发时间
+
+        cron按本地墙上时间匹配。夏令时结束时一段墙上时间出现两次（fold=0、fold=1）：
+        小时字段为通配的表达式（如 */5 * * * *）两次出现都触发；指定了小时的表达式
+        （如每天01:30）只在第一次出现时触发。夏令时开始时跳过的墙上时间按跳变前的
+        偏移换算（即顺延到跳变后）。
+        """
+        if self.interval is not None:
+            # 对齐到间隔的整数倍，各节点计算结果一致
+            result = (after // self.interval + 1) * self.interval
+        else:
+            aware = datetime.fromtimestamp(after, self.zone)
+            candidates = [self._next_occurrence(aware.replace(tzinfo=None), after)]
+            repeated_from = self._repeated_window_start(aware) if self.cron.every_hour else None
+            if repeated_from is not None:
+                # 重复的墙上时间从第二次出现的起点重新匹配
+                wall = self.cron.next_after(repeated_from - timedelta(minutes=1))
+                candidates.append(wall.replace(tzinfo=self.zone, fold=1).timestamp())
+            result = min(candidate for candidate in candidates if candidate > after)
+        if result <= after:
+            raise ValueError(f"计算出的下次触发时间未晚于 {after}")
+        return result
+
+    def _next_occurrence(self, local: datetime, after: float) -> float:
+        """从墙上时间local之后匹配，返回第一个晚于after的时间戳"""
+        folds = (0, 1) if self.cron.every_hour else (0,)
+        while True:
+            wall = self.cron.next_after(local)
+            for fold in folds:
+                timestamp = wall.replace(tzinfo=self.zone, fold=fold).timestamp()
+                if timestamp > after:
+                    return timestamp
+            local = wall
+
+    def _repeated_window_start(self, aware: datetime) -> Optional[datetime]:
+        """aware处于重复墙上时间的第一次出现期间时，返回这段重复时间的起点（墙上时间）"""
+        if aware.fold or not self._is_ambiguous(aware):
+            return None
+        start = aware.replace(tzinfo=None, second=0, microsecond=0)
+        # 夏令时偏移最多几小时，逐分钟向前找起点
+        for _ in range(24 * 60):
+            previous = start - timedelta(minutes=1)
+            if not self._is_ambiguous(previous.replace(tzinfo=self.zone)):
+                return start
+            start = previous
+        return start
+
+    def _is_ambiguous(self, value: datetime) -> bool:
+        return value.replace(fold=0).utcoffset() != value.replace(fold=1).utcoffset()
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@dataclass
+class _Entry:
+    task_id: int
+    spec: ScheduleSpec
+    config_key: str
+    next_fire: float
+    version: int
+    catchup: int = 0
+
+
+@dataclass
+class _Fire:
+    task_id: int
+    scheduled_at: float
+    misfired: bool = False
+
+
+class CronScheduler:
+    """定时触发调度器"""
+
+    def __init__(
+        self,
+        session_factory=None,
+        job_queue=None,
+        leader: Optional[LeaderElection] = None,
+        sync_interval: Optional[float] = None,
+        misfire_grace: Optional[float] = None,
+        max_catchup: Optional[int] = None,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.job_queue = job_queue or get_job_queue()
+        self.leader = leader or LeaderElection("cron_scheduler", ttl=settings.CRON_LEADER_TTL)
+        self.sync_interval = sync_interval or settings.CRON_SYNC_INTERVAL
+        self.misfire_grace = misfire_grace if misfire_grace is not None else settings.CRON_MISFIRE_GRACE
+        self.max_catchup = max_catchup or settings.CRON_MAX_CATCHUP
+        self.fired = 0
+        self._heap: List[Tuple[float, int, int]] = []
+        self._entries: Dict[int, _Entry] = {}
+        self._versions = 0
+        self._loaded = False
+        self._synced_at: Optional[datetime] = None
+        self._next_sync = 0.0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _push(self, entry: _Entry):
+        heapq.heappush(self._heap, (entry.next_fire, entry.task_id, entry.version))
+
+    def upsert(self, task_id: int, config: Optional[Dict[str, Any]], last_scheduled_at: Optional[float], now: float):
+        """新增或更新任务的调度，配置未变化时保持原有的下次触发时间"""
+        config = config or {}
+        config_key = json.dumps(config, sort_keys=True, default=str)
+        current = self._entries.get(task_id)
+        if current is not None and current.config_key == config_key:
+            return
+        try:
+            spec = ScheduleSpec(config)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"任务 {task_id} 的调度配置无效，已忽略: {e}")
+            self.remove(task_id)
+            return
+
+        # 从上次计划时间继续计算，停机期间错过的触发在触发时按错过策略处理
+        start = last_scheduled_at if last_scheduled_at is not None and current is None else now
+        self._versions += 1
+        entry = _Entry(task_id, spec, config_key, spec.next_fire(start), self._versions)
+        self._entries[task_id] = entry
+        self._push(entry)
+
+    def remove(self, task_id: int):
+        # 堆中的旧项在出堆时按版本丢弃
+        self._entries.pop(task_id, None)
+
+    def _query(self, db):
+        return db.query(
+            AnalysisTask.id,
+            AnalysisTask.status,
+            AnalysisTask.trigger_type,
+            AnalysisTask.schedule_config,
+            AnalysisTask.last_scheduled_at,
+        )
+
+    def _apply(self, rows, now: float) -> int:
+        changed = 0
+        for task_id, status, trigger_type, config, last_scheduled_at in rows:
+            if status == TaskStatus.ACTIVE and trigger_type == TriggerType.SCHEDULE:
+                self.upsert(task_id, config, _timestamp(last_scheduled_at), now)
+            else:
+                self.remove(task_id)
+            changed += 1
+        return changed
+
+    def load_all(self, db) -> int:
+        """全量加载已激活的定时任务"""
+        self._heap = []
+        self._entries = {}
+        self._synced_at = db.query(AnalysisTask.updated_at).order_by(AnalysisTask.updated_at.desc()).limit(1).scalar()
+        rows = self._query(db).filter(
+            AnalysisTask.trigger_type == TriggerType.SCHEDULE,
+            AnalysisTask.status == TaskStatus.ACTIVE,
+        ).yield_per(1000)
+        self._apply(rows, time.time())
+        return len(self._entries)
+
+    def sync(self, db) -> int:
+        """增量同步上次同步后修改过的任务（按 updated_at 索引查询）
+
+        被物理删除的任务不会出现在增量结果中，同步后再按仍激活的定时任务ID清理堆中的任务。
+        """
+        query = self._query(db)
+        if self._synced_at is not None:
+            # 重叠一段时间，容忍各节点与数据库之间的时钟偏差；配置未变化的任务不会重复处理
+            query = query.filter(AnalysisTask.updated_at >= self._synced_at - timedelta(seconds=self.sync_interval))
+        latest = db.query(AnalysisTask.updated_at).order_by(AnalysisTask.updated_at.desc()).limit(1).scalar()
+        changed = self._apply(query.all(), time.time())
+        self._synced_at = latest or self._synced_at
+
+        live = {
+            task_id for (task_id,) in db.query(AnalysisTask.id).filter(
+                AnalysisTask.trigger_type == TriggerType.SCHEDULE,
+                AnalysisTask.status == TaskStatus.ACTIVE,
+            )
+        }
+        for task_id in [task_id for task_id in self._entries if task_id not in live]:
+            self.remove(task_id)
+            changed += 1
+        return changed
+
+    def due(self, now: float) -> List[_Fire]:
+        """弹出到期的触发，按错过策略决定是否触发并计算下次触发时间"""
+        fires = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, task_id, version = heapq.heappop(self._heap)
+            entry = self._entries.get(task_id)
+            if entry is None or entry.version != version:
+                continue
+
+            misfired = now - fire_at > self.misfire_grace
+            policy = entry.spec.misfire_policy
+            try:
+                if not misfired:
+                    entry.catchup = 0
+                    fires.append(_Fire(task_id, fire_at))
+                    entry.next_fire = entry.spec.next_fire(fire_at)
+                elif policy == "fire_all" and entry.catchup < self.max_catchup:
+                    entry.catchup += 1
+                    fires.append(_Fire(task_id, fire_at, misfired=True))
+                    entry.next_fire = entry.spec.next_fire(fire_at)
+                else:
+                    if policy != "skip":
+                        fires.append(_Fire(task_id, fire_at, misfired=True))
+                    else:
+                        logger.info(f"任务 {task_id} 错过计划时间 {datetime.fromtimestamp(fire_at, timezone.utc)}，按策略跳过")
+                    entry.catchup = 0
+                    entry.next_fire = entry.spec.next_fire(now)
+            except ValueError as e:
+                # 下次触发时间无法计算（不会晚于本次）时移出调度，避免循环弹出同一任务
+                logger.error(f"任务 {task_id} 计算下次触发时间失败，已移出调度: {e}")
+                self.remove(task_id)
+                continue
+            self._push(entry)
+        return fires
+
+    async def fire(self, db, fire: _Fire) -> bool:
+        """创建定时执行并投递，同一计划时间已触发过时返回False"""
+        scheduled_at = datetime.fromtimestamp(fire.scheduled_at, timezone.utc).replace(tzinfo=None)
+        execution = TaskExecution(
+            task_id=fire.task_id,
+            execution_id=f"cron-{fire.task_id}-{int(fire.scheduled_at)}",
+            status=ExecutionStatus.PENDING,
+            trigger_type=TriggerType.SCHEDULE.value,
+            trigger_source="cron_scheduler",
+            trigger_data={"scheduled_at": scheduled_at.isoformat(), "misfired": fire.misfired},
+        )
+        try:
+            db.add(execution)
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return False
+
+        # 不修改updated_at，避免增量同步把自己的写入当作配置变更
+        db.query(AnalysisTask).filter(AnalysisTask.id == fire.task_id).update(
+            {AnalysisTask.last_scheduled_at: scheduled_at, AnalysisTask.updated_at: AnalysisTask.updated_at},
+            synchronize_session=False,
+        )
+        await self.job_queue.enqueue(db, execution)
+        db.commit()
+        self.fired += 1
+        return True
+
+    def notify(self):
+        """任务调度配置变更后调用，立即同步"""
+        self._next_sync = 0.0
+        self._wakeup.set()
+
+    async def run_once(self):
+        """确认主节点身份、按需同步并触发到期的调度，返回距下次需要处理的秒数"""
+        if not await self.leader.ensure():
+            # 非主节点不保留调度状态，成为主节点后重新全量加载
+            self._heap, self._entries, self._loaded = [], {}, False
+            return self.leader.ttl / 3
+
+        loop_now = time.monotonic()
+        if not self._loaded or loop_now >= self._next_sync:
+            db = self.session_factory()
+            try:
+                if not self._loaded:
+                    loaded = self.load_all(db)
+                    self._loaded = True
+                    logger.info(f"加载{loaded}个定时任务")
+                else:
+                    self.sync(db)
+            finally:
+                db.close()
+            self._next_sync = loop_now + self.sync_interval
+
+        fires = self.due(time.time())
+        if fires:
+            db = self.session_factory()
+            try:
+                for item in fires:
+                    try:
+                        await self.fire(db, item)
+                    except Exception as e:
+                        logger.error(f"任务 {item.task_id} 定时触发失败: {e}")
+                        db.rollback()
+            finally:
+                db.close()
+
+        # 睡到最近的触发时间，同时保证按时续约主节点和增量同步
+        wait = min(self.leader.ttl / 3, self._next_sync - time.monotonic())
+        if self._heap:
+            wait = min(wait, self._heap[0][0] - time.time())
+        return max(wait, 0.0)
+
+    async def run_forever(self):
+        logger.info("定时触发调度器已启动")
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    wait = await self.run_once()
+                except Exception as e:
+                    logger.error(f"定时调度异常: {e}")
+                    wait = self.leader.ttl / 3
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.leader.resign()
+
+
+if __name__ == "__main__":
+    asyncio.run(CronScheduler().run_forever())
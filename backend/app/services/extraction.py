@@ -0,0 +1,26 @@
+"""文件内容提取
+
+在沙箱进程中运行（见 app.services.sandbox），函数需保持在模块顶层且只依赖标准库。
+"""
+
+from pathlib import Path
+from typing import Optional
+
+# 依次尝试的文本编码，均失败时按UTF-8替换非法字符
+TEXT_ENCODINGS = ("utf-8-sig", "gb18030")
+
+
+def extract_text(path: str, max_chars: Optional[int] = None) -> str:
+    """读取文件为文本"""
+    data = Path(path).read_bytes()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        text = data.decode("utf-8", errors="replace")
+
+    text = text.replace("\x00", "")
+    return text[:max_chars] if max_chars else text
@@ -0,0 +1,291 @@
+"""飞书接口服务
+
+访问凭证管理与工作项回写。凭证分两类：
+
+- 应用凭证（tenant_access_token）：使用 FEISHU_APP_ID / FEISHU_APP_SECRET 或任务 feishu_config 中的
+  app_id / app_secret 获取；
+- 飞书项目插件凭证（plugin_token）：使用任务 feishu_config 中的 plugin_id / plugin_secret 获取。
+
+凭证按应用或插件缓存到过期前 FEISHU_TOKEN_REFRESH_AHEAD 秒，到点由后台任务主动刷新；
+并发调用共享同一个进行中的刷新请求，避免大量执行同时完成时集中请求凭证。
+任务 feishu_config 示例：
+
+    {
+        "project_key": "my_project",
+        "work_item_type_key": "story",
+        "plugin_id": "MII_xxx",
+        "plugin_secret": "xxx",
+        "user_key": "7xxxxxx",
+        "base_url": "https://project.feishu.cn"
+    }
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import FeishuAPIError
+
+logger = logging.getLogger(__name__)
+
+TENANT_TOKEN = "tenant"
+PLUGIN_TOKEN = "plugin"
+
+# 凭证失效错误码（飞书项目 / 开放平台）
+TOKEN_INVALID_CODES = {10022, 99991661, 99991663, 99991668}
+
+
+@dataclass(frozen=True)
+class TokenCredential:
+    """获取凭证所需的身份信息，同一应用或插件共享一个缓存条目"""
+
+    kind: str
+    client_id: str
+    client_secret: str
+    base_url: str
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.kind}:{self.base_url}:{self.client_id}"
+
+
+@dataclass
+class CachedToken:
+    token: str
+    expires_at: float
+    last_used: float
+
+
+def get_credential(feishu_config: Optional[Dict[str, Any]] = None) -> TokenCredential:
+    """根据任务飞书配置选择凭证：配置了插件则用插件凭证，否则用应用凭证"""
+    config = feishu_config or {}
+    if config.get("plugin_id") and config.get("plugin_secret"):
+        return TokenCredential(
+            kind=PLUGIN_TOKEN,
+            client_id=config["plugin_id"],
+            client_secret=config["plugin_secret"],
+            base_url=(config.get("base_url") or settings.FEISHU_PROJECT_BASE_URL).rstrip("/"),
+        )
+
+    app_id = config.get("app_id") or settings.FEISHU_APP_ID
+    app_secret = config.get("app_secret") or settings.FEISHU_APP_SECRET
+    if not app_id or not app_secret:
+        raise FeishuAPIError("未配置飞书应用凭证（FEISHU_APP_ID/FEISHU_APP_SECRET）或插件凭证")
+    return TokenCredential(
+        kind=TENANT_TOKEN,
+        client_id=app_id,
+        client_secret=app_secret,
+        base_url=(config.get("open_api_base_url") or settings.FEISHU_BASE_URL).rstrip("/"),
+    )
+
+
+class FeishuTokenManager:
+    """飞书访问凭证管理器（进程内缓存）"""
+
+    def __init__(self, refresh_ahead: Optional[int] = None, idle_seconds: Optional[int] = None):
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else settings.FEISHU_TOKEN_REFRESH_AHEAD
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.FEISHU_TOKEN_IDLE_SECONDS
+        self._tokens: Dict[str, CachedToken] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshers: Dict[str, asyncio.Task] = {}
+        self.fetch_count = 0
+
+    async def get_token(self, credential: TokenCredential) -> str:
+        """获取凭证：缓存有效时直接返回，否则等待（或发起）刷新"""
+        key = credential.cache_key
+        cached = self._tokens.get(key)
+        now = time.time()
+        if cached and cached.expires_at - now > self.refresh_ahead:
+            cached.last_used = now
+            return cached.token
+        return await self._refresh(credential)
+
+    def invalidate(self, credential: TokenCredential, token: Optional[str] = None):
+        """接口返回凭证失效时丢弃缓存；指定token时仅在缓存仍是该token时丢弃"""
+        cached = self._tokens.get(credential.cache_key)
+        if cached and (token is None or cached.token == token):
+            del self._tokens[credential.cache_key]
+
+    async def _refresh(self, credential: TokenCredential) -> str:
+        """单飞刷新：同一凭证同时只有一个请求在途，所有调用方（包括发起者）等待其结果
+
+        请求在独立的任务中运行，调用方被取消（执行超时、取消）不会影响请求本身和其他等待者，
+        等待者只会收到请求自身的异常。
+        """
+        key = credential.cache_key
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_store(credential))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_fetched(key, done))
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, credential: TokenCredential) -> str:
+        token, expire_seconds = await self._fetch(credential)
+        now = time.time()
+        self._tokens[credential.cache_key] = CachedToken(token, now + expire_seconds, now)
+        self._schedule_refresh(credential, expire_seconds)
+        return token
+
+    def _on_fetched(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时避免"exception was never retrieved"警告
+        if not task.cancelled():
+            task.exception()
+
+    def _schedule_refresh(self, credential: TokenCredential, expire_seconds: float):
+        """在到期前 refresh_ahead 秒主动刷新"""
+        key = credential.cache_key
+        previous = self._refreshers.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        delay = max(expire_seconds - self.refresh_ahead, 1)
+        self._refreshers[key] = asyncio.create_task(self._refresh_later(credential, delay))
+
+    async def _refresh_later(self, credential: TokenCredential, delay: float):
+        await asyncio.sleep(delay)
+        cached = self._tokens.get(credential.cache_key)
+        if cached is None or time.time() - cached.last_used > self.idle_seconds:
+            # 长时间未使用的凭证不再续期，下次使用时按需获取
+            self._refreshers.pop(credential.cache_key, None)
+            return
+        try:
+            await self._refresh(credential)
+        except Exception as e:
+            # 主动刷新失败时保留旧凭证，由下一次调用按需重试
+            logger.warning(f"主动刷新飞书凭证失败 {credential.kind}:{credential.client_id}: {e}")
+
+    async def _fetch(self, credential: TokenCredential):
+        """请求新凭证，返回 (token, 有效期秒数)"""
+        self.fetch_count += 1
+        async with httpx.AsyncClient(timeout=settings.FEISHU_REQUEST_TIMEOUT) as client:
+            try:
+                if credential.kind == PLUGIN_TOKEN:
+                    response = await client.post(
+                        f"{credential.base_url}/open_api/authen/plugin_token",
+                        json={"plugin_id": credential.client_id, "plugin_secret": credential.client_secret, "type": 0},
+                    )
+                else:
+                    response = await client.post(
+                        f"{credential.base_url}/auth/v3/tenant_access_token/internal",
+                        json={"app_id": credential.client_id, "app_secret": credential.client_secret},
+                    )
+            except httpx.HTTPError as e:
+                raise FeishuAPIError(f"获取飞书凭证失败: {e}") from e
+
+        if response.status_code != 200:
+            raise FeishuAPIError(
+                f"获取飞书凭证失败: HTTP {response.status_code}",
+                status_code=response.status_code,
+                details={"response": response.text[:500]},
+            )
+        data = response.json()
+
+        if credential.kind == PLUGIN_TOKEN:
+            payload = data.get("data") or {}
+            if not payload.get("token"):
+                raise FeishuAPIError("获取飞书插件凭证失败", details={"response": data})
+            return payload["token"], float(payload.get("expire_time") or 7200)
+
+        if data.get("code") != 0 or not data.get("tenant_access_token"):
+            raise FeishuAPIError(f"获取飞书应用凭证失败: {data.get('msg')}", details={"response": data})
+        return data["tenant_access_token"], float(data.get("expire") or 7200)
+
+    async def close(self):
+        """停止后台刷新任务"""
+        for task in self._refreshers.values():
+            task.cancel()
+        await asyncio.gather(*self._refreshers.values(), return_exceptions=True)
+        self._refreshers.clear()
+
+
+def _is_token_invalid(response: httpx.Response) -> bool:
+    try:
+        data = response.json()
+    except ValueError:
+        return response.status_code == 401
+    code = data.get("err_code", data.get("code"))
+    return code in TOKEN_INVALID_CODES or (response.status_code == 401 and code is None)
+
+
+class FeishuService:
+    """飞书接口服务"""
+
+    def __init__(self, token_manager: Optional[FeishuTokenManager] = None):
+        self.token_manager = token_manager or FeishuTokenManager()
+
+    def _auth_headers(self, credential: TokenCredential, token: str, feishu_config: Dict[str, Any]) -> Dict[str, str]:
+        if credential.kind == PLUGIN_TOKEN:
+            headers = {"X-PLUGIN-TOKEN": token}
+            if feishu_config.get("user_key"):
+                headers["X-USER-KEY"] = feishu_config["user_key"]
+            return headers
+        return {"Authorization": f"Bearer {token}"}
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        feishu_config: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """带凭证调用飞书接口；凭证失效时丢弃缓存并重试一次"""
+        feishu_config = feishu_config or {}
+        credential = get_credential(feishu_config)
+        url = f"{credential.base_url}{path}"
+
+        for attempt in range(2):
+            token = await self.token_manager.get_token(credential)
+            async with httpx.AsyncClient(timeout=settings.FEISHU_REQUEST_TIMEOUT) as client:
+                try:
+                    response = await client.request(
+                        method, url, json=json, headers=self._auth_headers(credential, token, feishu_config)
+                    )
+                except httpx.HTTPError as e:
+                    raise FeishuAPIError(f"飞书接口请求失败: {e}") from e
+
+            if attempt == 0 and _is_token_invalid(response):
+                logger.info(f"飞书凭证失效，重新获取: {credential.kind}:{credential.client_id}")
+                self.token_manager.invalidate(credential, token)
+                continue
+            break
+
+        if response.status_code >= 400:
+            raise FeishuAPIError(
+                f"飞书接口返回错误: HTTP {response.status_code}",
+                status_code=response.status_code,
+                details={"response": response.text[:500]},
+            )
+        data = response.json()
+        code = data.get("err_code", data.get("code", 0))
+        if code:
+            raise FeishuAPIError(
+                f"飞书接口返回错误: {data.get('err_msg') or data.get('msg')}",
+                status_code=response.status_code,
+                details={"response": data},
+            )
+        return data
+
+    async def update_work_item(
+        self,
+        feishu_config: Dict[str, Any],
+        work_item_id: str,
+        fields: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """更新飞书项目工作项字段"""
+        path = (
+            f"/open_api/{feishu_config['project_key']}/work_item/"
+            f"{feishu_config.get('work_item_type_key', 'story')}/{work_item_id}"
+        )
+        body = {"update_fields": [{"field_key": key, "field_value": value} for key, value in fields.items()]}
+        return await self.request("PUT", path, feishu_config, json=body)
+
+
+# 创建全局飞书服务实例
+feishu_service = FeishuService()
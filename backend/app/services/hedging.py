@@ -0,0 +1,56 @@
+"""备用模型链与对冲请求策略
+
+任务通过 analysis_config 配置备用模型链：
+
+    {"fallback_model_ids": [3, 5], "hedging": true}
+
+主模型在其近期p95耗时内仍未返回时，向链上下一个模型发出同样的请求（对冲），
+先返回者胜出，其余请求被取消；某个模型报错时立即切换到下一个模型。
+hedging 为 false 时只在报错时切换，不做超时对冲。
+"""
+
+import logging
+from typing import List
+
+from sqlalchemy.orm import object_session
+
+from app.core.config import settings
+from app.models.ai_model import AIModel
+from app.services.latency import latency_histogram
+
+logger = logging.getLogger(__name__)
+
+
+def get_fallback_chain(task) -> List[AIModel]:
+    """获取任务的模型链：主模型在前，随后为启用中的备用模型"""
+    chain = [task.ai_model] if task.ai_model is not None else []
+    fallback_ids = (task.analysis_config or {}).get("fallback_model_ids") or []
+    if not fallback_ids:
+        return chain
+
+    session = object_session(task)
+    if session is None:
+        return chain
+
+    models = {m.id: m for m in session.query(AIModel).filter(AIModel.id.in_(fallback_ids)).all()}
+    for model_id in fallback_ids:
+        model = models.get(model_id)
+        if model is not None and model.is_active and model not in chain:
+            chain.append(model)
+    return chain
+
+
+def is_hedging_enabled(task) -> bool:
+    """任务是否开启超时对冲"""
+    return bool((task.analysis_config or {}).get("hedging", True))
+
+
+async def hedge_delay(model) -> float:
+    """等待该模型多久后触发对冲请求（秒）
+
+    取实时直方图的分位数耗时；样本不足时使用默认值。
+    """
+    delay = await latency_histogram.percentile(model.id, settings.AI_HEDGE_QUANTILE)
+    if delay is None:
+        delay = settings.AI_HEDGE_DEFAULT_DELAY
+    return max(delay, settings.AI_HEDGE_MIN_DELAY)
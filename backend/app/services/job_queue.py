@@ -0,0 +1,311 @@
+"""执行队列
+
+执行记录入库（status=PENDING）后通过队列交给worker运行，后端由 JOB_QUEUE_BACKEND 选择：
+
+- celery：经Redis投递给Celery worker（app.core.celery）；
+- postgres：直接以 task_executions 表为队列。worker用 SELECT … FOR UPDATE SKIP LOCKED
+  认领PENDING记录，多个worker并发认领互不阻塞；入队时在同一事务内 pg_notify，
+  worker通过LISTEN即时唤醒（通知丢失时按 JOB_QUEUE_POLL_INTERVAL 兜底轮询）；
+  认领时写入租约到期时间并定期续约，worker崩溃后租约过期的执行重新置为PENDING；
+- scheduler：由执行调度器（app.services.scheduler）轮询认领，按任务加权公平分派，
+  并在所有调度实例之间限制任务的并发执行数。
+
+各后端认领执行时都会记录 queue_wait_time（最近一次入队到开始执行的时间）。
+
+    queue = get_job_queue()
+    db.add(execution); db.flush()
+    await queue.enqueue(db, execution)
+    db.commit()
+
+    python -m app.services.job_queue          # 启动postgres队列worker
+    python -m app.services.scheduler          # 启动执行调度器
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import event, or_, text
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.task_execution import ExecutionStatus, TaskExecution
+from app.services.pipeline import execute_claimed
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[int], Awaitable[object]]
+
+POSTGRES_QUEUE = "postgres"
+CELERY_QUEUE = "celery"
+SCHEDULER_QUEUE = "scheduler"
+
+
+def worker_identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue(ABC):
+    """执行队列后端"""
+
+    name: str
+
+    @abstractmethod
+    async def enqueue(self, db, execution: TaskExecution):
+        """投递执行（调用方负责提交事务）"""
+
+
+class CeleryJobQueue(JobQueue):
+    """Celery队列"""
+
+    name = CELERY_QUEUE
+
+    async def enqueue(self, db, execution: TaskExecution):
+        from app.core.celery import run_execution
+
+        execution.mark_enqueued(self.name)
+        db.flush()
+        execution_id = execution.id
+        priority = max(0, min(9, execution.priority or 0))
+
+        # 事务提交后worker才能读到记录，因此在提交后再投递
+        def dispatch(session):
+            run_execution.apply_async(args=[execution_id], priority=priority)
+
+        event.listen(db, "after_commit", dispatch, once=True)
+
+
+class SchedulerJobQueue(JobQueue):
+    """执行调度器队列：入库即可，调度器按 SCHEDULER_POLL_INTERVAL 轮询认领"""
+
+    name = SCHEDULER_QUEUE
+
+    async def enqueue(self, db, execution: TaskExecution):
+        execution.mark_enqueued(self.name)
+        db.flush()
+
+
+def claim_execution(db, execution_id: int, queue_name: str) -> Optional[TaskExecution]:
+    """条件更新认领单个执行（Celery worker使用），已被认领时返回None"""
+    claimed = db.query(TaskExecution).filter(
+        TaskExecution.id == execution_id,
+        TaskExecution.status == ExecutionStatus.PENDING,
+    ).update({TaskExecution.status: ExecutionStatus.RUNNING}, synchronize_session=False)
+    if not claimed:
+        db.commit()
+        return None
+    execution = db.get(TaskExecution, execution_id)
+    execution.claim(worker_identity(), socket.gethostname(), queue_name=queue_name)
+    db.commit()
+    return execution
+
+
+def renew_leases(db, execution_ids: List[int], lease_seconds: float):
+    """续约认领的执行（租约到期时间顺延lease_seconds）"""
+    if not execution_ids:
+        return
+    db.query(TaskExecution).filter(
+        TaskExecution.id.in_(execution_ids),
+        TaskExecution.status == ExecutionStatus.RUNNING,
+    ).update(
+        {TaskExecution.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def recover_expired_leases(db, queue_name: str) -> int:
+    """队列中租约过期的执行（认领者崩溃）重新入队，已达最大重试次数的标记为失败，返回重新入队数
+
+    反复导致worker崩溃的执行（如触发OOM的文件）不会无限重新入队。
+    """
+    expired = [
+        TaskExecution.status == ExecutionStatus.RUNNING,
+        TaskExecution.queue_name == queue_name,
+        TaskExecution.lease_expires_at < datetime.utcnow(),
+    ]
+    exhausted = db.query(TaskExecution).filter(
+        *expired,
+        TaskExecution.retry_count >= TaskExecution.max_retries,
+    ).with_for_update(skip_locked=True).all()
+    for execution in exhausted:
+        execution.lease_expires_at = None
+        execution.set_error("LEASE_EXPIRED", f"worker租约过期，已达最大重试次数{execution.max_retries}")
+        execution.complete_execution(success=False)
+        execution.task.update_execution_stats(
+            False,
+            execution_time=float(execution.duration_seconds or 0),
+            tokens_used=execution.total_tokens or 0,
+            cost=float(execution.ai_cost or 0),
+        )
+    if exhausted:
+        db.flush()
+        logger.error(f"{len(exhausted)}个执行的worker租约过期且已达最大重试次数，标记为失败")
+
+    recovered = db.query(TaskExecution).filter(
+        *expired,
+        TaskExecution.retry_count < TaskExecution.max_retries,
+    ).update(
+        {
+            TaskExecution.status: ExecutionStatus.PENDING,
+            TaskExecution.lease_expires_at: None,
+            TaskExecution.enqueued_at: datetime.utcnow(),
+            TaskExecution.retry_count: TaskExecution.retry_count + 1,
+            TaskExecution.retry_reason: "worker租约过期",
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    if recovered:
+        logger.warning(f"{queue_name}队列中{recovered}个执行的worker租约已过期，重新入队")
+    return recovered
+
+
+class PostgresJobQueue(JobQueue):
+    """基于 task_executions 表的队列"""
+
+    name = POSTGRES_QUEUE
+
+    def __init__(
+        self,
+        session_factory=None,
+        channel: Optional[str] = None,
+        lease_seconds: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.channel = channel or settings.JOB_QUEUE_CHANNEL
+        self.lease_seconds = lease_seconds or settings.JOB_QUEUE_LEASE_SECONDS
+        self.poll_interval = poll_interval or settings.JOB_QUEUE_POLL_INTERVAL
+        self.worker_id = worker_identity()
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, db, execution: TaskExecution):
+        """通知随事务提交一起发出"""
+        execution.mark_enqueued(self.name)
+        db.flush()
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": str(execution.id)})
+
+    def claim(self, db, limit: int) -> List[int]:
+        """认领至多limit个PENDING执行，已被其他worker锁定的行直接跳过"""
+        now = datetime.utcnow()
+        executions = db.query(TaskExecution).filter(
+            TaskExecution.status == ExecutionStatus.PENDING,
+            TaskExecution.queue_name == self.name,
+            or_(TaskExecution.next_retry_at.is_(None), TaskExecution.next_retry_at <= now),
+        ).order_by(
+            TaskExecution.priority.desc(),
+            TaskExecution.created_at,
+        ).limit(limit).with_for_update(skip_locked=True).all()
+
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+        for execution in executions:
+            execution.claim(self.worker_id, socket.gethostname(), queue_name=self.name)
+            execution.lease_expires_at = lease_until
+        db.commit()
+        return [execution.id for execution in executions]
+
+    def renew(self, db, execution_ids: List[int]):
+        """续约本worker持有的执行"""
+        renew_leases(db, execution_ids, self.lease_seconds)
+
+    def recover_expired(self, db) -> int:
+        """租约过期的执行（worker崩溃）重新入队，已达最大重试次数的标记为失败"""
+        recovered = recover_expired_leases(db, self.name)
+        if recovered:
+            self._wakeup.set()
+        return recovered
+
+    def _listen_connection(self):
+        """独立的psycopg2连接（自动提交），用于LISTEN"""
+        import psycopg2
+
+        url = make_url(settings.get_database_url()).set(drivername="postgresql")
+        connection = psycopg2.connect(url.render_as_string(hide_password=False))
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _on_notify(self, connection):
+        connection.poll()
+        if connection.notifies:
+            connection.notifies.clear()
+            self._wakeup.set()
+
+    async def _run(self, execution_id: int, handler: Handler):
+        try:
+            await handler(execution_id)
+        except Exception as e:
+            logger.error(f"执行 {execution_id} 运行异常: {e}")
+        finally:
+            self._running.pop(execution_id, None)
+            self._wakeup.set()
+
+    async def _maintain(self):
+        """定期续约并回收过期租约"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            db = self.session_factory()
+            try:
+                self.renew(db, list(self._running))
+                self.recover_expired(db)
+            except Exception as e:
+                logger.warning(f"队列租约维护失败: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    async def run_worker(self, handler: Optional[Handler] = None, concurrency: Optional[int] = None):
+        """worker主循环：有空闲名额时认领执行，否则等待通知"""
+        handler = handler or execute_claimed
+        concurrency = concurrency or settings.JOB_QUEUE_CONCURRENCY
+        loop = asyncio.get_running_loop()
+        connection = self._listen_connection()
+        loop.add_reader(connection.fileno(), self._on_notify, connection)
+        maintainer = asyncio.create_task(self._maintain())
+        logger.info(f"postgres执行队列worker已启动: {self.worker_id}")
+
+        try:
+            while True:
+                self._wakeup.clear()
+                free = concurrency - len(self._running)
+                if free > 0:
+                    db = self.session_factory()
+                    try:
+                        for execution_id in self.claim(db, free):
+                            self._running[execution_id] = asyncio.create_task(self._run(execution_id, handler))
+                    except Exception as e:
+                        logger.error(f"认领执行失败: {e}")
+                        db.rollback()
+                    finally:
+                        db.close()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            maintainer.cancel()
+            loop.remove_reader(connection.fileno())
+            connection.close()
+            if self._running:
+                await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+
+def get_job_queue() -> JobQueue:
+    """按配置获取队列后端"""
+    if settings.JOB_QUEUE_BACKEND == POSTGRES_QUEUE:
+        return PostgresJobQueue()
+    if settings.JOB_QUEUE_BACKEND == SCHEDULER_QUEUE:
+        return SchedulerJobQueue()
+    return CeleryJobQueue()
+
+
+if __name__ == "__main__":
+    asyncio.run(PostgresJobQueue().run_worker())
@@ -0,0 +1,156 @@
+"""模型延迟统计与调用频率限制
+
+LatencyHistogram 按分钟把每个模型的请求耗时计入Redis中的分桶直方图，
+在最近若干分钟的窗口上计算分位数（如p95），供对冲请求决定触发时机。
+
+ModelRateLimiter 按 AIModel.rate_limit_per_minute / rate_limit_per_day
+在所有worker之间共享计数，超出限额的模型不会被选作对冲或备用请求目标。
+"""
+
+import bisect
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶上界（秒），最后一个桶收纳更长的耗时
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 180, 300]
+
+# 同时检查并占用分钟、天两级配额
+_RATE_LIMIT_SCRIPT = """
+local minute_count = tonumber(redis.call('GET', KEYS[1]) or '0')
+local day_count = tonumber(redis.call('GET', KEYS[2]) or '0')
+local per_minute = tonumber(ARGV[1])
+local per_day = tonumber(ARGV[2])
+if (per_minute > 0 and minute_count >= per_minute) or (per_day > 0 and day_count >= per_day) then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], 172800)
+return 1
+"""
+
+
+class LatencyHistogram:
+    """按模型统计请求耗时的滑动窗口直方图"""
+
+    def __init__(
+        self,
+        window_minutes: Optional[int] = None,
+        min_samples: Optional[int] = None,
+        redis_client=None,
+        prefix: str = "ai_latency",
+    ):
+        self.window_minutes = window_minutes or settings.AI_LATENCY_WINDOW_MINUTES
+        self.min_samples = min_samples or settings.AI_LATENCY_MIN_SAMPLES
+        self._redis = redis_client
+        self.prefix = prefix
+        # 分位数的进程内短期缓存：(model_id, quantile) -> (计算时间, 结果)
+        self._cache: Dict[Tuple[int, float], Tuple[float, Optional[float]]] = {}
+        self.cache_seconds = 5.0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    def _key(self, model_id: int, minute: int) -> str:
+        return f"{self.prefix}:{model_id}:{minute}"
+
+    async def observe(self, model_id: int, seconds: float):
+        """记录一次请求耗时"""
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        key = self._key(model_id, int(time.time() // 60))
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(key, str(bucket), 1)
+            pipe.expire(key, (self.window_minutes + 1) * 60)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录模型延迟失败 {model_id}: {e}")
+
+    async def counts(self, model_id: int) -> List[int]:
+        """汇总窗口内各分桶的计数"""
+        current = int(time.time() // 60)
+        pipe = self.redis.pipeline()
+        for minute in range(current - self.window_minutes + 1, current + 1):
+            pipe.hgetall(self._key(model_id, minute))
+
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        for histogram in await pipe.execute():
+            for bucket, count in (histogram or {}).items():
+                counts[int(bucket)] += int(count)
+        return counts
+
+    async def percentile(self, model_id: int, quantile: float) -> Optional[float]:
+        """计算窗口内的耗时分位数（取所在分桶上界），样本不足时返回None"""
+        cache_key = (model_id, quantile)
+        cached = self._cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < self.cache_seconds:
+            return cached[1]
+
+        try:
+            counts = await self.counts(model_id)
+        except Exception as e:
+            logger.warning(f"读取模型延迟统计失败 {model_id}: {e}")
+            return None
+
+        value = None
+        total = sum(counts)
+        if total >= self.min_samples:
+            threshold = total * quantile
+            cumulative = 0
+            for index, count in enumerate(counts):
+                cumulative += count
+                if cumulative >= threshold:
+                    value = float(LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)])
+                    break
+
+        self._cache[cache_key] = (time.monotonic(), value)
+        return value
+
+
+class ModelRateLimiter:
+    """按模型配置的每分钟/每天请求上限做分布式计数"""
+
+    def __init__(self, redis_client=None, prefix: str = "ai_rate"):
+        self._redis = redis_client
+        self.prefix = prefix
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def try_acquire(self, model) -> bool:
+        """占用一次请求配额，超出限额返回False"""
+        now = time.time()
+        minute_key = f"{self.prefix}:{model.id}:m:{int(now // 60)}"
+        day_key = f"{self.prefix}:{model.id}:d:{int(now // 86400)}"
+        try:
+            result = await self.redis.eval(
+                _RATE_LIMIT_SCRIPT,
+                2,
+                minute_key,
+                day_key,
+                model.rate_limit_per_minute or 0,
+                model.rate_limit_per_day or 0,
+            )
+        except Exception as e:
+            # 计数不可用时不阻塞请求
+            logger.warning(f"检查模型调用频率失败 {model.id}: {e}")
+            return True
+        return bool(result)
+
+
+# 创建全局延迟统计与频率限制实例
+latency_histogram = LatencyHistogram()
+rate_limiter = ModelRateLimiter()
@@ -0,0 +1,85 @@
+"""基于Redis的主节点选举
+
+多个实例竞争同一个键（SET NX PX），持有者定期续约，持有者崩溃后租约过期由其他实例接任。
+只有主节点执行的工作（如定时触发）在每次执行前调用 ensure() 确认身份并续约。
+
+    leader = LeaderElection("cron")
+    if await leader.ensure():
+        ...
+"""
+
+import logging
+import os
+import socket
+import uuid
+from typing import Optional
+
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# 续约：仅当键仍由自己持有时延长租约
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+# 让出：仅删除自己持有的键
+_RESIGN_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElection:
+    """主节点选举"""
+
+    def __init__(self, name: str, ttl: float = 15.0, redis_client=None):
+        self.key = f"leader:{name}"
+        self.ttl = ttl
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._redis = redis_client
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def ensure(self) -> bool:
+        """续约或尝试成为主节点，返回当前是否为主节点；续约间隔应小于ttl"""
+        ttl_ms = int(self.ttl * 1000)
+        was_leader = self.is_leader
+        try:
+            if self.is_leader:
+                self.is_leader = bool(await self.redis.eval(_RENEW_SCRIPT, 1, self.key, self.identity, ttl_ms))
+            if not self.is_leader:
+                self.is_leader = bool(await self.redis.set(self.key, self.identity, nx=True, px=ttl_ms))
+        except Exception as e:
+            logger.warning(f"主节点选举失败 {self.key}: {e}")
+            self.is_leader = False
+
+        if self.is_leader != was_leader:
+            logger.info(f"{self.identity} {'成为' if self.is_leader else '不再是'}主节点: {self.key}")
+        return self.is_leader
+
+    async def resign(self):
+        """主动让出主节点"""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            await self.redis.eval(_RESIGN_SCRIPT, 1, self.key, self.identity)
+        except Exception as e:
+            logger.warning(f"让出主节点失败 {self.key}: {e}")
+
+    async def current(self) -> Optional[str]:
+        """当前主节点标识"""
+        value = await self.redis.get(self.key)
+        return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,487 @@
+"""分步骤流水线执行器
+
+按 ExecutionStep 把一次执行拆成多个步骤，每个步骤有自己的worker池，步骤之间用有界队列
+衔接：前面执行的AI调用进行中时，后续执行的文件下载和前面执行的结果回写可以同时进行；
+队列满时上游步骤阻塞，避免下载过多文件堆积在内存中。
+
+每进入一个步骤调用 execution.update_step() 更新 current_step 和 step_timings，
+步骤结束后在 step_timings 中记录 {步骤}_seconds。某一步骤失败后跳过后续步骤，
+仅执行标记为 always_run 的步骤（如清理）。
+
+上下文带有截止时间（deadline）时，每个步骤只能运行到截止时间为止；ctx.cancel() 取消
+当前步骤。两种情况都会取消步骤中进行中的I/O，上下文错误分别为 ExecutionTimeout 和
+ExecutionCancelled，已完成步骤的 step_timings 保留。
+
+标记为 shared 的步骤（下载、AI分析）在执行作为follower复用同一文件在途执行的结果时跳过，
+见 single_flight_stage。
+
+任务开启离线批量推理（analysis_config.batch_mode）时，AI分析步骤只暂存请求，后续步骤除清理外
+都跳过，执行保持RUNNING；批次结果回填后由 resume_deferred 继续回写并结束执行。
+
+    executor = PipelineExecutor(build_default_stages(), on_finished=save_execution)
+    await executor.start()
+    done = await executor.submit(ExecutionContext(task, execution))
+    await done
+    await executor.stop()
+
+run_serial() 以同样的步骤逐个串行执行，作为对照。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy.orm import object_session
+
+from app.core.config import settings
+from app.core.exceptions import ExecutionCancelled, ExecutionTimeout, PlatformError
+from app.core.database import SessionLocal
+from app.models.task_execution import ExecutionStatus, ExecutionStep, TaskExecution
+from app.services.ai_service import ai_service
+from app.services.batch_inference import batch_inference_service, is_deferrable
+from app.services.cancellation import cancellation_registry
+from app.services.extraction import extract_text
+from app.services.sandbox import SandboxResult, sandbox_pool
+from app.services.single_flight import flight_key, single_flight
+from app.services.spans import SpanRecorder, annotate_span, span_scope
+from app.services.write_back import write_back_execution
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutionContext:
+    """一次执行在流水线中传递的上下文"""
+
+    task: Any
+    execution: Any
+    variables: Dict[str, Any] = field(default_factory=dict)
+    ai_result: Optional[Dict[str, Any]] = None
+    error: Optional[BaseException] = None
+    done: Optional[asyncio.Future] = None
+    deadline: Optional[float] = None  # time.monotonic() 截止时间
+    cancel_reason: Optional[str] = None
+    inflight: Optional[asyncio.Task] = field(default=None, repr=False)
+    spans: Optional[SpanRecorder] = field(default=None, repr=False)
+    flight_key: Optional[str] = None  # 作为leader登记的去重键
+    leader_id: Optional[int] = None  # 复用其结果的在途执行ID（作为follower时）
+    deferred: bool = False  # AI请求已转入离线批量推理，等待批次结果
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，未设置截止时间时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def cancel(self, reason: str):
+        """请求取消：取消当前步骤，后续步骤不再执行"""
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        if self.inflight is not None:
+            self.inflight.cancel()
+
+
+StageHandler = Callable[[ExecutionContext], Awaitable[None]]
+FinishedHook = Callable[[ExecutionContext], Any]
+
+
+@dataclass
+class Stage:
+    """流水线步骤"""
+
+    step: ExecutionStep
+    handler: StageHandler
+    workers: int = 1
+    always_run: bool = False
+    shared: bool = False  # 作为follower复用在途执行结果时跳过
+
+
+async def _run_bounded(stage: Stage, ctx: ExecutionContext):
+    """在截止时间内运行步骤，超时或取消时取消进行中的步骤"""
+    if ctx.cancel_reason is not None:
+        raise ExecutionCancelled(f"执行已取消: {ctx.cancel_reason}")
+    remaining = ctx.remaining()
+    if remaining is not None and remaining <= 0:
+        raise ExecutionTimeout("执行超时", {"step": stage.step.value})
+
+    ctx.inflight = asyncio.ensure_future(stage.handler(ctx))
+    try:
+        await asyncio.wait_for(ctx.inflight, remaining)
+    except asyncio.TimeoutError:
+        raise ExecutionTimeout("执行超时", {"step": stage.step.value})
+    except asyncio.CancelledError:
+        if ctx.cancel_reason is None:
+            # 外部取消（如进程退出），继续向上传递
+            raise
+        raise ExecutionCancelled(f"执行已取消: {ctx.cancel_reason}", {"step": stage.step.value})
+    finally:
+        ctx.inflight = None
+
+
+async def run_stage(stage: Stage, ctx: ExecutionContext):
+    """执行单个步骤并记录耗时；失败时记录错误到上下文和执行记录"""
+    if (ctx.error is not None or ctx.deferred) and not stage.always_run:
+        return
+    if stage.shared and ctx.leader_id is not None:
+        return
+
+    execution = ctx.execution
+    execution.update_step(stage.step)
+    started = time.monotonic()
+    try:
+        # 步骤跨度在创建步骤协程任务之前进入，步骤内的子跨度都挂在它下面
+        with span_scope(ctx.spans, stage.step.value):
+            if stage.always_run:
+                # 清理类步骤不受截止时间和取消限制
+                await stage.handler(ctx)
+            else:
+                await _run_bounded(stage, ctx)
+    except Exception as e:
+        if ctx.error is None:
+            ctx.error = e
+            if isinstance(e, PlatformError):
+                execution.set_error(e.error_code, e.message, e.to_dict(), traceback.format_exc())
+            else:
+                execution.set_error("STEP_FAILED", f"{stage.step.value}步骤失败: {e}", None, traceback.format_exc())
+        else:
+            logger.warning(f"执行 {execution.execution_id} 的{stage.step.value}步骤失败: {e}")
+    finally:
+        # 重新赋值以便ORM检测到JSON字段变化
+        execution.step_timings = {
+            **(execution.step_timings or {}),
+            f"{stage.step.value}_seconds": round(time.monotonic() - started, 3),
+        }
+
+
+async def _call_hook(hook: Optional[FinishedHook], ctx: ExecutionContext):
+    if hook is None:
+        return
+    try:
+        result = hook(ctx)
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        logger.error(f"执行 {ctx.execution.execution_id} 完成回调异常: {e}")
+
+
+async def run_serial(stages: List[Stage], ctx: ExecutionContext, on_finished: Optional[FinishedHook] = None):
+    """在当前协程中依次执行所有步骤"""
+    for stage in stages:
+        await run_stage(stage, ctx)
+    await _call_hook(on_finished, ctx)
+
+
+class PipelineExecutor:
+    """流水线执行器"""
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: Optional[int] = None,
+        on_finished: Optional[FinishedHook] = None,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+        self.on_finished = on_finished
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[List[asyncio.Task]] = []
+
+    async def start(self):
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._workers = [
+            [asyncio.create_task(self._worker(index)) for _ in range(max(stage.workers, 1))]
+            for index, stage in enumerate(self.stages)
+        ]
+
+    async def submit(self, ctx: ExecutionContext) -> asyncio.Future:
+        """放入第一个步骤的队列（队列满时等待），返回执行结束时完成的Future"""
+        ctx.done = asyncio.get_running_loop().create_future()
+        await self._queues[0].put(ctx)
+        return ctx.done
+
+    async def run(self, contexts: List[ExecutionContext]):
+        """执行一批上下文并等待全部完成"""
+        futures = []
+        for ctx in contexts:
+            futures.append(await self.submit(ctx))
+        await asyncio.gather(*futures)
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+        queue = self._queues[index]
+        while True:
+            ctx = await queue.get()
+            if ctx is None:
+                return
+            await run_stage(stage, ctx)
+            if index + 1 < len(self.stages):
+                await self._queues[index + 1].put(ctx)
+            else:
+                await self._finish(ctx)
+
+    async def _finish(self, ctx: ExecutionContext):
+        await _call_hook(self.on_finished, ctx)
+        if ctx.done is not None and not ctx.done.done():
+            ctx.done.set_result(ctx)
+
+    async def stop(self):
+        """按步骤顺序排空队列并停止worker"""
+        for queue, workers in zip(self._queues, self._workers):
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        self._queues = []
+        self._workers = []
+
+
+async def single_flight_stage(ctx: ExecutionContext):
+    """去重：同一任务版本、同一文件已有在途执行时等待其结束并复用分析结果，否则登记为leader"""
+    execution = ctx.execution
+    variables = dict(execution.parsed_data or execution.trigger_data or {})
+    variables.setdefault("trigger", execution.trigger_data or {})
+    if is_deferrable(ctx.task, execution):
+        # 离线批量推理的结果要等批次完成，follower不在此等待
+        return
+    key = flight_key(ctx.task, execution, variables)
+    if key is None:
+        return
+
+    while True:
+        leader_id = await single_flight.join(key, execution.id)
+        if leader_id is None:
+            ctx.flight_key = key
+            return
+
+        annotate_span(leader_execution_id=leader_id)
+        execution.parent_execution_id = leader_id
+        execution.add_log_entry("INFO", "同一文件已有在途执行，等待其结果", {"parent_execution_id": leader_id})
+        await single_flight.wait(key, leader_id)
+
+        leader = object_session(execution).get(TaskExecution, leader_id, populate_existing=True)
+        if leader is not None and leader.status != ExecutionStatus.RUNNING and leader.analysis_result is not None:
+            execution.share_result_from(leader)
+            ctx.leader_id = leader_id
+            return
+        # leader未得到分析结果，重新竞争
+        execution.parent_execution_id = None
+
+
+async def parse_stage(ctx: ExecutionContext):
+    """解析数据：触发数据作为模板变量"""
+    execution = ctx.execution
+    if execution.parsed_data is None:
+        execution.parsed_data = execution.trigger_data or {}
+    ctx.variables.update(execution.parsed_data)
+    ctx.variables.setdefault("trigger", execution.trigger_data or {})
+
+
+def record_resource_usage(execution, result: SandboxResult):
+    """沙箱作业的峰值内存和CPU使用率记入执行（多个作业取最大值）"""
+    peak = int(round(result.peak_memory_mb))
+    execution.memory_usage_mb = max(execution.memory_usage_mb or 0, peak)
+    previous = float(execution.cpu_usage_percent or 0)
+    execution.cpu_usage_percent = f"{max(previous, result.cpu_percent):.1f}"
+
+
+async def download_stage(ctx: ExecutionContext):
+    """下载文件：流式写入临时目录，提取的文本内容作为 file_content 变量"""
+    execution = ctx.execution
+    if not execution.download_url:
+        return
+
+    max_size = ctx.task.max_file_size or settings.MAX_FILE_SIZE
+    target = Path(settings.TEMP_DIR) / "downloads" / execution.execution_id
+    target.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    remaining = ctx.remaining()
+    timeout = settings.WEBHOOK_TIMEOUT if remaining is None else max(min(settings.WEBHOOK_TIMEOUT, remaining), 0.001)
+    # 先记录路径，下载中途失败时由清理步骤删除不完整的文件
+    execution.local_file_path = str(target)
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("GET", execution.download_url) as response:
+                response.raise_for_status()
+                with open(target, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > max_size:
+                            raise PlatformError("文件超过大小限制", {"max_file_size": max_size})
+                        digest.update(chunk)
+                        f.write(chunk)
+    except BaseException:
+        # 超时、取消或进程退出时清理步骤可能不会运行
+        target.unlink(missing_ok=True)
+        raise
+
+    execution.file_size = size
+    annotate_span(resource=f"storage_credential:{ctx.task.storage_credential_id}", bytes=size)
+    execution.file_hash = digest.hexdigest()
+
+    # 内容提取在沙箱进程中进行，内存上限取任务的 max_memory_usage
+    result = await sandbox_pool.run(
+        extract_text,
+        str(target),
+        memory_mb=ctx.task.max_memory_usage or settings.SANDBOX_DEFAULT_MEMORY_MB,
+    )
+    record_resource_usage(execution, result)
+    ctx.variables["file_content"] = result.value
+
+
+async def ai_stage(ctx: ExecutionContext):
+    """AI分析；可离线批量推理的执行只暂存请求，等待批次结果"""
+    annotate_span(resource=f"ai_model:{ctx.task.ai_model_id}")
+    if is_deferrable(ctx.task, ctx.execution):
+        batch_inference_service.enqueue(ctx.task, ctx.execution, ctx.variables)
+        annotate_span(deferred=True)
+        ctx.deferred = True
+        return
+    result = await ai_service.analyze(ctx.task, ctx.execution, ctx.variables)
+    ctx.ai_result = result
+    ctx.execution.analysis_result = {"content": result["content"], "finish_reason": result["finish_reason"]}
+    ctx.execution.result_summary = result["content"][:500]
+
+
+async def write_stage(ctx: ExecutionContext):
+    """结果回写飞书"""
+    outcome = await write_back_execution(ctx.task, ctx.execution)
+    if outcome is not None:
+        project_key = (ctx.task.feishu_config or {}).get("project_key")
+        annotate_span(
+            resource=f"feishu_project:{project_key}",
+            write_back_status=outcome.status.value,
+            attempts=outcome.attempts,
+            merged_count=outcome.merged_count,
+        )
+
+
+async def cleanup_stage(ctx: ExecutionContext):
+    """清理下载的临时文件"""
+    path = ctx.execution.local_file_path
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def build_default_stages(
+    parse_workers: Optional[int] = None,
+    download_workers: Optional[int] = None,
+    ai_workers: Optional[int] = None,
+    write_workers: Optional[int] = None,
+) -> List[Stage]:
+    """默认步骤：去重 → 解析 → 下载 → AI分析 → 回写 → 清理
+
+    复用在途执行结果的follower跳过下载和AI分析。
+    """
+    return [
+        Stage(ExecutionStep.INIT, single_flight_stage, parse_workers or settings.PIPELINE_PARSE_WORKERS),
+        Stage(ExecutionStep.PARSE_DATA, parse_stage, parse_workers or settings.PIPELINE_PARSE_WORKERS),
+        Stage(
+            ExecutionStep.DOWNLOAD_FILE,
+            download_stage,
+            download_workers or settings.PIPELINE_DOWNLOAD_WORKERS,
+            shared=True,
+        ),
+        Stage(ExecutionStep.AI_ANALYSIS, ai_stage, ai_workers or settings.PIPELINE_AI_WORKERS, shared=True),
+        Stage(ExecutionStep.WRITE_RESULT, write_stage, write_workers or settings.PIPELINE_WRITE_WORKERS),
+        Stage(ExecutionStep.CLEANUP, cleanup_stage, 1, always_run=True),
+    ]
+
+
+def execution_timeout(task) -> int:
+    """执行的超时时间（秒）"""
+    limits = [value for value in (task.timeout_seconds, task.max_processing_time) if value]
+    return min(limits) if limits else settings.TASK_TIMEOUT
+
+
+def record_outcome(ctx: ExecutionContext, timeout: Optional[int] = None) -> bool:
+    """按上下文结束执行（成功/失败/取消/超时）并更新任务统计，返回是否成功"""
+    execution = ctx.execution
+    success = ctx.error is None
+    if isinstance(ctx.error, ExecutionCancelled):
+        execution.cancel_execution(ctx.cancel_reason)
+    elif isinstance(ctx.error, ExecutionTimeout):
+        execution.timeout_execution(timeout)
+    else:
+        execution.complete_execution(success=success)
+    if not success:
+        # 还有重试次数时置为RETRY，由重试调度器到期后重新投递
+        execution.schedule_retry(
+            base_delay=execution.task.retry_delay_seconds or settings.RETRY_DELAY,
+            max_delay=settings.RETRY_MAX_DELAY,
+        )
+    execution.task.update_execution_stats(
+        success,
+        execution_time=float(execution.duration_seconds or 0),
+        tokens_used=execution.total_tokens or 0,
+        cost=float(execution.ai_cost or 0),
+    )
+    return success
+
+
+async def execute_claimed(execution_id: int, session_factory=None, stages: Optional[List[Stage]] = None) -> bool:
+    """运行已认领（RUNNING）的执行：依次执行各步骤，结束后更新执行状态和任务统计
+
+    供调度器、队列worker等只持有执行ID的调用方使用，返回是否执行成功。
+    截止时间取任务的 timeout_seconds、max_processing_time 中较小者（均未设置时为 TASK_TIMEOUT），
+    超时结束为TIMEOUT，收到取消请求结束为CANCELLED。
+    """
+    db = (session_factory or SessionLocal)()
+    ctx = None
+    try:
+        execution = db.get(TaskExecution, execution_id)
+        if execution is None:
+            logger.warning(f"执行记录不存在: {execution_id}")
+            return False
+
+        task = execution.task
+        timeout = execution_timeout(task)
+        ctx = ExecutionContext(
+            task,
+            execution,
+            deadline=time.monotonic() + timeout,
+            spans=SpanRecorder(execution, {"attempt": execution.retry_count or 0}),
+        )
+        await cancellation_registry.register(execution_id, ctx)
+        try:
+            await run_serial(stages or build_default_stages(), ctx)
+        finally:
+            cancellation_registry.unregister(execution_id)
+
+        if ctx.deferred and ctx.error is None:
+            # 等待离线批次结果，执行保持RUNNING
+            db.commit()
+            return True
+        success = record_outcome(ctx, timeout)
+        db.commit()
+        return success
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        if ctx is not None and ctx.flight_key is not None:
+            # 结果提交后再释放登记，等待的follower读取到的是已提交的结果
+            await single_flight.finish(ctx.flight_key, execution_id)
+
+
+async def resume_deferred(execution: TaskExecution, result: Dict[str, Any]):
+    """离线批次结果回填后继续执行：回写结果、清理，并结束执行
+
+    作为 batch_inference_service 的结果回调，由批量服务在同一会话中提交。
+    """
+    ctx = ExecutionContext(execution.task, execution, ai_result=result)
+    execution.result_summary = result["content"][:500]
+    ctx.spans = SpanRecorder(execution, {"attempt": execution.retry_count or 0, "batch_id": execution.batch_id})
+    stages = [
+        stage for stage in build_default_stages()
+        if stage.step in (ExecutionStep.WRITE_RESULT, ExecutionStep.CLEANUP)
+    ]
+    await run_serial(stages, ctx)
+    record_outcome(ctx)
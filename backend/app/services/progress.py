@@ -0,0 +1,66 @@
+"""执行进度推送
+
+通过Redis发布/订阅推送执行过程中的增量事件（如流式AI输出），
+前端或其他服务订阅 execution:{execution_id}:progress 频道即可实时获取。
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.core.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+
+def progress_channel(execution_id: str) -> str:
+    """获取执行进度频道名"""
+    return f"execution:{execution_id}:progress"
+
+
+class ProgressPublisher:
+    """执行进度发布器
+
+    增量输出按最小间隔合并发布，避免逐Token发布造成Redis压力。
+    """
+
+    def __init__(self, execution_id: str, min_interval: float = 0.1, redis_client=None):
+        self.execution_id = execution_id
+        self.channel = progress_channel(execution_id)
+        self.min_interval = min_interval
+        self._redis = redis_client
+        self._pending = ""
+        self._last_publish = 0.0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        """发布事件"""
+        message = {"type": event_type, "execution_id": self.execution_id, "timestamp": time.time()}
+        if data:
+            message.update(data)
+        try:
+            await self.redis.publish(self.channel, json.dumps(message, ensure_ascii=False))
+        except Exception as e:
+            # 进度推送失败不影响执行
+            logger.debug(f"推送执行进度失败 {self.execution_id}: {e}")
+
+    async def delta(self, text: str, total_length: int):
+        """累积增量输出，达到间隔后发布"""
+        self._pending += text
+        now = time.monotonic()
+        if now - self._last_publish >= self.min_interval:
+            await self.flush(total_length)
+
+    async def flush(self, total_length: int):
+        """发布尚未发布的增量输出"""
+        if not self._pending:
+            return
+        await self.publish("ai_delta", {"content": self._pending, "total_length": total_length})
+        self._pending = ""
+        self._last_publish = time.monotonic()
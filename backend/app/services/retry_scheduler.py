@@ -0,0 +1,229 @@
+"""重试调度器
+
+TaskExecution.schedule_retry() 把失败的执行置为 RETRY 并写入 next_retry_at，
+本调度器负责在到期时把它们重新投递：
+
+- 每隔 RETRY_LOAD_INTERVAL 按 (status, next_retry_at) 索引加载未来 RETRY_LOAD_HORIZON
+  内到期的重试，放入内存中的分层时间轮；
+- 时间轮按 RETRY_WHEEL_TICK 推进，到期项在刻度精度内分派，期间不访问数据库；
+- 分派时用条件更新（status仍为RETRY才改为PENDING）防止多个实例重复分派，
+  然后通过执行队列重新投递。
+
+同一进程内新安排的重试可调用 schedule() 直接放入时间轮，无需等待下一次加载。
+
+    scheduler = RetryScheduler()
+    await scheduler.run_forever()
+
+    python -m app.services.retry_scheduler
+"""
+
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.task_execution import ExecutionStatus, TaskExecution
+from app.services.job_queue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchicalTimerWheel:
+    """分层时间轮
+
+    第0层每个槽对应一个刻度，第i层每个槽对应第i-1层转一圈的时长。
+    到期时间较远的项先放在高层槽中，所在高层槽轮到时逐层下放，最终在第0层到期。
+    添加、取消均为O(1)，推进一个刻度只处理当前槽。超出整个时间轮范围的项不接收。
+    """
+
+    def __init__(self, tick: float = 1.0, slots: Sequence[int] = (60, 60, 24), start: Optional[float] = None):
+        self.tick = tick
+        self.slots = list(slots)
+        # 每层一个槽覆盖的刻度数
+        self.spans = [1]
+        for size in self.slots[:-1]:
+            self.spans.append(self.spans[-1] * size)
+        self.capacity = self.spans[-1] * self.slots[-1]
+        self.levels: List[List[List[Tuple[int, Hashable]]]] = [[[] for _ in range(size)] for size in self.slots]
+        self.current_tick = int((start if start is not None else time.time()) // tick)
+        self._entries: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def add(self, key: Hashable, due: float) -> bool:
+        """添加或改期，due为时间戳；超出时间轮范围时返回False"""
+        due_tick = max(math.ceil(due / self.tick), self.current_tick + 1)
+        if due_tick - self.current_tick >= self.capacity:
+            return False
+        self._entries[key] = due_tick
+        self._place(key, due_tick)
+        return True
+
+    def cancel(self, key: Hashable) -> bool:
+        # 槽中的旧项在到期或下放时按 _entries 判断丢弃
+        return self._entries.pop(key, None) is not None
+
+    def _place(self, key: Hashable, due_tick: int):
+        delta = due_tick - self.current_tick
+        level = 0
+        while level + 1 < len(self.slots) and delta >= self.spans[level + 1]:
+            level += 1
+        slot = (due_tick // self.spans[level]) % self.slots[level]
+        self.levels[level][slot].append((due_tick, key))
+
+    def _cascade(self, level: int):
+        slot = (self.current_tick // self.spans[level]) % self.slots[level]
+        items, self.levels[level][slot] = self.levels[level][slot], []
+        for due_tick, key in items:
+            if self._entries.get(key) == due_tick:
+                self._place(key, due_tick)
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """推进到now，返回期间到期的项"""
+        target = int((now if now is not None else time.time()) // self.tick)
+        expired = []
+        while self.current_tick < target:
+            self.current_tick += 1
+            for level in range(len(self.slots) - 1, 0, -1):
+                if self.current_tick % self.spans[level] == 0:
+                    self._cascade(level)
+            slot = self.current_tick % self.slots[0]
+            items, self.levels[0][slot] = self.levels[0][slot], []
+            for due_tick, key in items:
+                if self._entries.get(key) == due_tick:
+                    del self._entries[key]
+                    expired.append(key)
+        return expired
+
+    def next_due(self) -> Optional[float]:
+        """最早到期时间（时间戳）"""
+        if not self._entries:
+            return None
+        return min(self._entries.values()) * self.tick
+
+
+def _timestamp(value: datetime) -> float:
+    """数据库中的时间按UTC处理"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RetryScheduler:
+    """重试调度器"""
+
+    def __init__(
+        self,
+        session_factory=None,
+        job_queue=None,
+        tick: Optional[float] = None,
+        load_interval: Optional[float] = None,
+        horizon: Optional[float] = None,
+        load_limit: Optional[int] = None,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.job_queue = job_queue or get_job_queue()
+        self.tick = tick or settings.RETRY_WHEEL_TICK
+        self.load_interval = load_interval or settings.RETRY_LOAD_INTERVAL
+        self.horizon = max(horizon or settings.RETRY_LOAD_HORIZON, self.load_interval)
+        self.load_limit = load_limit or settings.RETRY_LOAD_LIMIT
+        self.wheel = HierarchicalTimerWheel(tick=self.tick)
+        self.dispatched = 0
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, execution_id: int, next_retry_at: datetime) -> bool:
+        """把已安排的重试直接放入时间轮，超出加载范围的由后续加载处理"""
+        due = _timestamp(next_retry_at)
+        if due - time.time() > self.horizon:
+            return False
+        added = self.wheel.add(execution_id, due)
+        self._wakeup.set()
+        return added
+
+    def load_due(self, db) -> int:
+        """加载未来horizon内到期、尚未在时间轮中的重试"""
+        until = datetime.utcnow() + timedelta(seconds=self.horizon)
+        rows = db.query(TaskExecution.id, TaskExecution.next_retry_at).filter(
+            TaskExecution.status == ExecutionStatus.RETRY,
+            TaskExecution.next_retry_at <= until,
+        ).order_by(TaskExecution.next_retry_at).limit(self.load_limit).all()
+
+        loaded = 0
+        for execution_id, next_retry_at in rows:
+            if execution_id not in self.wheel and self.wheel.add(execution_id, _timestamp(next_retry_at)):
+                loaded += 1
+        return loaded
+
+    async def dispatch(self, db, execution_ids: List[int]) -> int:
+        """把到期的重试改回PENDING并重新投递，已被其他实例分派的跳过"""
+        dispatched = 0
+        for execution_id in execution_ids:
+            claimed = db.query(TaskExecution).filter(
+                TaskExecution.id == execution_id,
+                TaskExecution.status == ExecutionStatus.RETRY,
+            ).update(
+                {TaskExecution.status: ExecutionStatus.PENDING, TaskExecution.next_retry_at: None},
+                synchronize_session=False,
+            )
+            if not claimed:
+                db.commit()
+                continue
+
+            execution = db.get(TaskExecution, execution_id)
+            execution.add_log_entry("INFO", f"开始第{execution.retry_count}次重试")
+            await self.job_queue.enqueue(db, execution)
+            db.commit()
+            dispatched += 1
+        self.dispatched += dispatched
+        return dispatched
+
+    async def run_forever(self):
+        loop = asyncio.get_running_loop()
+        next_load = 0.0
+        logger.info("重试调度器已启动")
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            if now >= next_load:
+                next_load = now + self.load_interval
+                db = self.session_factory()
+                try:
+                    loaded = self.load_due(db)
+                    if loaded:
+                        logger.info(f"加载{loaded}个即将到期的重试")
+                except Exception as e:
+                    logger.error(f"加载重试失败: {e}")
+                finally:
+                    db.close()
+
+            due = self.wheel.advance()
+            if due:
+                db = self.session_factory()
+                try:
+                    await self.dispatch(db, due)
+                except Exception as e:
+                    # 未分派的重试仍为RETRY状态，下次加载时重新放入时间轮
+                    logger.error(f"分派重试失败: {e}")
+                    db.rollback()
+                finally:
+                    db.close()
+
+            # 睡到下一个刻度、下一次加载或被schedule()唤醒
+            next_tick = (self.wheel.current_tick + 1) * self.tick - time.time()
+            timeout = max(0.0, min(next_tick, next_load - loop.time())) if self.wheel else next_load - loop.time()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+
+if __name__ == "__main__":
+    asyncio.run(RetryScheduler().run_forever())
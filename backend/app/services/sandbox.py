@@ -0,0 +1,296 @@
+"""沙箱进程池
+
+文件内容提取等CPU、内存开销大的工作放到预先启动的独立进程中运行，畸形文件导致的
+内存暴涨只影响单个沙箱进程，不会拖垮worker进程和同进程中的其他执行：
+
+- 每个作业运行前设置 RLIMIT_AS（在作业开始时的地址空间基础上允许增加 memory_mb）
+  和 RLIMIT_CPU，作业结束后恢复；超出内存限制抛出 SandboxError，超出CPU时间时
+  沙箱进程被系统终止；
+- 沙箱进程运行 SANDBOX_MAX_JOBS_PER_WORKER 个作业后、常驻内存超过
+  SANDBOX_RECYCLE_RSS_MB 或作业失败后回收并重新启动；
+- 每个作业返回峰值内存和CPU时间，由调用方写入 TaskExecution.memory_usage_mb、cpu_usage_percent；
+- 等待作业的协程被取消（执行超时或取消）时直接终止对应的沙箱进程；
+- 进程池不绑定事件循环，不同事件循环（或线程）中的调用共用同一组沙箱进程；
+  回收、替换进程时不等待旧进程退出，已退出的进程在下次启动新进程时由multiprocessing回收。
+
+作业函数及其参数、返回值需可pickle，函数应定义在模块顶层。
+
+    result = await sandbox_pool.run(extract_text, path, memory_mb=512)
+    result.value, result.peak_memory_mb, result.cpu_percent
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import resource
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import SandboxError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SandboxResult:
+    """沙箱作业结果"""
+
+    value: Any
+    peak_memory_mb: float
+    cpu_seconds: float
+    wall_seconds: float
+    rss_mb: float
+
+    @property
+    def cpu_percent(self) -> float:
+        if self.wall_seconds <= 0:
+            return 0.0
+        return self.cpu_seconds / self.wall_seconds * 100
+
+
+def _read_status(field_name: str) -> Optional[float]:
+    """读取 /proc/self/status 中的内存字段（MB）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    # 重置VmHWM，使峰值内存只统计当前作业（Linux 4.0+）
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run_job(func: Callable, args: tuple, memory_mb: Optional[int], cpu_seconds: Optional[int]):
+    """在沙箱进程中运行一个作业，返回 (值, 错误, 峰值内存MB, CPU秒, 耗时秒, 常驻内存MB)"""
+    original_as = resource.getrlimit(resource.RLIMIT_AS)
+    original_cpu = resource.getrlimit(resource.RLIMIT_CPU)
+    _reset_peak_rss()
+    started_cpu = _cpu_seconds()
+    started = time.monotonic()
+    value, error = None, None
+    try:
+        if memory_mb:
+            virtual = _read_status("VmSize") or 0
+            limit = int((virtual + memory_mb) * 1024 * 1024)
+            if original_as[1] != resource.RLIM_INFINITY:
+                limit = min(limit, original_as[1])
+            resource.setrlimit(resource.RLIMIT_AS, (limit, original_as[1]))
+        if cpu_seconds:
+            limit = int(started_cpu) + cpu_seconds
+            if original_cpu[1] != resource.RLIM_INFINITY:
+                limit = min(limit, original_cpu[1])
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, original_cpu[1]))
+        value = func(*args)
+    except MemoryError:
+        error = f"超出内存限制（{memory_mb}MB）"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, original_as)
+        resource.setrlimit(resource.RLIMIT_CPU, original_cpu)
+
+    wall = time.monotonic() - started
+    cpu = _cpu_seconds() - started_cpu
+    rss = _read_status("VmRSS") or 0.0
+    peak = _read_status("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return value, error, peak, cpu, wall, rss
+
+
+def _worker_main(conn):
+    """沙箱进程主循环"""
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        conn.send(_run_job(*message))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    async def call(self, message):
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fileno = self.conn.fileno()
+        self.conn.send(message)
+        loop.add_reader(fileno, lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fileno)
+        return self.conn.recv()
+
+    def stop(self, kill: bool = False):
+        """通知或强制沙箱进程退出，不等待其结束"""
+        if kill or not self.process.is_alive():
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                self.process.kill()
+        self.conn.close()
+
+
+def _join_all(workers: List[_Worker], timeout: float = 5):
+    for worker in workers:
+        worker.process.join(timeout=timeout)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join(timeout=timeout)
+
+
+class SandboxPool:
+    """沙箱进程池"""
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        recycle_rss_mb: Optional[int] = None,
+        start_method: str = "spawn",
+    ):
+        self.size = size or settings.SANDBOX_WORKERS
+        self.max_jobs = max_jobs or settings.SANDBOX_MAX_JOBS_PER_WORKER
+        self.recycle_rss_mb = recycle_rss_mb or settings.SANDBOX_RECYCLE_RSS_MB
+        self.context = multiprocessing.get_context(start_method)
+        self.recycled = 0
+        self._workers: List[_Worker] = []
+        self._idle: Deque[_Worker] = deque()
+        # 等待空闲进程的Future，可能属于不同的事件循环
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._workers:
+                return
+            for _ in range(self.size):
+                worker = _Worker(self.context)
+                self._workers.append(worker)
+                self._idle.append(worker)
+
+    async def start(self):
+        """启动全部沙箱进程"""
+        await self.stop()
+        self._ensure_started()
+
+    async def stop(self):
+        """停止全部沙箱进程并等待其退出（在线程中等待，不阻塞事件循环）"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle.clear()
+        for worker in workers:
+            worker.stop()
+        if workers:
+            await asyncio.get_running_loop().run_in_executor(None, _join_all, workers)
+
+    def _replace(self, worker: _Worker, kill: bool = False) -> _Worker:
+        worker.stop(kill=kill)
+        replacement = _Worker(self.context)
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self._workers.append(replacement)
+            self.recycled += 1
+        return replacement
+
+    async def _acquire(self) -> _Worker:
+        """取一个空闲进程，没有时等待归还"""
+        with self._lock:
+            if self._idle:
+                return self._idle.popleft()
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # 进程已交给本等待方，但等待方在恢复运行前被取消
+            if future.done() and not future.cancelled():
+                self._release(future.result())
+            raise
+
+    def _release(self, worker: _Worker):
+        """归还进程：交给最早的等待方（在其事件循环中），没有等待方时放回空闲队列"""
+        with self._lock:
+            if worker not in self._workers:
+                # 进程池已停止
+                worker.stop()
+                return
+            while self._waiters:
+                future = self._waiters.popleft()
+                if not future.done():
+                    future.get_loop().call_soon_threadsafe(self._hand_over, future, worker)
+                    return
+            self._idle.append(worker)
+
+    def _hand_over(self, future: asyncio.Future, worker: _Worker):
+        if future.done():
+            # 等待方已被取消，转交下一个
+            self._release(worker)
+        else:
+            future.set_result(worker)
+
+    async def run(
+        self,
+        func: Callable,
+        *args,
+        memory_mb: Optional[int] = None,
+        cpu_seconds: Optional[int] = None,
+    ) -> SandboxResult:
+        """在沙箱进程中运行 func(*args)"""
+        self._ensure_started()
+        cpu_seconds = cpu_seconds or settings.SANDBOX_CPU_SECONDS
+
+        worker = await self._acquire()
+        try:
+            try:
+                value, error, peak, cpu, wall, rss = await worker.call((func, args, memory_mb, cpu_seconds))
+            except asyncio.CancelledError:
+                worker = self._replace(worker, kill=True)
+                raise
+            except (EOFError, OSError):
+                dead, worker = worker, self._replace(worker, kill=True)
+                exitcode = dead.process.exitcode
+                raise SandboxError(f"沙箱进程异常退出（exitcode={exitcode}）", {"cpu_seconds": cpu_seconds})
+
+            worker.jobs += 1
+            if error is not None or worker.jobs >= self.max_jobs or rss > self.recycle_rss_mb:
+                worker = self._replace(worker)
+            if error is not None:
+                raise SandboxError(f"沙箱作业失败: {error}", {"memory_mb": memory_mb, "peak_memory_mb": round(peak, 1)})
+            return SandboxResult(value=value, peak_memory_mb=peak, cpu_seconds=cpu, wall_seconds=wall, rss_mb=rss)
+        finally:
+            self._release(worker)
+
+
+# 创建全局沙箱进程池实例
+sandbox_pool = SandboxPool()
@@ -0,0 +1,305 @@
+"""执行调度器
+
+JOB_QUEUE_BACKEND=scheduler 时，执行入库后由调度器从数据库拉取本队列（queue_name=scheduler）
+PENDING 状态的 TaskExecution，按任务做加权公平调度后分派执行：
+
+- 任务之间按权重分配执行机会（stride调度），权重由 AnalysisTask.queue_priority 决定
+  （每高10级权重翻倍），排队执行很多的任务不会饿死其他任务；
+- 同一任务内按 TaskExecution.priority 从高到低、同优先级先到先得；
+- AnalysisTask.max_concurrent_executions 通过Redis分布式信号量在所有调度实例之间生效，
+  名额带租约，执行进程崩溃后自动回收；
+- 认领执行时用条件更新（status仍为PENDING才更新为RUNNING）防止多个调度实例重复分派，
+  并记录实际排队时间 queue_wait_time；
+- 认领时写入租约到期时间（lease_expires_at）并定期续约，调度进程崩溃后租约过期的执行
+  由其他调度实例重新置为PENDING（与postgres队列相同）；
+- 按入队时间（enqueued_at, id）的水位增量拉取新入队的执行，水位回退 SCHEDULER_LOAD_LAG 秒
+  以免漏掉提交较晚的事务，已在本地队列中的执行在内存中过滤。
+
+    scheduler = ExecutionScheduler(SessionLocal, runner)
+    await scheduler.run_forever()
+
+runner 接收执行ID，自行打开数据库会话完成执行（如提交到流水线执行器）。
+
+    python -m app.services.scheduler          # 启动调度器，以 execute_claimed 运行执行
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import socket
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+
+from app.core.config import settings
+from app.models.task_execution import ExecutionStatus, TaskExecution
+from app.services.concurrency import MAX_PRIORITY, MIN_PRIORITY, DistributedSemaphore
+from app.services.job_queue import SCHEDULER_QUEUE, recover_expired_leases, renew_leases
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[[int], Awaitable[Any]]
+
+
+def task_weight(task) -> float:
+    """任务权重：queue_priority每高10级权重翻倍"""
+    priority = max(MIN_PRIORITY, min(MAX_PRIORITY, int(task.queue_priority or 0)))
+    return 2 ** (priority / 10)
+
+
+def task_semaphore(task) -> DistributedSemaphore:
+    """任务的并发执行名额（AnalysisTask.max_concurrent_executions）"""
+    return DistributedSemaphore(name=f"task:{task.id}", limit=task.max_concurrent_executions or 1)
+
+
+@dataclass
+class _TaskQueue:
+    weight: float
+    pass_value: float = 0.0
+    items: List[Tuple[int, int, Any]] = field(default_factory=list)
+
+
+class FairQueue:
+    """按任务加权公平出队的优先级队列（stride调度）
+
+    每个任务维护一个虚拟时间（pass），出队时选择有排队项且虚拟时间最小的任务，
+    出队后虚拟时间增加 1/权重。任务从空闲变为有排队项时，虚拟时间不低于当前活跃任务的最小值，
+    避免空闲期间积累的额度一次性用完。
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, _TaskQueue] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(queue.items) for queue in self._tasks.values())
+
+    def _min_pass(self) -> float:
+        active = [queue.pass_value for queue in self._tasks.values() if queue.items]
+        return min(active) if active else 0.0
+
+    def push(self, task_id: int, weight: float, item: Any, priority: int = 0):
+        queue = self._tasks.get(task_id)
+        if queue is None:
+            queue = self._tasks[task_id] = _TaskQueue(weight=weight, pass_value=self._min_pass())
+        elif not queue.items:
+            queue.pass_value = max(queue.pass_value, self._min_pass())
+        queue.weight = weight
+        heapq.heappush(queue.items, (-priority, next(self._counter), item))
+
+    def next_task(self, exclude: Optional[Set[int]] = None) -> Optional[int]:
+        """下一个应出队的任务（不出队）"""
+        candidates = [
+            (queue.pass_value, task_id)
+            for task_id, queue in self._tasks.items()
+            if queue.items and (not exclude or task_id not in exclude)
+        ]
+        return min(candidates)[1] if candidates else None
+
+    def pop(self, task_id: int) -> Any:
+        """从指定任务出队一项并推进其虚拟时间"""
+        queue = self._tasks[task_id]
+        _, _, item = heapq.heappop(queue.items)
+        queue.pass_value += 1 / queue.weight
+        return item
+
+
+class ExecutionScheduler:
+    """执行调度器"""
+
+    def __init__(
+        self,
+        session_factory,
+        runner: Runner,
+        max_running: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        fetch_limit: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        load_lag: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.runner = runner
+        self.max_running = max_running or settings.SCHEDULER_MAX_RUNNING
+        self.poll_interval = poll_interval or settings.SCHEDULER_POLL_INTERVAL
+        self.fetch_limit = fetch_limit or settings.SCHEDULER_FETCH_LIMIT
+        self.lease_seconds = lease_seconds or settings.JOB_QUEUE_LEASE_SECONDS
+        self.load_lag = load_lag if load_lag is not None else settings.SCHEDULER_LOAD_LAG
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.queue = FairQueue()
+        self._queued: Set[int] = set()
+        # 已拉取到的最大入队时间，None表示下一轮全量拉取
+        self._watermark: Optional[datetime] = None
+        self._semaphores: Dict[int, DistributedSemaphore] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    def _load_pending(self, db) -> int:
+        """把新入队的PENDING执行加入本地队列，按 (enqueued_at, id) 分页，返回新加入的数量
+
+        从水位回退 load_lag 秒开始拉取，每轮最多加入 fetch_limit 个，其余下一轮继续。
+        """
+        base = db.query(TaskExecution).filter(
+            TaskExecution.status == ExecutionStatus.PENDING,
+            TaskExecution.queue_name == SCHEDULER_QUEUE,
+        )
+        if self._watermark is not None:
+            base = base.filter(TaskExecution.enqueued_at >= self._watermark - timedelta(seconds=self.load_lag))
+
+        loaded = 0
+        cursor: Optional[Tuple[datetime, int]] = None
+        while loaded < self.fetch_limit:
+            query = base
+            if cursor is not None:
+                enqueued_at, last_id = cursor
+                query = query.filter(or_(
+                    TaskExecution.enqueued_at > enqueued_at,
+                    and_(TaskExecution.enqueued_at == enqueued_at, TaskExecution.id > last_id),
+                ))
+            executions = query.order_by(
+                TaskExecution.enqueued_at, TaskExecution.id,
+            ).limit(self.fetch_limit).all()
+
+            for execution in executions:
+                cursor = (execution.enqueued_at, execution.id)
+                if execution.enqueued_at is not None and (
+                    self._watermark is None or execution.enqueued_at > self._watermark
+                ):
+                    self._watermark = execution.enqueued_at
+                if execution.id in self._queued or execution.id in self._running:
+                    continue
+                task = execution.task
+                self._semaphores[task.id] = task_semaphore(task)
+                self.queue.push(task.id, task_weight(task), execution.id, execution.priority or 0)
+                self._queued.add(execution.id)
+                loaded += 1
+                if loaded >= self.fetch_limit:
+                    break
+            # 入队时间为空的历史数据无法按水位继续分页
+            if len(executions) < self.fetch_limit or cursor is None or cursor[0] is None:
+                break
+        return loaded
+
+    def _claim(self, db, execution_id: int) -> Optional[TaskExecution]:
+        """条件更新认领执行，已被其他实例认领时返回None"""
+        claimed = db.query(TaskExecution).filter(
+            TaskExecution.id == execution_id,
+            TaskExecution.status == ExecutionStatus.PENDING,
+            TaskExecution.queue_name == SCHEDULER_QUEUE,
+        ).update({TaskExecution.status: ExecutionStatus.RUNNING}, synchronize_session=False)
+        if not claimed:
+            db.commit()
+            return None
+
+        execution = db.get(TaskExecution, execution_id)
+        execution.claim(self.worker_id, socket.gethostname(), queue_name=SCHEDULER_QUEUE)
+        execution.lease_expires_at = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        db.commit()
+        return execution
+
+    def maintain_leases(self, db) -> int:
+        """续约本实例运行中的执行，并回收租约过期（调度进程崩溃）的执行，返回重新入队数"""
+        renew_leases(db, list(self._running), self.lease_seconds)
+        return recover_expired_leases(db, SCHEDULER_QUEUE)
+
+    async def _maintain(self):
+        """定期续约并回收过期租约"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            db = self.session_factory()
+            try:
+                if self.maintain_leases(db):
+                    self._wakeup.set()
+            except Exception as e:
+                logger.warning(f"调度器租约维护失败: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    async def tick(self) -> int:
+        """拉取并分派一轮，返回本轮分派的执行数"""
+        db = self.session_factory()
+        dispatched = 0
+        try:
+            self._load_pending(db)
+            full: Set[int] = set()
+            while len(self._running) < self.max_running:
+                task_id = self.queue.next_task(exclude=full)
+                if task_id is None:
+                    break
+
+                semaphore = self._semaphores[task_id]
+                token = uuid.uuid4().hex
+                if not await semaphore.try_acquire(token):
+                    # 任务并发已满：本轮跳过该任务，不推进其虚拟时间
+                    await semaphore.leave_queue(token)
+                    full.add(task_id)
+                    continue
+
+                execution_id = self.queue.pop(task_id)
+                self._queued.discard(execution_id)
+                if self._claim(db, execution_id) is None:
+                    await semaphore.release(token)
+                    continue
+
+                self._running[execution_id] = asyncio.create_task(self._run(execution_id, semaphore, token))
+                dispatched += 1
+        finally:
+            db.close()
+        return dispatched
+
+    async def _run(self, execution_id: int, semaphore: DistributedSemaphore, token: str):
+        keeper = semaphore.start_keep_alive(token)
+        try:
+            await self.runner(execution_id)
+        except Exception as e:
+            logger.error(f"执行 {execution_id} 运行异常: {e}")
+        finally:
+            keeper.cancel()
+            await semaphore.release(token)
+            self._running.pop(execution_id, None)
+            self._wakeup.set()
+
+    def notify(self):
+        """有新的执行入库时调用，立即开始下一轮调度"""
+        self._wakeup.set()
+
+    async def run_forever(self):
+        maintainer = asyncio.create_task(self._maintain())
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    await self.tick()
+                except Exception as e:
+                    logger.error(f"执行调度异常: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            maintainer.cancel()
+
+    async def shutdown(self):
+        """等待运行中的执行结束"""
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+
+async def main():
+    from app.core.database import SessionLocal
+    from app.services.pipeline import execute_claimed
+
+    scheduler = ExecutionScheduler(SessionLocal, execute_claimed)
+    try:
+        await scheduler.run_forever()
+    finally:
+        await scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
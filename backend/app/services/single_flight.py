@@ -0,0 +1,205 @@
+"""执行单飞去重
+
+同一任务版本、同一文件的执行同时到达时（如同一文件在短时间内被重复提交），只有先到的执行（leader）
+下载文件并调用AI，其余执行（follower）通过 parent_execution_id 关联到leader，等待leader结束后
+复用其分析结果，只执行各自的回写。leader未成功时，等待中的follower重新竞争，由其中一个重新执行。
+
+去重键包含任务ID、版本、影响分析结果的配置、文件的下载地址，以及提示词模板引用的其他变量的取值，
+保证follower得到的结果与自己执行的一致。文件哈希在下载时才计算，去重发生在下载之前，
+因此同一文件经不同地址提交时不会合并。
+任务可通过 analysis_config.single_flight = false 关闭。
+
+在途登记保存在Redis（single_flight:{key} → leader执行ID），跨进程生效。登记使用较短的租约
+（SINGLE_FLIGHT_LEASE_SECONDS），leader运行期间每隔租约的1/3续约一次；leader结束时删除登记并
+发布消息唤醒等待的follower，follower同时定期检查登记，leader崩溃后登记在一个租约内过期即重新竞争。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.utils.template_engine import extract_variables, lookup_value
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CHANNEL = "single_flight"
+
+# 仅续约自己登记的键
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+# 仅删除自己登记的键
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def flight_key(task, execution, variables: Dict[str, Any]) -> Optional[str]:
+    """执行的去重键，没有文件或任务关闭去重时返回None"""
+    analysis_config = task.analysis_config or {}
+    if not settings.SINGLE_FLIGHT_ENABLED or analysis_config.get("single_flight") is False:
+        return None
+    if not execution.download_url:
+        return None
+
+    content_variable = analysis_config.get("content_variable", "file_content")
+    names = set(extract_variables(task.system_prompt)) | set(extract_variables(task.user_prompt_template))
+    names.discard(content_variable)
+    identity = {
+        "task_id": task.id,
+        "version": task.version,
+        "config": [
+            task.ai_model_id,
+            task.system_prompt,
+            task.user_prompt_template,
+            analysis_config,
+            task.storage_credential_id,
+            task.download_config,
+        ],
+        "file": execution.download_url,
+        "variables": {name: lookup_value(variables, name) for name in sorted(names)},
+    }
+    encoded = json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """在途执行登记"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self._redis = redis_client
+        self.poll_interval = poll_interval or settings.SINGLE_FLIGHT_POLL_INTERVAL
+        self.lease_seconds = lease_seconds or settings.SINGLE_FLIGHT_LEASE_SECONDS
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # 本进程作为leader持有的登记的续约任务
+        self._renewals: Dict[str, asyncio.Task] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"single_flight:{key}"
+
+    async def join(self, key: str, execution_id: int) -> Optional[int]:
+        """登记为leader返回None（并开始续约，直到finish），已有其他执行在途时返回其执行ID"""
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            if await self.redis.set(self._key(key), execution_id, nx=True, px=lease_ms):
+                break
+            value = await self.redis.get(self._key(key))
+            if value is None:
+                # leader刚结束，重新竞争
+                continue
+            leader_id = int(value)
+            if leader_id == execution_id:
+                # 自己登记的（如重试），续期
+                await self.redis.eval(_RENEW_SCRIPT, 1, self._key(key), execution_id, lease_ms)
+                break
+            return leader_id
+        self._start_renewal(key, execution_id)
+        return None
+
+    def _start_renewal(self, key: str, execution_id: int):
+        renewal = self._renewals.pop(key, None)
+        if renewal is not None:
+            renewal.cancel()
+        self._renewals[key] = asyncio.get_running_loop().create_task(self._renew(key, execution_id))
+
+    async def _renew(self, key: str, execution_id: int):
+        """每隔租约的1/3续约一次，登记已不属于自己时停止"""
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.redis.eval(_RENEW_SCRIPT, 1, self._key(key), execution_id, lease_ms)
+            except Exception as e:
+                logger.warning(f"在途执行登记续约失败 {key}: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"在途执行登记已过期或被其他执行占用，停止续约: {key}")
+                return
+
+    async def wait(self, key: str, leader_id: int):
+        """等待leader结束（收到结束消息，或登记已不属于该leader）"""
+        self._ensure_listener()
+        loop = asyncio.get_running_loop()
+        future = self._waiters.get(key)
+        if future is None or future.done() or future.get_loop() is not loop:
+            future = self._waiters[key] = loop.create_future()
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.poll_interval)
+                return
+            except asyncio.TimeoutError:
+                value = await self.redis.get(self._key(key))
+                if value is None or int(value) != leader_id:
+                    return
+
+    async def finish(self, key: str, execution_id: int):
+        """leader结束：停止续约，删除登记并唤醒等待的follower"""
+        renewal = self._renewals.pop(key, None)
+        if renewal is not None:
+            renewal.cancel()
+        try:
+            await self.redis.eval(_RELEASE_SCRIPT, 1, self._key(key), execution_id)
+            await self.redis.publish(SINGLE_FLIGHT_CHANNEL, key)
+        except Exception as e:
+            logger.warning(f"释放在途执行登记失败 {key}: {e}")
+        self._wake(key)
+
+    def _wake(self, key: str):
+        future = self._waiters.pop(key, None)
+        if future is not None and not future.done():
+            future.get_loop().call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+    def _ensure_listener(self):
+        # 每个事件循环各自订阅（Celery任务中每次执行都是新的事件循环）
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(SINGLE_FLIGHT_CHANNEL)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        data = message["data"]
+                        self._wake(data.decode() if isinstance(data, bytes) else data)
+                finally:
+                    await pubsub.unsubscribe(SINGLE_FLIGHT_CHANNEL)
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"订阅在途执行消息失败，稍后重试: {e}")
+                await asyncio.sleep(5)
+
+
+# 创建全局在途执行登记实例
+single_flight = SingleFlight()
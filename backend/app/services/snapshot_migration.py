@@ -0,0 +1,133 @@
+"""配置快照迁移
+
+把历史执行中内联保存的 task_config_snapshot、ai_model_config、storage_config 迁移到
+config_snapshots 表（按内容哈希去重），执行记录只保留哈希。按主键分批处理，每批一个事务，
+中断后重新运行会从剩余的内联快照继续。已有哈希的列保留原哈希（读取时哈希优先），
+只为没有哈希的列写入迁移得到的哈希。
+
+    cd backend
+    python -m app.services.snapshot_migration --batch-size 500
+
+PostgreSQL 中更新后的旧行版本需要 VACUUM 后才能复用空间，VACUUM FULL 后表文件才会缩小。
+"""
+
+import argparse
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import bindparam, func, or_, select, text, update
+
+from app.core.database import SessionLocal
+from app.models.config_snapshot import ConfigSnapshot, canonical_json, content_hash
+from app.models.task_execution import TaskExecution
+
+logger = logging.getLogger(__name__)
+
+# 内联列 → 哈希列
+SNAPSHOT_COLUMNS = {
+    "task_config_snapshot": "task_config_hash",
+    "ai_model_config": "ai_model_config_hash",
+    "storage_config": "storage_config_hash",
+}
+
+
+def _table_sizes(connection) -> Optional[Dict[str, int]]:
+    """PostgreSQL 中执行表和快照表占用的字节数（含TOAST和索引）"""
+    if connection.dialect.name != "postgresql":
+        return None
+    return {
+        table: connection.execute(text("SELECT pg_total_relation_size(:table)"), {"table": table}).scalar()
+        for table in ("task_executions", "config_snapshots")
+    }
+
+
+def migrate_inline_snapshots(session_factory=None, batch_size: int = 500) -> Dict[str, Any]:
+    """迁移内联快照，返回迁移统计"""
+    table = TaskExecution.__table__
+    inline_columns = [table.c[name] for name in SNAPSHOT_COLUMNS]
+    stats: Dict[str, Any] = {
+        "executions": 0,
+        "snapshots": 0,
+        "inline_bytes": 0,
+        "created_snapshots": 0,
+        "snapshot_bytes": 0,
+    }
+    clear = update(table).where(table.c.id == bindparam("execution_pk")).values({
+        **{name: None for name in SNAPSHOT_COLUMNS},
+        **{
+            name: func.coalesce(table.c[name], bindparam(f"migrated_{name}"))
+            for name in SNAPSHOT_COLUMNS.values()
+        },
+    })
+
+    db = (session_factory or SessionLocal)()
+    try:
+        stats["size_before"] = _table_sizes(db.connection())
+        db.commit()
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(table.c.id, *inline_columns)
+                .where(table.c.id > last_id, or_(*(column.isnot(None) for column in inline_columns)))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            contents: Dict[str, Any] = {}
+            updates = []
+            for row in rows:
+                values = {"execution_pk": row.id}
+                for name, hash_name in SNAPSHOT_COLUMNS.items():
+                    value = getattr(row, name)
+                    values[f"migrated_{hash_name}"] = None
+                    if value is None:
+                        continue
+                    digest = content_hash(value)
+                    contents[digest] = value
+                    values[f"migrated_{hash_name}"] = digest
+                    stats["snapshots"] += 1
+                    stats["inline_bytes"] += len(canonical_json(value).encode("utf-8"))
+                updates.append(values)
+
+            connection = db.connection()
+            created = ConfigSnapshot.store_many(connection, contents)
+            connection.execute(clear, updates)
+            db.commit()
+
+            stats["executions"] += len(rows)
+            stats["created_snapshots"] += created
+            last_id = rows[-1].id
+            logger.info(f"已迁移 {stats['executions']} 个执行的配置快照（至ID {last_id}）")
+
+        stats["snapshot_bytes"] = db.execute(
+            select(func.coalesce(func.sum(ConfigSnapshot.size_bytes), 0))
+        ).scalar()
+        stats["size_after"] = _table_sizes(db.connection())
+        db.commit()
+        return stats
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移执行记录中的内联配置快照")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批迁移的执行数")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    stats = migrate_inline_snapshots(batch_size=args.batch_size)
+    print(f"迁移执行 {stats['executions']} 个，快照 {stats['snapshots']} 份")
+    print(f"内联快照 {stats['inline_bytes']:,} 字节 → 快照表共 {stats['snapshot_bytes']:,} 字节")
+    if stats["size_before"] and stats["size_after"]:
+        for name in ("task_executions", "config_snapshots"):
+            before, after = stats["size_before"][name], stats["size_after"][name]
+            print(f"{name}: {before:,} → {after:,} 字节（VACUUM FULL 前旧行版本仍占用空间）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""执行跨度记录
+
+流水线每个步骤记录为一个跨度，步骤内部的分段分析、模型请求等用 child_span() 记录为子跨度。
+当前跨度保存在上下文变量中，步骤中创建的协程任务自动继承，无需逐层传递。
+跨度结束时缓冲到执行对象上，随执行所在会话提交批量写入 execution_spans 表。
+
+    recorder = SpanRecorder(execution)
+    with recorder.span("download_file"):
+        annotate_span(resource="storage_credential:3", bytes=size)
+        with child_span("extract"):
+            ...
+"""
+
+import asyncio
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.exceptions import ExecutionCancelled, ExecutionTimeout
+from app.models.append_buffer import buffer_row
+from app.models.execution_span import ExecutionSpan
+
+_current: ContextVar[Optional[Tuple["SpanRecorder", "Span"]]] = ContextVar("execution_span", default=None)
+
+
+@dataclass
+class Span:
+    """进行中或已结束的跨度"""
+
+    name: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start: float
+    resource: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    end: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> int:
+        end = self.end if self.end is not None else time.monotonic()
+        return int(round((end - self.start) * 1000))
+
+
+def _status(error: BaseException) -> str:
+    if isinstance(error, (asyncio.CancelledError, ExecutionCancelled)):
+        return "cancelled"
+    if isinstance(error, ExecutionTimeout):
+        return "timeout"
+    return "error"
+
+
+class SpanRecorder:
+    """一次执行的跨度记录器"""
+
+    def __init__(self, execution, attributes: Optional[Dict[str, Any]] = None):
+        self.execution = execution
+        self.attributes = attributes or {}
+        self.origin = time.monotonic()
+        self.wall_origin = datetime.utcnow()
+        self.spans: List[Span] = []
+
+    @contextmanager
+    def span(self, name: str, resource: Optional[str] = None, **attributes) -> Iterator[Span]:
+        """记录一个跨度；在本记录器的跨度内调用时作为其子跨度"""
+        active = _current.get()
+        parent = active[1] if active is not None and active[0] is self else None
+        if parent is None:
+            # 顶层跨度带上记录器的公共属性（如重试次数）
+            attributes = {**self.attributes, **attributes}
+        span = Span(
+            name=name,
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent.span_id if parent else None,
+            start=time.monotonic(),
+            resource=resource,
+            attributes=attributes,
+        )
+        token = _current.set((self, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.status = _status(e)
+            span.error = str(e)[:500] or type(e).__name__
+            raise
+        finally:
+            span.end = time.monotonic()
+            _current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        self.spans.append(span)
+        buffer_row(self.execution, ExecutionSpan.__table__, {
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
+            "task_id": self.execution.task_id,
+            "name": span.name,
+            "resource": span.resource,
+            "status": span.status,
+            "error": span.error,
+            "attributes": span.attributes or None,
+            "started_at": self.wall_origin + timedelta(seconds=span.start - self.origin),
+            "start_offset_ms": int(round((span.start - self.origin) * 1000)),
+            "duration_ms": span.duration_ms,
+        })
+
+
+@contextmanager
+def span_scope(recorder: Optional[SpanRecorder], name: str, resource: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """未启用跨度记录时不记录"""
+    if recorder is None:
+        yield None
+        return
+    with recorder.span(name, resource=resource, **attributes) as span:
+        yield span
+
+
+@contextmanager
+def child_span(name: str, resource: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """在当前跨度下记录子跨度，没有进行中的跨度时不记录"""
+    active = _current.get()
+    with span_scope(active[0] if active else None, name, resource=resource, **attributes) as span:
+        yield span
+
+
+def annotate_span(resource: Optional[str] = None, **attributes):
+    """为当前跨度设置关联资源和属性"""
+    active = _current.get()
+    if active is None:
+        return
+    span = active[1]
+    if resource is not None:
+        span.resource = resource
+    span.attributes.update(attributes)
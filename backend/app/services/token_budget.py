@@ -0,0 +1,149 @@
+"""Token预算与分段规划
+
+请求发出前估算提示词Token数；超出预算的文件内容按结构边界
+（标题、空行、换行、句末标点）拆分为多个分段，供map-reduce式分析使用。
+
+分词器优先使用tiktoken（BPE文件缓存在TOKENIZER_CACHE_DIR，避免每次联网下载），
+未安装时退化为按字符估算。
+"""
+
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - 可选依赖
+    tiktoken = None
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 预算安全余量，抵消估算误差
+SAFETY_MARGIN_RATIO = 0.1
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 结构边界，按优先级从粗到细
+_SPLIT_PATTERNS = [
+    re.compile(r"\n(?=#{1,6}\s)"),        # Markdown标题
+    re.compile(r"\n\s*\n"),               # 段落
+    re.compile(r"\n"),                    # 行
+    re.compile(r"(?<=[。！？!?；;.])\s*"),  # 句子
+]
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model_name: str):
+    """按模型名加载并缓存分词器"""
+    if tiktoken is None:
+        return None
+
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", settings.TOKENIZER_CACHE_DIR)
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"加载分词器失败，使用字符估算: {e}")
+        return None
+
+
+class TokenEstimator:
+    """Token估算器"""
+
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or settings.DEFAULT_AI_MODEL
+        self.encoding = _get_encoding(self.model_name)
+
+    def count(self, text: str) -> int:
+        """估算文本Token数"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+
+        # 中文字符约1个Token，其余字符约4个字符1个Token
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """估算消息列表Token数"""
+        return sum(self.count(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def get_prompt_budget(model, analysis_config: Optional[dict] = None) -> int:
+    """计算单次请求提示词可用的Token预算"""
+    budget = (analysis_config or {}).get("max_prompt_tokens")
+    if not budget:
+        budget = settings.MAX_TOKENS_PER_REQUEST
+        if model is not None and model.max_tokens:
+            budget = min(budget, model.max_tokens)
+    return int(budget * (1 - SAFETY_MARGIN_RATIO))
+
+
+class ChunkPlanner:
+    """按结构边界将文本拆分为不超过Token预算的分段"""
+
+    def __init__(self, estimator: TokenEstimator, max_chunks: Optional[int] = None):
+        self.estimator = estimator
+        self.max_chunks = max_chunks or settings.AI_MAX_CHUNKS_PER_DOCUMENT
+
+    def plan(self, text: str, chunk_budget: int) -> List[str]:
+        """生成分段列表"""
+        if chunk_budget <= 0:
+            raise ValueError("分段Token预算必须大于0")
+
+        pieces = self._split(text, chunk_budget, 0)
+        chunks = self._pack(pieces, chunk_budget)
+
+        if len(chunks) > self.max_chunks:
+            raise ValueError(f"文档过大，需要{len(chunks)}个分段，超过上限{self.max_chunks}")
+        return chunks
+
+    def _split(self, text: str, budget: int, level: int) -> List[str]:
+        """递归拆分，直到每段都不超过预算"""
+        if self.estimator.count(text) <= budget:
+            return [text]
+
+        if level >= len(_SPLIT_PATTERNS):
+            return self._hard_split(text, budget)
+
+        parts = [p for p in _SPLIT_PATTERNS[level].split(text) if p and p.strip()]
+        if len(parts) <= 1:
+            return self._split(text, budget, level + 1)
+
+        separator = "\n\n" if level <= 1 else ("\n" if level == 2 else "")
+        result = []
+        for part in parts:
+            sub_pieces = self._split(part, budget, level + 1)
+            sub_pieces[-1] += separator
+            result.extend(sub_pieces)
+        return result
+
+    def _hard_split(self, text: str, budget: int) -> List[str]:
+        """无结构可依时按字符长度硬切"""
+        tokens = max(self.estimator.count(text), 1)
+        size = max(int(len(text) * budget / tokens), 1)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _pack(self, pieces: List[str], budget: int) -> List[str]:
+        """将相邻的小片段合并为尽量满的分段"""
+        chunks: List[str] = []
+        current = ""
+        current_tokens = 0
+        for piece in pieces:
+            piece_tokens = self.estimator.count(piece)
+            if current and current_tokens + piece_tokens > budget:
+                chunks.append(current.strip())
+                current, current_tokens = "", 0
+            current += piece
+            current_tokens += piece_tokens
+        if current.strip():
+            chunks.append(current.strip())
+        return chunks
@@ -0,0 +1,444 @@
+"""飞书结果回写
+
+执行结果按任务 field_mapping 映射为工作项字段后提交给回写合并器：同一工作项在
+FEISHU_WRITE_BACK_WINDOW 秒内收到的多次提交（通常来自不同任务）合并为一次更新调用，
+调用前经过速率调度（令牌桶，遇到429时暂停发放许可），限流或服务端错误按带抖动的
+指数退避重试。每个提交方等待自己所在批次的结果，写入 TaskExecution.write_back_status。
+
+合并窗口保存在Redis中（FEISHU_WRITE_BACK_SHARED），Celery prefork子进程和多个worker
+对同一工作项的提交同样合并：窗口内第一个提交方负责发送，其余提交方轮询批次结果；
+负责发送的进程崩溃时，等待超时的提交方各自发送自己的字段。Redis不可用或关闭共享时
+只在进程内合并。
+
+field_mapping 为"飞书字段key -> 取值路径"，路径按点号在以下变量中查找：
+
+    result      analysis_result        formatted   formatted_result
+    summary     result_summary         confidence  confidence_score
+    trigger     trigger_data           parsed      parsed_data
+
+    {"field_ai_verdict": "formatted.verdict", "field_ai_summary": "summary"}
+
+工作项ID默认取 trigger_data.work_item_id，可通过 feishu_config.work_item_id_path 指定其他路径。
+与最后一次成功回写值相同的字段不再提交（见write_back_cache），全部未变化时记为skipped。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import object_session
+
+from app.core.config import settings
+from app.core.exceptions import FeishuAPIError
+from app.core.redis_client import get_async_redis
+from app.models.analysis_task import AnalysisTask
+from app.models.task_execution import WriteBackStatus
+from app.services.feishu_service import feishu_service, get_credential
+from app.services.write_back_cache import is_skip_enabled, last_written_cache
+from app.utils.template_engine import lookup_value
+
+logger = logging.getLogger(__name__)
+
+# 加入当前批次，没有批次时开启新批次并由本提交方发送，返回 {批次ID, 是否负责发送}
+_SUBMIT_SCRIPT = """
+local batch = redis.call('GET', KEYS[1])
+local owner = 0
+if not batch then
+    batch = ARGV[1]
+    redis.call('SET', KEYS[1], batch, 'PX', ARGV[2])
+    owner = 1
+end
+if #ARGV > 2 then
+    redis.call('HSET', KEYS[2], unpack(ARGV, 3))
+end
+redis.call('PEXPIRE', KEYS[2], ARGV[2])
+redis.call('INCR', KEYS[3])
+redis.call('PEXPIRE', KEYS[3], ARGV[2])
+return {batch, owner}
+"""
+
+# 结束批次：取出合并后的字段和提交数，之后的提交进入新批次
+_TAKE_SCRIPT = """
+local fields = redis.call('HGETALL', KEYS[2])
+local count = redis.call('GET', KEYS[3]) or '0'
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+return {count, fields}
+"""
+
+
+def _result_variables(execution) -> Dict[str, Any]:
+    return {
+        "result": execution.analysis_result or {},
+        "formatted": execution.formatted_result or {},
+        "summary": execution.result_summary,
+        "confidence": execution.confidence_score,
+        "trigger": execution.trigger_data or {},
+        "parsed": execution.parsed_data or {},
+    }
+
+
+def build_field_values(task, execution) -> Dict[str, Any]:
+    """按字段映射计算要回写的字段值，取不到值的字段不回写"""
+    variables = _result_variables(execution)
+    values = {}
+    for field_key, path in (task.field_mapping or {}).items():
+        value = lookup_value(variables, path)
+        if value is not None:
+            values[field_key] = value
+    return values
+
+
+def get_work_item_id(task, execution) -> Optional[str]:
+    """从触发数据或解析数据中取工作项ID"""
+    path = (task.feishu_config or {}).get("work_item_id_path", "work_item_id")
+    for source in (execution.trigger_data, execution.parsed_data):
+        value = lookup_value(source or {}, path)
+        if value is not None:
+            return str(value)
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """限流、服务端错误和网络错误可重试"""
+    if not isinstance(error, FeishuAPIError):
+        return False
+    status = error.status_code
+    return status is None or status == 429 or status >= 500
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """带抖动的指数退避（full jitter）"""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateScheduler:
+    """令牌桶速率调度：调用方按到达顺序依次获得调用许可"""
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[int] = None):
+        self.rate = rate or settings.FEISHU_RATE_LIMIT_QPS
+        self.burst = burst or settings.FEISHU_RATE_LIMIT_BURST
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """收到429后暂停发放许可"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+@dataclass
+class WriteBackOutcome:
+    """一次合并回写的结果"""
+
+    status: WriteBackStatus
+    message: str = ""
+    response: Optional[Dict[str, Any]] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+    merged_count: int = 1
+    attempts: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "status": self.status.value,
+            "message": self.message,
+            "response": self.response,
+            "fields": self.fields,
+            "merged_count": self.merged_count,
+            "attempts": self.attempts,
+        }, ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, data: str) -> "WriteBackOutcome":
+        values = json.loads(data)
+        values["status"] = WriteBackStatus(values["status"])
+        return cls(**values)
+
+
+@dataclass
+class _PendingWrite:
+    feishu_config: Dict[str, Any]
+    work_item_id: str
+    fields: Dict[str, Any] = field(default_factory=dict)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    timer: Optional[asyncio.Task] = None
+
+
+class WriteBackCoalescer:
+    """按工作项合并字段更新的回写队列（shared时经Redis跨进程合并）"""
+
+    def __init__(
+        self,
+        window: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        scheduler: Optional[RateScheduler] = None,
+        service=None,
+        shared: Optional[bool] = None,
+        redis_client=None,
+    ):
+        self.window = window if window is not None else settings.FEISHU_WRITE_BACK_WINDOW
+        self.max_retries = max_retries if max_retries is not None else settings.FEISHU_WRITE_BACK_MAX_RETRIES
+        self.scheduler = scheduler or RateScheduler()
+        self.service = service or feishu_service
+        self.shared = shared if shared is not None else settings.FEISHU_WRITE_BACK_SHARED
+        self._redis = redis_client
+        # 等待其他进程发送结果的上限：合并窗口加上全部重试的退避和请求时间
+        self.result_timeout = self.window + (self.max_retries + 1) * (
+            settings.FEISHU_WRITE_BACK_RETRY_MAX + settings.FEISHU_REQUEST_TIMEOUT
+        )
+        self._pending: Dict[Tuple[str, ...], _PendingWrite] = {}
+        self._flushing: set = set()
+        # 本进程负责发送的共享批次：{批次ID: 提前结束窗口的事件}
+        self._owned: Dict[str, asyncio.Event] = {}
+        self.submitted = 0
+        self.api_calls = 0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    @staticmethod
+    def _key(feishu_config: Dict[str, Any], work_item_id: str) -> Tuple[str, ...]:
+        return (
+            get_credential(feishu_config).cache_key,
+            str(feishu_config.get("project_key")),
+            str(feishu_config.get("work_item_type_key", "story")),
+            work_item_id,
+        )
+
+    @staticmethod
+    def _redis_keys(key: Tuple[str, ...]) -> Tuple[str, str, str]:
+        digest = hashlib.sha256("\x1f".join(key).encode("utf-8")).hexdigest()[:32]
+        prefix = f"write_back:{digest}"
+        return f"{prefix}:batch", f"{prefix}:fields", f"{prefix}:count"
+
+    @staticmethod
+    def _result_key(batch_id: str) -> str:
+        return f"write_back:result:{batch_id}"
+
+    async def submit(self, feishu_config: Dict[str, Any], work_item_id: str, fields: Dict[str, Any]) -> WriteBackOutcome:
+        """提交字段更新并等待所在批次的回写结果；同一字段以最后一次提交为准"""
+        key = self._key(feishu_config, work_item_id)
+        if self.shared:
+            try:
+                batch_id, owner = await self._join_shared(key, fields)
+            except Exception as e:
+                logger.warning(f"共享回写合并不可用，改为进程内合并 {work_item_id}: {e}")
+            else:
+                self.submitted += 1
+                if owner:
+                    task = asyncio.create_task(self._flush_shared(key, batch_id, feishu_config, work_item_id))
+                    # 提交方被取消时批次照常发送，其他进程的提交方不受影响
+                    return await asyncio.shield(task)
+                return await self._wait_shared(batch_id, feishu_config, work_item_id, fields)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = _PendingWrite(feishu_config=feishu_config, work_item_id=work_item_id)
+            pending.timer = asyncio.create_task(self._flush_later(key))
+            self._pending[key] = pending
+
+        future = asyncio.get_running_loop().create_future()
+        pending.fields.update(fields)
+        pending.waiters.append(future)
+        self.submitted += 1
+        return await future
+
+    async def _join_shared(self, key: Tuple[str, ...], fields: Dict[str, Any]) -> Tuple[str, bool]:
+        ttl_ms = int((self.result_timeout + 10) * 1000)
+        args = []
+        for name, value in fields.items():
+            args.extend([name, json.dumps(value, ensure_ascii=False, default=str)])
+        batch_id, owner = await self.redis.eval(
+            _SUBMIT_SCRIPT, 3, *self._redis_keys(key), uuid.uuid4().hex, ttl_ms, *args
+        )
+        return batch_id, bool(int(owner))
+
+    async def _flush_shared(self, key, batch_id: str, feishu_config: Dict[str, Any], work_item_id: str) -> WriteBackOutcome:
+        """负责发送的进程：窗口结束后取出批次中合并的字段发送，并发布结果"""
+        task = asyncio.current_task()
+        self._flushing.add(task)
+        early = self._owned[batch_id] = asyncio.Event()
+        try:
+            try:
+                await asyncio.wait_for(early.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            count, flat = await self.redis.eval(_TAKE_SCRIPT, 3, *self._redis_keys(key))
+            pending = _PendingWrite(
+                feishu_config=feishu_config,
+                work_item_id=work_item_id,
+                fields={flat[i]: json.loads(flat[i + 1]) for i in range(0, len(flat), 2)},
+            )
+            try:
+                outcome = await self._send(pending)
+            except Exception as e:
+                outcome = WriteBackOutcome(WriteBackStatus.FAILED, f"回写异常: {e}", fields=pending.fields)
+            outcome.merged_count = int(count)
+            try:
+                await self.redis.set(self._result_key(batch_id), outcome.to_json(), ex=int(self.result_timeout) + 60)
+            except Exception as e:
+                logger.warning(f"发布合并回写结果失败 {work_item_id}: {e}")
+            return outcome
+        finally:
+            self._owned.pop(batch_id, None)
+            self._flushing.discard(task)
+
+    async def _wait_shared(
+        self, batch_id: str, feishu_config: Dict[str, Any], work_item_id: str, fields: Dict[str, Any]
+    ) -> WriteBackOutcome:
+        """轮询批次结果；负责发送的进程崩溃导致超时时，直接发送自己的字段"""
+        interval = min(max(self.window / 4, 0.05), 1.0)
+        deadline = time.monotonic() + self.result_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            try:
+                data = await self.redis.get(self._result_key(batch_id))
+            except Exception as e:
+                logger.warning(f"读取合并回写结果失败 {work_item_id}: {e}")
+                continue
+            if data is not None:
+                return WriteBackOutcome.from_json(data)
+        logger.warning(f"等待合并回写结果超时，直接回写 {work_item_id}")
+        return await self._send(_PendingWrite(feishu_config=feishu_config, work_item_id=work_item_id, fields=fields))
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.window)
+        await self._flush(key)
+
+    async def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        task = asyncio.current_task()
+        self._flushing.add(task)
+        try:
+            outcome = await self._send(pending)
+        except Exception as e:
+            outcome = WriteBackOutcome(WriteBackStatus.FAILED, f"回写异常: {e}", fields=pending.fields)
+        finally:
+            self._flushing.discard(task)
+
+        outcome.merged_count = len(pending.waiters)
+        for waiter in pending.waiters:
+            if not waiter.done():
+                waiter.set_result(outcome)
+
+    async def _send(self, pending: _PendingWrite) -> WriteBackOutcome:
+        """调用更新接口，可重试错误按退避重试"""
+        attempt = 0
+        while True:
+            await self.scheduler.acquire()
+            self.api_calls += 1
+            try:
+                response = await self.service.update_work_item(
+                    pending.feishu_config, pending.work_item_id, pending.fields
+                )
+                return WriteBackOutcome(
+                    WriteBackStatus.SUCCESS, "回写成功", response, pending.fields, attempts=attempt + 1
+                )
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    details = e.to_dict() if isinstance(e, FeishuAPIError) else None
+                    return WriteBackOutcome(
+                        WriteBackStatus.FAILED, str(e), details, pending.fields, attempts=attempt + 1
+                    )
+
+                delay = backoff_delay(attempt, settings.FEISHU_WRITE_BACK_RETRY_BASE, settings.FEISHU_WRITE_BACK_RETRY_MAX)
+                if getattr(e, "status_code", None) == 429:
+                    self.scheduler.pause(delay)
+                logger.info(f"飞书回写失败，{delay:.1f}秒后重试 {pending.work_item_id}: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def flush_all(self):
+        """立即发送所有缓冲中的更新（停机前调用）"""
+        for early in list(self._owned.values()):
+            early.set()
+        for key in list(self._pending):
+            pending = self._pending.get(key)
+            if pending and pending.timer:
+                pending.timer.cancel()
+            await self._flush(key)
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+
+async def write_back_execution(task, execution, coalescer: Optional[WriteBackCoalescer] = None) -> Optional[WriteBackOutcome]:
+    """执行的回写步骤：计算字段值、提交合并回写并记录结果"""
+    coalescer = coalescer or write_back_coalescer
+
+    fields = build_field_values(task, execution)
+    work_item_id = get_work_item_id(task, execution)
+    if not task.feishu_config or not fields or not work_item_id:
+        execution.add_log_entry("INFO", "未配置回写字段或工作项ID，跳过回写")
+        return None
+
+    db = object_session(execution)
+    changed = fields
+    if is_skip_enabled(task.feishu_config):
+        changed = await last_written_cache.filter_changed(task.feishu_config, work_item_id, fields, db)
+    if not changed:
+        if db is not None:
+            # 在数据库中原子累加，多个worker同时跳过时计数不丢失
+            db.execute(
+                update(AnalysisTask)
+                .where(AnalysisTask.id == task.id)
+                .values(skipped_write_backs=func.coalesce(AnalysisTask.skipped_write_backs, 0) + 1)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            task.skipped_write_backs = (task.skipped_write_backs or 0) + 1
+        execution.write_back_status = WriteBackStatus.SKIPPED.value
+        execution.write_back_message = "字段值未变化，跳过回写"
+        execution.feishu_response = {"work_item_id": work_item_id, "fields": list(fields), "skipped": True}
+        execution.add_log_entry("INFO", "飞书字段值未变化，跳过回写", {"work_item_id": work_item_id})
+        return WriteBackOutcome(WriteBackStatus.SKIPPED, execution.write_back_message, fields=fields, merged_count=0)
+
+    execution.write_back_status = WriteBackStatus.PENDING.value
+    outcome = await coalescer.submit(task.feishu_config, work_item_id, changed)
+    if outcome.status == WriteBackStatus.SUCCESS:
+        # 同一字段被合并批次中的其他提交覆盖时，以实际写入的值为准
+        written = {key: outcome.fields.get(key, value) for key, value in changed.items()}
+        await last_written_cache.record(task.feishu_config, work_item_id, written, db, execution.id)
+
+    execution.write_back_status = outcome.status.value
+    execution.write_back_message = outcome.message
+    execution.feishu_response = {
+        "work_item_id": work_item_id,
+        "fields": list(changed),
+        "unchanged_fields": [key for key in fields if key not in changed],
+        "merged_count": outcome.merged_count,
+        "attempts": outcome.attempts,
+        "response": outcome.response,
+    }
+    level = "INFO" if outcome.status == WriteBackStatus.SUCCESS else "ERROR"
+    execution.add_log_entry(level, f"飞书回写{outcome.message}", {"merged_count": outcome.merged_count})
+    return outcome
+
+
+# 创建全局回写合并器实例
+write_back_coalescer = WriteBackCoalescer()
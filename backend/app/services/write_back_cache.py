@@ -0,0 +1,175 @@
+"""回写去重缓存
+
+记录每个工作项字段最后一次成功回写的值（哈希），回写前过滤掉与之相同的字段；
+全部字段都未变化时整次回写跳过。缓存存放在Redis哈希 feishu_written:{项目}:{类型}:{工作项}
+中并带TTL（FEISHU_WRITTEN_CACHE_TTL，同时限制工作项被人工修改后缓存过期的时长），
+Redis未命中（含只缓存了部分字段）或不可用时回退到 write_back_records 表，
+表中只采用TTL内回写的记录，与缓存的过期时长一致。
+
+任务可通过 feishu_config 关闭：{"skip_unchanged": false}
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.models.write_back_record import WriteBackRecord
+
+logger = logging.getLogger(__name__)
+
+
+def value_hash(value: Any) -> str:
+    """字段值的规范化JSON哈希"""
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_skip_enabled(feishu_config: Optional[Dict[str, Any]]) -> bool:
+    return (feishu_config or {}).get("skip_unchanged", True) is not False
+
+
+class LastWrittenCache:
+    """最后回写值缓存（Redis + 数据库兜底）"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None, redis_client=None, prefix: str = "feishu_written"):
+        self.ttl_seconds = ttl_seconds or settings.FEISHU_WRITTEN_CACHE_TTL
+        self._redis = redis_client
+        self.prefix = prefix
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    @staticmethod
+    def _item(feishu_config: Dict[str, Any], work_item_id: str):
+        return (
+            str(feishu_config.get("project_key")),
+            str(feishu_config.get("work_item_type_key", "story")),
+            str(work_item_id),
+        )
+
+    def _key(self, feishu_config: Dict[str, Any], work_item_id: str) -> str:
+        return f"{self.prefix}:" + ":".join(self._item(feishu_config, work_item_id))
+
+    async def get_hashes(
+        self,
+        feishu_config: Dict[str, Any],
+        work_item_id: str,
+        db=None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Dict[str, str]:
+        """读取工作项各字段最后回写值的哈希
+
+        指定 fields 时，Redis中缺少的字段（如缓存过期后只重新写入了部分字段）再从数据库补齐。
+        """
+        key = self._key(feishu_config, work_item_id)
+        hashes: Dict[str, str] = {}
+        try:
+            hashes = await self.redis.hgetall(key)
+        except Exception as e:
+            logger.warning(f"读取回写去重缓存失败，回退到数据库: {e}")
+
+        missing = None if fields is None else [field for field in fields if field not in hashes]
+        if db is None or (hashes and not missing):
+            return hashes
+
+        project_key, type_key, item_id = self._item(feishu_config, work_item_id)
+        query = db.query(WriteBackRecord).filter(
+            WriteBackRecord.project_key == project_key,
+            WriteBackRecord.work_item_type_key == type_key,
+            WriteBackRecord.work_item_id == item_id,
+            # 超过TTL的记录可能已被人工修改，与缓存过期一样不再采用
+            WriteBackRecord.written_at >= datetime.utcnow() - timedelta(seconds=self.ttl_seconds),
+        )
+        if missing:
+            query = query.filter(WriteBackRecord.field_key.in_(missing))
+        try:
+            records = query.all()
+        except SQLAlchemyError as e:
+            logger.warning(f"查询回写记录失败: {e}")
+            return hashes
+
+        loaded = {record.field_key: record.value_hash for record in records if record.field_key not in hashes}
+        if loaded:
+            await self._store(key, loaded)
+        return {**loaded, **hashes}
+
+    async def filter_changed(
+        self,
+        feishu_config: Dict[str, Any],
+        work_item_id: str,
+        fields: Dict[str, Any],
+        db=None,
+    ) -> Dict[str, Any]:
+        """返回值与最后回写值不同的字段"""
+        hashes = await self.get_hashes(feishu_config, work_item_id, db, fields=list(fields))
+        return {key: value for key, value in fields.items() if hashes.get(key) != value_hash(value)}
+
+    async def record(
+        self,
+        feishu_config: Dict[str, Any],
+        work_item_id: str,
+        fields: Dict[str, Any],
+        db=None,
+        execution_id: Optional[int] = None,
+    ):
+        """记录成功回写的字段值"""
+        if not fields:
+            return
+        hashes = {key: value_hash(value) for key, value in fields.items()}
+        await self._store(self._key(feishu_config, work_item_id), hashes)
+
+        if db is None:
+            return
+        project_key, type_key, item_id = self._item(feishu_config, work_item_id)
+        rows = [
+            {
+                "project_key": project_key,
+                "work_item_type_key": type_key,
+                "work_item_id": item_id,
+                "field_key": field_key,
+                "value_hash": hashes[field_key],
+                "value": value,
+                "execution_id": execution_id,
+            }
+            for field_key, value in fields.items()
+        ]
+        # 同一字段被并发回写时以后写入者为准，不因唯一约束冲突而失败
+        if db.get_bind().dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(WriteBackRecord.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["project_key", "work_item_type_key", "work_item_id", "field_key"],
+            set_={
+                "value_hash": statement.excluded.value_hash,
+                "value": statement.excluded.value,
+                "execution_id": statement.excluded.execution_id,
+                "written_at": func.now(),
+            },
+        )
+        db.execute(statement, rows)
+
+    async def _store(self, key: str, hashes: Dict[str, str]):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping=hashes)
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            # 缓存写入失败不影响回写，数据库记录仍可兜底
+            logger.warning(f"写入回写去重缓存失败: {e}")
+
+
+# 创建全局回写去重缓存实例
+last_written_cache = LastWrittenCache()
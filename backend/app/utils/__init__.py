@@ -0,0 +1 @@
+"""工具函数包"""
@@ -0,0 +1,56 @@
+"""提示词模板引擎
+
+支持 {{variable}} 形式的变量替换，未提供的变量保留原样。
+"""
+
+import re
+from typing import Any, Collection, Dict, List, Optional
+
+VARIABLE_PATTERN = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+
+
+def lookup_value(variables: Dict[str, Any], name: str) -> Any:
+    """按点号路径查找变量值"""
+    value: Any = variables
+    for part in name.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return None
+    return value
+
+
+def variable_marker(name: str) -> str:
+    """延后填充变量在模板中的引用标记"""
+    return f"【{name}】"
+
+
+def render_template(
+    template: str,
+    variables: Dict[str, Any],
+    deferred: Optional[Collection[str]] = None,
+) -> str:
+    """渲染模板
+
+    deferred 中的变量不展开取值，替换为引用标记（见variable_marker），
+    由调用方将取值统一追加到提示词末尾。
+    """
+    if not template:
+        return ""
+
+    def replace(match: re.Match) -> str:
+        if deferred and match.group(1) in deferred:
+            return variable_marker(match.group(1))
+        value = lookup_value(variables or {}, match.group(1))
+        if value is None:
+            return match.group(0)
+        return str(value)
+
+    return VARIABLE_PATTERN.sub(replace, template)
+
+
+def extract_variables(template: str) -> List[str]:
+    """提取模板中引用的变量名"""
+    if not template:
+        return []
+    return VARIABLE_PATTERN.findall(template)
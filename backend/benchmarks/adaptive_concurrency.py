@@ -0,0 +1,161 @@
+"""自适应并发（AIMD）与固定并发的对比压测
+
+在进程内启动容量随时间变化的聊天补全替身服务（app.mock_servers.llm_server），
+分别以固定并发上限和AIMD自适应上限持续发送请求，按容量阶段统计成功数、429数、
+耗时分位数和平均并发上限。不依赖Redis，直接使用 AIMDController 的控制逻辑。
+
+    cd backend
+    python -m benchmarks.adaptive_concurrency --duration 60 --schedule 0:8,20:3,40:12 --ceiling 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from app.mock_servers import llm_server
+from app.services.adaptive_concurrency import AIMDController, AIMDState
+
+
+class LocalLimiter:
+    """进程内的动态并发上限"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def set_limit(self, limit: int):
+        async with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+
+class PhaseStats:
+    """单个容量阶段的统计"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ok = 0
+        self.rejected = 0
+        self.latencies: List[float] = []
+        self.limits: List[int] = []
+
+    def row(self, name: str, seconds: float) -> str:
+        p50 = p95 = 0.0
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            p50 = statistics.median(ordered)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        avg_limit = statistics.mean(self.limits) if self.limits else 0
+        return (
+            f"{name:<8}{self.capacity:>6}{self.ok / seconds:>10.1f}{self.rejected:>8}"
+            f"{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}{avg_limit:>10.1f}"
+        )
+
+
+async def run_mode(
+    mode: str,
+    url: str,
+    duration: float,
+    clients: int,
+    ceiling: int,
+    schedule,
+    cooldown: float,
+) -> Dict[int, PhaseStats]:
+    """以指定模式压测，返回各阶段统计（按阶段起始秒索引）"""
+    llm_server.configure(capacity_schedule=schedule, latency="constant:0.1")
+    controller = AIMDController(ceiling=ceiling, cooldown_seconds=cooldown)
+    aimd_state: Optional[AIMDState] = controller.initial_state() if mode == "aimd" else None
+    limiter = LocalLimiter(ceiling)
+    phases = {int(start): PhaseStats(capacity) for start, capacity in schedule}
+    started = time.monotonic()
+
+    def phase() -> PhaseStats:
+        elapsed = time.monotonic() - started
+        current = schedule[0][0]
+        for start, _ in schedule:
+            if elapsed >= start:
+                current = start
+        return phases[int(current)]
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal aimd_state
+        body = {"model": "mock", "messages": [{"role": "user", "content": "压测"}]}
+        while time.monotonic() - started < duration:
+            await limiter.acquire()
+            request_start = time.monotonic()
+            try:
+                response = await client.post(url, json=body)
+            finally:
+                await limiter.release()
+            latency = time.monotonic() - request_start
+
+            stats = phase()
+            stats.limits.append(limiter.limit)
+            if response.status_code == 200:
+                stats.ok += 1
+                stats.latencies.append(latency)
+                if aimd_state is not None:
+                    aimd_state, _ = controller.on_success(aimd_state, latency, time.time())
+            else:
+                stats.rejected += 1
+                if aimd_state is not None:
+                    aimd_state, _ = controller.on_overload(aimd_state, f"http_{response.status_code}", time.time())
+                await asyncio.sleep(0.05)
+
+            if aimd_state is not None and int(aimd_state.limit) != limiter.limit:
+                await limiter.set_limit(max(1, int(aimd_state.limit)))
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+    return phases
+
+
+async def main(args):
+    schedule = llm_server.parse_schedule(args.schedule)
+    server = uvicorn.Server(uvicorn.Config(llm_server.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+    boundaries = [start for start, _ in schedule] + [args.duration]
+    try:
+        print(f"{'模式':<6}{'容量':>4}{'成功/秒':>7}{'429数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'平均上限':>6}")
+        for mode in ("static", "aimd"):
+            phases = await run_mode(
+                mode, url, args.duration, args.clients, args.ceiling, schedule, args.cooldown
+            )
+            for index, (start, _) in enumerate(schedule):
+                seconds = max(min(boundaries[index + 1], args.duration) - start, 1e-6)
+                print(phases[int(start)].row(mode, seconds))
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="自适应并发对比压测")
+    parser.add_argument("--duration", type=float, default=60.0, help="每种模式的压测时长（秒）")
+    parser.add_argument("--schedule", default="0:8,20:3,40:12", help="替身服务容量时间表")
+    parser.add_argument("--ceiling", type=int, default=16, help="并发上限（max_concurrent_requests）")
+    parser.add_argument("--clients", type=int, default=32, help="并发发送请求的客户端数")
+    parser.add_argument("--cooldown", type=float, default=1.0, help="两次减小上限的最小间隔（秒）")
+    parser.add_argument("--port", type=int, default=9102)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""配置快照去重的存储对比
+
+生成N个带内联配置快照的历史执行（快照内容在M种配置之间重复），运行批量迁移，
+对比迁移前后数据库大小（每次测量前VACUUM）。使用临时SQLite文件，不依赖外部服务。
+
+    cd backend
+    python -m benchmarks.config_snapshot_dedup --executions 20000 --configs 20
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import AnalysisTask, TaskExecution
+from app.services.snapshot_migration import migrate_inline_snapshots
+
+
+def build_config(index: int, prompt_size: int) -> dict:
+    return {
+        "task": {
+            "name": f"任务{index}",
+            "system_prompt": "你是一名需求分析助手。" * (prompt_size // 10),
+            "user_prompt_template": "请分析以下文档：{{file_content}}",
+            "analysis_config": {"chunking": {"enabled": True}, "cache": {"ttl_seconds": 3600}},
+            "field_mappings": {f"field_{i}": f"analysis.{i}" for i in range(20)},
+            "feishu_config": {"project_key": "demo", "work_item_type_key": "story"},
+        },
+        "ai_model": {
+            "id": index % 3,
+            "model_name": "gpt-4o",
+            "api_base": "https://api.example.com/v1",
+            "max_tokens": 4096,
+            "temperature": 0.2,
+        },
+        "storage": {"id": 1, "storage_type": "s3", "bucket": "documents", "region": "cn-north-1"},
+    }
+
+
+def database_size(engine) -> int:
+    with engine.connect() as connection:
+        connection.execute(text("VACUUM"))
+        page_count = connection.execute(text("PRAGMA page_count")).scalar()
+        page_size = connection.execute(text("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+
+        db = session_factory()
+        task = AnalysisTask(name="snapshot-benchmark")
+        db.add(task)
+        db.commit()
+        task_id = task.id
+        db.close()
+
+        # 按迁移前的方式直接写入内联快照列
+        configs = [build_config(index, args.prompt_size) for index in range(args.configs)]
+        table = TaskExecution.__table__
+        with engine.begin() as connection:
+            rows = []
+            for index in range(args.executions):
+                config = configs[index % args.configs]
+                rows.append({
+                    "task_id": task_id,
+                    "execution_id": f"snapshot-{index}",
+                    "task_config_snapshot": config["task"],
+                    "ai_model_config": config["ai_model"],
+                    "storage_config": config["storage"],
+                })
+            connection.execute(insert(table), rows)
+
+        before = database_size(engine)
+        started = time.monotonic()
+        stats = migrate_inline_snapshots(session_factory, batch_size=args.batch_size)
+        elapsed = time.monotonic() - started
+        after = database_size(engine)
+
+        db = session_factory()
+        sample = db.get(TaskExecution, 1)
+        assert sample.task_config_snapshot == configs[0]["task"]
+        db.close()
+
+    print(f"执行 {stats['executions']:,} 个，配置 {args.configs} 种，迁移耗时 {elapsed:.2f}s")
+    print(f"快照 {stats['snapshots']:,} 份 → 去重后 {stats['created_snapshots']} 份")
+    print(f"快照数据 {stats['inline_bytes']:,} → {stats['snapshot_bytes']:,} 字节")
+    print(f"数据库大小 {before:,} → {after:,} 字节（减少 {1 - after / before:.1%}）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="配置快照去重的存储对比")
+    parser.add_argument("--executions", type=int, default=20000, help="执行数")
+    parser.add_argument("--configs", type=int, default=20, help="不同配置的数量")
+    parser.add_argument("--prompt-size", type=int, default=2000, help="系统提示词长度（字符）")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批迁移的执行数")
+    main(parser.parse_args())
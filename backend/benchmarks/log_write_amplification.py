@@ -0,0 +1,97 @@
+"""执行日志写放大对比
+
+对比两种日志存储在一次执行中追加N条日志、每追加K条提交一次时写入数据库的参数字节数：
+
+- json：旧方式，日志保存在 task_executions.log_entries JSON列中，每次提交重写整个列表；
+- table：日志逐条追加到 execution_logs 表，每次提交只插入新增的日志。
+
+统计的是发送给数据库的语句参数大小（近似写入量），使用内存SQLite，不依赖外部服务。
+
+    cd backend
+    python -m benchmarks.log_write_amplification --entries 1000 --commit-every 10
+"""
+
+import argparse
+import json
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import AnalysisTask, ExecutionLog, TaskExecution
+
+
+def param_bytes(params) -> int:
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return sum(param_bytes(item) for item in params)
+    values = params.values() if isinstance(params, dict) else params
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in values if value is not None)
+
+
+def run(mode: str, args) -> dict:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    stats = {"bytes": 0, "statements": 0}
+
+    db = session_factory()
+    task = AnalysisTask(name="log-benchmark")
+    db.add(task)
+    db.flush()
+    execution = TaskExecution(task_id=task.id, execution_id=f"log-{mode}")
+    db.add(execution)
+    db.commit()
+
+    def count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            stats["bytes"] += param_bytes(params)
+            stats["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    for index in range(args.entries):
+        details = {"index": index, "payload": "x" * args.detail_size}
+        if mode == "json":
+            entry = {
+                "timestamp": datetime.utcnow().isoformat(),
+                "level": "INFO",
+                "message": f"日志{index}",
+                "step": "ai_analysis",
+                "details": details,
+            }
+            execution.log_entries = (execution.log_entries or []) + [entry]
+        else:
+            execution.add_log_entry("INFO", f"日志{index}", details)
+        if (index + 1) % args.commit_every == 0:
+            db.commit()
+    db.commit()
+    event.remove(engine, "before_cursor_execute", count)
+
+    if mode == "json":
+        stats["stored"] = len(json.dumps(execution.log_entries, ensure_ascii=False))
+    else:
+        stats["stored"] = sum(
+            param_bytes([row.level, row.step, row.message, json.dumps(row.details), 0, 0])
+            for row in ExecutionLog.tail(db, execution.id, limit=args.entries)
+        )
+    db.close()
+    return stats
+
+
+def main(args):
+    print(f"日志条数 {args.entries}，每 {args.commit_every} 条提交一次")
+    print(f"{'存储方式':<10}{'写入字节':>14}{'语句数':>8}{'最终数据':>12}{'写放大':>8}")
+    for mode in ("json", "table"):
+        stats = run(mode, args)
+        print(
+            f"{mode:<12}{stats['bytes']:>14,}{stats['statements']:>8}{stats['stored']:>12,}"
+            f"{stats['bytes'] / stats['stored']:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="执行日志写放大对比")
+    parser.add_argument("--entries", type=int, default=1000, help="日志条数")
+    parser.add_argument("--commit-every", type=int, default=10, help="每追加多少条提交一次")
+    parser.add_argument("--detail-size", type=int, default=100, help="每条日志详情的大小（字节）")
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""执行大字段转存对比
+
+写入N个带大字段（触发数据、AI请求/响应、分析结果）的执行，对比两种存储：
+
+- inline：大字段直接保存在 task_executions 的JSON列中；
+- offload：超过 PAYLOAD_OFFLOAD_THRESHOLD 的值压缩后存入 execution_payloads，列中只保留引用。
+
+统计数据库大小、写入耗时、列表查询（ORM读取全部执行行）耗时和读取单个执行详情的耗时。
+使用临时SQLite文件，不依赖外部服务。
+
+    cd backend
+    python -m benchmarks.payload_offload --executions 2000 --payload-kb 200
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models import AnalysisTask, TaskExecution
+
+
+def build_corpus(rng: random.Random, size: int) -> str:
+    words = [f"{prefix}{index}" for prefix in ("需求", "接口", "字段", "模块", "风险", "用例") for index in range(80)]
+    return " ".join(rng.choice(words) for _ in range(size // 4))
+
+
+def run(mode: str, args, directory: str) -> dict:
+    settings.PAYLOAD_OFFLOAD_THRESHOLD = 16 * 1024 if mode == "offload" else 1 << 40
+    engine = create_engine(f"sqlite:///{os.path.join(directory, f'{mode}.db')}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    rng = random.Random(42)
+    size = args.payload_kb * 1024
+    # 每个执行从语料中随机位置截取，内容各不相同
+    corpus = build_corpus(rng, size * 2)
+
+    db = session_factory()
+    task = AnalysisTask(name="payload-benchmark")
+    db.add(task)
+    db.commit()
+    started = time.monotonic()
+    for index in range(args.executions):
+        offset = rng.randrange(len(corpus) // 2)
+        document = corpus[offset:offset + size // 3]
+        db.add(TaskExecution(
+            task_id=task.id,
+            execution_id=f"{mode}-{index}",
+            trigger_data={"work_item_id": str(index), "document": document[: size // 4]},
+            ai_request_data={"model": "gpt-4o", "messages": [{"role": "user", "content": document}]},
+            ai_response_data={"choices": [{"message": {"content": document[: size // 2]}}]},
+            analysis_result={"content": document[: size // 2], "finish_reason": "stop"},
+        ))
+        if (index + 1) % 100 == 0:
+            db.commit()
+    db.commit()
+    write_seconds = time.monotonic() - started
+    db.close()
+
+    with engine.connect() as connection:
+        connection.execute(text("VACUUM"))
+        page_count = connection.execute(text("PRAGMA page_count")).scalar()
+        page_size = connection.execute(text("PRAGMA page_size")).scalar()
+
+    db = session_factory()
+    started = time.monotonic()
+    rows = db.query(TaskExecution).order_by(TaskExecution.id).all()
+    summaries = [(row.execution_id, row.status) for row in rows]
+    list_seconds = time.monotonic() - started
+    db.close()
+
+    db = session_factory()
+    started = time.monotonic()
+    for execution_id in range(1, args.executions + 1, max(args.executions // 100, 1)):
+        detail = db.get(TaskExecution, execution_id).to_dict()
+        assert detail["ai_request_data"]["messages"][0]["content"]
+        db.expunge_all()
+    detail_seconds = (time.monotonic() - started) / min(args.executions, 100)
+    db.close()
+    engine.dispose()
+
+    return {
+        "size": page_count * page_size,
+        "write": write_seconds,
+        "list": list_seconds,
+        "detail": detail_seconds,
+        "rows": len(summaries),
+    }
+
+
+def main(args):
+    print(f"执行 {args.executions} 个，每个大字段约 {args.payload_kb}KB")
+    print(f"{'存储方式':<10}{'数据库大小':>16}{'写入(s)':>10}{'列表查询(s)':>14}{'单个详情(ms)':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("inline", "offload"):
+            stats = run(mode, args, directory)
+            print(
+                f"{mode:<12}{stats['size']:>16,}{stats['write']:>10.2f}{stats['list']:>14.3f}"
+                f"{stats['detail'] * 1000:>14.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="执行大字段转存对比")
+    parser.add_argument("--executions", type=int, default=2000, help="执行数")
+    parser.add_argument("--payload-kb", type=int, default=200, help="AI请求大字段的大小（KB）")
+    main(parser.parse_args())
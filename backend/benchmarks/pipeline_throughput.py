@@ -0,0 +1,161 @@
+"""流水线执行与串行执行的吞吐对比压测
+
+在进程内启动替身服务组合（聊天补全、网盘存储、飞书），用相同数量的执行分别以
+串行方式（每个worker依次完成 解析 → 下载 → AI分析 → 回写 → 清理）和流水线方式
+（每个步骤独立的worker池）处理，比较总耗时和吞吐。两种方式的AI并发都受同一个
+模型并发上限约束。AI步骤直接请求替身服务，不依赖Redis和数据库。
+
+    cd backend
+    python -m benchmarks.pipeline_throughput --executions 200 --workers 8 --model-concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import httpx
+
+from app.mock_servers import feishu_server, llm_server, storage_server
+from app.mock_servers.stack import MockStack
+from app.models.task_execution import ExecutionStep, TaskExecution
+from app.services.feishu_service import FeishuService, FeishuTokenManager
+from app.services.pipeline import (
+    ExecutionContext,
+    PipelineExecutor,
+    Stage,
+    cleanup_stage,
+    download_stage,
+    parse_stage,
+    run_serial,
+)
+from app.services.write_back import RateScheduler, WriteBackCoalescer
+
+
+def build_stages(args, urls, client: httpx.AsyncClient, coalescer: WriteBackCoalescer, pipeline_workers=None):
+    """与默认步骤相同的结构，AI和回写步骤直接调用替身服务"""
+    model_limit = asyncio.Semaphore(args.model_concurrency)
+
+    async def ai_stage(ctx: ExecutionContext):
+        body = {
+            "model": "mock",
+            "messages": [{"role": "user", "content": ctx.variables.get("file_content", "")[:2000]}],
+        }
+        async with model_limit:
+            response = await client.post(urls["llm"], json=body)
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+        ctx.execution.analysis_result = {"content": content}
+
+    async def write_stage(ctx: ExecutionContext):
+        item_id = str(ctx.execution.trigger_data["work_item_id"])
+        await coalescer.submit(ctx.task.feishu_config, item_id, {"ai_verdict": ctx.execution.analysis_result["content"]})
+
+    workers = pipeline_workers or {}
+    return [
+        Stage(ExecutionStep.PARSE_DATA, parse_stage, workers.get("parse", 1)),
+        Stage(ExecutionStep.DOWNLOAD_FILE, download_stage, workers.get("download", 1)),
+        Stage(ExecutionStep.AI_ANALYSIS, ai_stage, workers.get("ai", 1)),
+        Stage(ExecutionStep.WRITE_RESULT, write_stage, workers.get("write", 1)),
+        Stage(ExecutionStep.CLEANUP, cleanup_stage, 1, always_run=True),
+    ]
+
+
+def build_contexts(args, urls):
+    task = SimpleNamespace(
+        id=1,
+        max_file_size=None,
+        max_memory_usage=None,
+        storage_credential_id=None,
+        feishu_config={
+            "project_key": "bench",
+            "plugin_id": "bench",
+            "plugin_secret": "bench",
+            "base_url": urls["feishu_project"],
+        },
+    )
+    contexts = []
+    for index in range(args.executions):
+        execution = TaskExecution(
+            execution_id=f"bench-{uuid.uuid4().hex[:12]}",
+            trigger_data={"work_item_id": index},
+            download_url=f"{urls['storage_synthetic']}/{args.file_size}?seed={index}",
+        )
+        contexts.append(ExecutionContext(task, execution))
+    return contexts
+
+
+async def run_mode(mode: str, args, urls):
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        coalescer = WriteBackCoalescer(
+            window=0.0,
+            scheduler=RateScheduler(rate=args.feishu_qps, burst=int(args.feishu_qps)),
+            service=FeishuService(FeishuTokenManager()),
+            shared=False,
+        )
+        contexts = build_contexts(args, urls)
+        started = time.monotonic()
+
+        if mode == "serial":
+            stages = build_stages(args, urls, client, coalescer)
+            queue = asyncio.Queue()
+            for ctx in contexts:
+                queue.put_nowait(ctx)
+
+            async def worker():
+                while not queue.empty():
+                    await run_serial(stages, queue.get_nowait())
+
+            await asyncio.gather(*(worker() for _ in range(args.workers)))
+        else:
+            stages = build_stages(args, urls, client, coalescer, {
+                "parse": 1,
+                "download": args.workers,
+                "ai": args.model_concurrency,
+                "write": args.workers,
+            })
+            executor = PipelineExecutor(stages)
+            await executor.start()
+            await executor.run(contexts)
+            await executor.stop()
+
+        elapsed = time.monotonic() - started
+        failed = sum(1 for ctx in contexts if ctx.error is not None)
+        return elapsed, failed, contexts
+
+
+def step_average(contexts, step: ExecutionStep) -> float:
+    key = f"{step.value}_seconds"
+    values = [ctx.execution.step_timings.get(key, 0) for ctx in contexts]
+    return sum(values) / len(values) if values else 0.0
+
+
+async def main(args):
+    llm_server.configure(latency=args.ai_latency)
+    storage_server.configure(bandwidth=args.bandwidth)
+    feishu_server.configure(latency="constant:0.05")
+
+    async with MockStack(services=["llm", "storage", "feishu"]) as stack:
+        print(f"{'模式':<8}{'总耗时(s)':>10}{'吞吐(个/s)':>12}{'失败':>6}{'下载(s)':>9}{'AI(s)':>8}{'回写(s)':>9}")
+        for mode in ("serial", "pipeline"):
+            elapsed, failed, contexts = await run_mode(mode, args, stack.urls)
+            print(
+                f"{mode:<10}{elapsed:>10.2f}{args.executions / elapsed:>12.2f}{failed:>6}"
+                f"{step_average(contexts, ExecutionStep.DOWNLOAD_FILE):>10.3f}"
+                f"{step_average(contexts, ExecutionStep.AI_ANALYSIS):>8.3f}"
+                f"{step_average(contexts, ExecutionStep.WRITE_RESULT):>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流水线执行吞吐对比压测")
+    parser.add_argument("--executions", type=int, default=200, help="执行数")
+    parser.add_argument("--workers", type=int, default=8, help="串行模式的worker数（流水线下载/回写步骤的worker数）")
+    parser.add_argument("--model-concurrency", type=int, default=8, help="模型并发上限")
+    parser.add_argument("--file-size", default="512KB", help="每个执行下载的文件大小")
+    parser.add_argument("--bandwidth", type=int, default=2 * 1024 * 1024, help="单个下载的带宽（字节/秒）")
+    parser.add_argument("--ai-latency", default="lognormal:0.5,0.3", help="AI耗时分布")
+    parser.add_argument("--feishu-qps", type=float, default=20.0, help="飞书调用速率上限")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""执行队列入队到开始执行的延迟压测
+
+按固定间隔入库并投递执行，统计各执行的 queue_wait_time（入库到被worker认领的时间）。
+需要PostgreSQL（DATABASE_URL）；celery模式还需要Redis和单独启动的Celery worker：
+
+    cd backend
+    python -m benchmarks.queue_latency --backend postgres --executions 200 --interval 0.05
+    celery -A app.core.celery worker --concurrency 8 &
+    python -m benchmarks.queue_latency --backend celery --executions 200 --interval 0.05
+
+postgres模式在进程内启动队列worker，认领后直接标记完成，只测量队列本身的延迟。
+压测任务不配置AI模型，celery worker认领后执行会很快失败，不影响延迟统计。
+压测结束后删除压测任务及其执行记录。
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from app.core.database import SessionLocal, create_tables
+from app.models import AnalysisTask, TaskExecution
+from app.models.task_execution import ExecutionStatus
+from app.services.job_queue import CeleryJobQueue, PostgresJobQueue
+
+
+async def complete_only(execution_id: int):
+    db = SessionLocal()
+    try:
+        execution = db.get(TaskExecution, execution_id)
+        execution.complete_execution(success=True)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def main(args):
+    create_tables()
+    db = SessionLocal()
+    task = AnalysisTask(name=f"queue-latency-{uuid.uuid4().hex[:8]}", display_name="队列延迟压测")
+    db.add(task)
+    db.commit()
+
+    queue = PostgresJobQueue() if args.backend == "postgres" else CeleryJobQueue()
+    worker = None
+    if args.backend == "postgres":
+        worker = asyncio.create_task(queue.run_worker(handler=complete_only, concurrency=args.concurrency))
+        await asyncio.sleep(0.5)
+
+    try:
+        for index in range(args.executions):
+            execution = TaskExecution(
+                task_id=task.id,
+                execution_id=f"bench-{uuid.uuid4().hex[:16]}",
+                status=ExecutionStatus.PENDING,
+                trigger_type="benchmark",
+            )
+            db.add(execution)
+            await queue.enqueue(db, execution)
+            db.commit()
+            await asyncio.sleep(args.interval)
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            db.expire_all()
+            pending = db.query(TaskExecution).filter(
+                TaskExecution.task_id == task.id,
+                TaskExecution.queue_wait_time.is_(None),
+            ).count()
+            if pending == 0:
+                break
+            await asyncio.sleep(0.2)
+
+        waits = sorted(
+            float(row.queue_wait_time) * 1000
+            for row in db.query(TaskExecution).filter(TaskExecution.task_id == task.id)
+            if row.queue_wait_time is not None
+        )
+        if not waits:
+            print("没有执行被认领，请确认worker已启动")
+            return
+        print(f"后端: {args.backend}  认领: {len(waits)}/{args.executions}")
+        print(
+            f"p50 {statistics.median(waits):.1f}ms  "
+            f"p95 {waits[min(len(waits) - 1, int(len(waits) * 0.95))]:.1f}ms  "
+            f"p99 {waits[min(len(waits) - 1, int(len(waits) * 0.99))]:.1f}ms  "
+            f"max {waits[-1]:.1f}ms"
+        )
+    finally:
+        if worker is not None:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+        db.query(TaskExecution).filter(TaskExecution.task_id == task.id).delete()
+        db.delete(task)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="执行队列延迟压测")
+    parser.add_argument("--backend", choices=["postgres", "celery"], default="postgres")
+    parser.add_argument("--executions", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.05, help="入队间隔（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="postgres队列worker并发数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="等待全部认领的最长时间（秒）")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""测试公共夹具：内存SQLite数据库、fakeredis"""
+
+import fakeredis.aioredis
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  注册全部模型
+from app.core.database import Base
+
+
+@pytest.fixture
+def session_factory():
+    """共享同一连接的会话工厂，不同会话看到彼此已提交的数据"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def redis():
+    """支持Lua脚本的内存Redis（decode_responses与应用的异步客户端一致）"""
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def make_task(db):
+    """创建分析任务"""
+    from app.models.analysis_task import AnalysisTask, TaskStatus, TriggerType
+
+    def factory(**kwargs):
+        options = dict(name="task", status=TaskStatus.ACTIVE, trigger_type=TriggerType.WEBHOOK)
+        options.update(kwargs)
+        task = AnalysisTask(**options)
+        db.add(task)
+        db.commit()
+        return task
+
+    return factory
+
+
+@pytest.fixture
+def make_execution(db):
+    """创建执行记录（默认PENDING，已投递到queue_name队列）"""
+    import uuid
+
+    from app.models.task_execution import ExecutionStatus, TaskExecution
+
+    def factory(task, queue_name=None, **kwargs):
+        options = dict(task_id=task.id, execution_id=uuid.uuid4().hex, status=ExecutionStatus.PENDING)
+        options.update(kwargs)
+        execution = TaskExecution(**options)
+        if queue_name:
+            execution.mark_enqueued(queue_name)
+        db.add(execution)
+        db.commit()
+        return execution
+
+    return factory
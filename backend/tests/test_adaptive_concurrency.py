@@ -0,0 +1,92 @@
+"""自适应并发（AIMD）测试"""
+
+import asyncio
+from types import SimpleNamespace
+
+from app.core.exceptions import AIServiceError
+from app.services.adaptive_concurrency import AdaptiveConcurrencyLimiter, AIMDController
+
+
+def _controller(**kwargs):
+    options = dict(ceiling=8, floor=1, increase=1.0, backoff=0.5, spike_ratio=2.0, cooldown_seconds=5.0)
+    options.update(kwargs)
+    return AIMDController(**options)
+
+
+def test_additive_increase_up_to_ceiling():
+    controller = _controller()
+    state = controller.initial_state()
+    state.limit = 4.0
+
+    state, reason = controller.on_success(state, 1.0, now=0)
+    assert reason == "increase"
+    assert state.limit == 4.25
+
+    state.limit = 7.9
+    state, _ = controller.on_success(state, 1.0, now=0)
+    assert state.limit == 8.0
+    state, reason = controller.on_success(state, 1.0, now=0)
+    assert reason is None
+    assert state.limit == 8.0
+
+
+def test_overload_backs_off_to_floor():
+    controller = _controller(floor=2)
+    state = controller.initial_state()
+
+    state, reason = controller.on_overload(state, "http_429", now=100)
+    assert reason == "http_429"
+    assert state.limit == 4.0
+
+    state, _ = controller.on_overload(state, "http_429", now=200)
+    state, _ = controller.on_overload(state, "http_429", now=300)
+    assert state.limit == 2.0
+    state, reason = controller.on_overload(state, "http_429", now=400)
+    assert reason is None
+
+
+def test_cooldown_limits_decreases():
+    controller = _controller()
+    state = controller.initial_state()
+
+    state, _ = controller.on_overload(state, "timeout", now=100)
+    state, reason = controller.on_overload(state, "timeout", now=102)
+    assert reason is None
+    assert state.limit == 4.0
+
+    state, reason = controller.on_overload(state, "timeout", now=106)
+    assert reason == "timeout"
+    assert state.limit == 2.0
+
+
+def test_latency_spike_after_min_samples():
+    controller = _controller(min_samples=3)
+    state = controller.initial_state()
+    for _ in range(3):
+        state, _ = controller.on_success(state, 1.0, now=0)
+
+    state, reason = controller.on_success(state, 5.0, now=100)
+    assert reason == "latency_spike"
+    assert state.limit == 4.0
+
+
+def test_limiter_shares_limit_through_redis(redis):
+    async def run():
+        model = SimpleNamespace(id=1, max_concurrent_requests=8)
+        limiter = AdaptiveConcurrencyLimiter(redis_client=redis, prefix="test_adaptive")
+        assert await limiter.current_limit(model) == 8
+
+        await limiter.record_failure(model, AIServiceError("限流", {"status_code": 429}))
+        assert await limiter.current_limit(model) == 4
+
+        # 非过载错误不调整
+        await limiter.record_failure(model, AIServiceError("参数错误", {"status_code": 400}))
+        assert await limiter.current_limit(model) == 4
+
+        other = AdaptiveConcurrencyLimiter(redis_client=redis, prefix="test_adaptive")
+        assert await other.current_limit(model) == 4
+
+        history = await limiter.history(model.id)
+        assert [(h["previous"], h["limit"], h["reason"]) for h in history] == [(8, 4, "http_429")]
+
+    asyncio.run(run())
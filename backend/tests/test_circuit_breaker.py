@@ -0,0 +1,141 @@
+"""模型熔断器测试（fakeredis执行Lua脚本）"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.exceptions import AIServiceError, CircuitOpenError
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def breaker(redis, monkeypatch):
+    monkeypatch.setattr(settings, "AI_CIRCUIT_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "AI_CIRCUIT_FAILURE_RATE", 0.5)
+    return CircuitBreaker(redis_client=redis, prefix="test_circuit")
+
+
+def _model(model_id=1):
+    return SimpleNamespace(id=model_id, name=f"model-{model_id}", health_status=None, health_message=None)
+
+
+async def _trip(breaker, model):
+    for _ in range(settings.AI_CIRCUIT_MIN_CALLS):
+        await breaker.record_failure(model, AIServiceError("服务不可用", {"status_code": 503}))
+
+
+async def _expire_open(breaker, model):
+    """把熔断截止时间改到过去，模拟熔断时长结束"""
+    await breaker.redis.hset(breaker._keys(model.id)[0], "open_until", int(time.time() * 1000) - 1)
+
+
+def test_trips_after_min_calls(breaker):
+    async def run():
+        model = _model()
+        for _ in range(settings.AI_CIRCUIT_MIN_CALLS - 1):
+            await breaker.record_failure(model, AIServiceError("超时", {"timeout": True}))
+        assert await breaker.state(model) == CLOSED
+
+        await breaker.record_failure(model, AIServiceError("超时", {"timeout": True}))
+        assert await breaker.state(model) == OPEN
+        assert model.health_status == "unhealthy"
+        with pytest.raises(CircuitOpenError):
+            await breaker.before_call(model)
+
+    asyncio.run(run())
+
+
+def test_success_keeps_failure_rate_below_threshold(breaker):
+    async def run():
+        model = _model()
+        for _ in range(3):
+            await breaker.record_success(model, 1.0)
+        for _ in range(2):
+            await breaker.record_failure(model, AIServiceError("服务不可用", {"status_code": 502}))
+        assert await breaker.state(model) == CLOSED
+
+    asyncio.run(run())
+
+
+def test_client_errors_are_not_counted(breaker):
+    async def run():
+        model = _model()
+        for _ in range(10):
+            await breaker.record_failure(model, AIServiceError("参数错误", {"status_code": 400}))
+        assert await breaker.state(model) == CLOSED
+        await breaker.before_call(model)
+
+    asyncio.run(run())
+
+
+def test_allows_honours_open_until_without_transition(breaker):
+    async def run():
+        model = _model()
+        await _trip(breaker, model)
+        assert not await breaker.allows(model)
+
+        await _expire_open(breaker, model)
+        assert await breaker.allows(model)
+        # 只读检查不触发half_open
+        assert await breaker.state(model) == OPEN
+
+    asyncio.run(run())
+
+
+def test_half_open_admits_single_probe(breaker):
+    async def run():
+        model = _model()
+        await _trip(breaker, model)
+        await _expire_open(breaker, model)
+
+        await breaker.before_call(model)
+        assert await breaker.state(model) == HALF_OPEN
+        assert model.health_status == "degraded"
+        assert not await breaker.allows(model)
+        with pytest.raises(CircuitOpenError):
+            await breaker.before_call(model)
+
+    asyncio.run(run())
+
+
+def test_probe_success_closes(breaker):
+    async def run():
+        model = _model()
+        await _trip(breaker, model)
+        await _expire_open(breaker, model)
+        await breaker.before_call(model)
+
+        await breaker.record_success(model, 1.0)
+        assert await breaker.state(model) == CLOSED
+        assert model.health_status == "healthy"
+        await breaker.before_call(model)
+
+    asyncio.run(run())
+
+
+def test_probe_failure_reopens(breaker):
+    async def run():
+        model = _model()
+        await _trip(breaker, model)
+        await _expire_open(breaker, model)
+        await breaker.before_call(model)
+
+        await breaker.record_failure(model, AIServiceError("服务不可用", {"status_code": 503}))
+        assert await breaker.state(model) == OPEN
+        assert not await breaker.allows(model)
+
+    asyncio.run(run())
+
+
+def test_reset(breaker):
+    async def run():
+        model = _model()
+        await _trip(breaker, model)
+        await breaker.reset(model)
+        assert await breaker.state(model) == CLOSED
+        assert await breaker.allows(model)
+
+    asyncio.run(run())
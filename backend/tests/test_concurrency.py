@@ -0,0 +1,100 @@
+"""分布式信号量测试（fakeredis执行Lua脚本）"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.exceptions import ConcurrencyLimitTimeout
+from app.services.concurrency import DistributedSemaphore
+
+
+def _semaphore(redis, limit=2, **kwargs):
+    return DistributedSemaphore("test", limit, poll_interval=0.01, redis_client=redis, **kwargs)
+
+
+def test_limit_is_enforced(redis):
+    async def run():
+        semaphore = _semaphore(redis)
+        assert await semaphore.try_acquire("a")
+        assert await semaphore.try_acquire("b")
+        assert not await semaphore.try_acquire("c")
+        assert await semaphore.in_flight() == 2
+        assert await semaphore.queue_length() == 1
+
+        await semaphore.release("a")
+        assert await semaphore.try_acquire("c")
+        assert await semaphore.queue_length() == 0
+
+    asyncio.run(run())
+
+
+def test_higher_priority_waiter_goes_first(redis):
+    async def run():
+        semaphore = _semaphore(redis, limit=1)
+        assert await semaphore.try_acquire("holder")
+        assert not await semaphore.try_acquire("low", priority=0)
+        assert not await semaphore.try_acquire("high", priority=10)
+
+        await semaphore.release("holder")
+        # 排在后面的低优先级等待者不能插队
+        assert not await semaphore.try_acquire("low", priority=0)
+        assert await semaphore.try_acquire("high", priority=10)
+
+    asyncio.run(run())
+
+
+def test_expired_lease_frees_slot(redis):
+    async def run():
+        semaphore = _semaphore(redis, limit=1, lease_seconds=0.05)
+        assert await semaphore.try_acquire("crashed")
+        assert not await semaphore.try_acquire("next")
+        await semaphore.leave_queue("next")
+
+        await asyncio.sleep(0.1)
+        assert await semaphore.in_flight() == 0
+        assert await semaphore.try_acquire("next")
+
+    asyncio.run(run())
+
+
+def test_renew_extends_lease_until_lost(redis):
+    async def run():
+        semaphore = _semaphore(redis, limit=1, lease_seconds=0.2)
+        assert await semaphore.try_acquire("holder")
+
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            assert await semaphore.renew("holder")
+        assert not await semaphore.try_acquire("other")
+        await semaphore.leave_queue("other")
+
+        await asyncio.sleep(0.3)
+        assert not await semaphore.renew("holder")
+        assert await semaphore.try_acquire("other")
+
+    asyncio.run(run())
+
+
+def test_acquire_timeout_leaves_queue(redis):
+    async def run():
+        semaphore = _semaphore(redis, limit=1)
+        assert await semaphore.try_acquire("holder")
+
+        started = time.monotonic()
+        with pytest.raises(ConcurrencyLimitTimeout):
+            await semaphore.acquire(timeout=0.05)
+        assert time.monotonic() - started < 1
+        assert await semaphore.queue_length() == 0
+
+    asyncio.run(run())
+
+
+def test_hold_releases_on_exit(redis):
+    async def run():
+        semaphore = _semaphore(redis, limit=1)
+        async with semaphore.hold():
+            assert await semaphore.in_flight() == 1
+        assert await semaphore.in_flight() == 0
+
+    asyncio.run(run())
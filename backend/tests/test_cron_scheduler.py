@@ -0,0 +1,90 @@
+"""定时触发调度器：夏令时切换前后的触发时间计算"""
+
+from datetime import datetime, timezone
+
+from app.models.analysis_task import AnalysisTask, TaskStatus, TriggerType
+from app.services.cron_scheduler import CronExpression, CronScheduler, ScheduleSpec
+
+NEW_YORK = "America/New_York"
+
+
+def utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def fires_between(spec: ScheduleSpec, start: float, end: float):
+    fires, current = [], start
+    while True:
+        current = spec.next_fire(current)
+        if current > end:
+            return fires
+        fires.append(current)
+
+
+def test_next_fire_in_repeated_hour_is_after_input():
+    # 2026-11-01 06:40 UTC 为纽约 01:40 EST（夏令时结束后第二次出现的01:40）
+    spec = ScheduleSpec({"cron_expression": "*/5 * * * *", "timezone": NEW_YORK})
+    assert spec.next_fire(utc(2026, 11, 1, 6, 40)) == utc(2026, 11, 1, 6, 45)
+
+
+def test_every_five_minutes_across_fall_back():
+    spec = ScheduleSpec({"cron_expression": "*/5 * * * *", "timezone": NEW_YORK})
+    fires = fires_between(spec, utc(2026, 11, 1, 4, 50), utc(2026, 11, 1, 7, 10))
+    # 按实际时间每5分钟触发一次，重复的01:00-02:00两次都触发，既不跳过也不重复
+    assert fires == [utc(2026, 11, 1, 4, 55) + 300 * index for index in range(28)]
+
+
+def test_daily_fixed_time_fires_once_on_fall_back_day():
+    spec = ScheduleSpec({"cron_expression": "30 1 * * *", "timezone": NEW_YORK})
+    fires = fires_between(spec, utc(2026, 10, 31, 12), utc(2026, 11, 2, 12))
+    # 01:30 EDT；第二天 01:30 EST
+    assert fires == [utc(2026, 11, 1, 5, 30), utc(2026, 11, 2, 6, 30)]
+
+
+def test_skipped_wall_time_on_spring_forward():
+    spec = ScheduleSpec({"cron_expression": "30 2 * * *", "timezone": NEW_YORK})
+    fires = fires_between(spec, utc(2026, 3, 8, 5), utc(2026, 3, 9, 12))
+    # 02:30 不存在，顺延为 03:30 EDT；第二天 02:30 EDT
+    assert fires == [utc(2026, 3, 8, 7, 30), utc(2026, 3, 9, 6, 30)]
+
+
+def test_due_does_not_loop_in_repeated_hour():
+    scheduler = CronScheduler(session_factory=lambda: None, job_queue=object(), leader=object())
+    config = {"cron_expression": "*/5 * * * *", "timezone": NEW_YORK}
+    scheduler.upsert(1, config, None, utc(2026, 11, 1, 6, 36))
+
+    fires = scheduler.due(utc(2026, 11, 1, 6, 41))
+    assert [fire.scheduled_at for fire in fires] == [utc(2026, 11, 1, 6, 40)]
+    assert scheduler._entries[1].next_fire == utc(2026, 11, 1, 6, 45)
+
+
+def test_fixed_hour_in_repeated_hour_terminates():
+    spec = ScheduleSpec({"cron_expression": "*/5 1 * * *", "timezone": NEW_YORK})
+    # 重复的01:xx第二次出现期间不再触发，下次为第二天 01:00 EST
+    assert spec.next_fire(utc(2026, 11, 1, 6, 40)) == utc(2026, 11, 2, 6)
+
+
+def test_stepped_day_field_is_unrestricted():
+    # 日字段 */1 与 * 等价：只按星期（周一）匹配，不与日期取并集
+    cron = CronExpression("0 9 */1 * 1")
+    fire = cron.next_after(datetime(2026, 10, 20, 10))
+    assert fire == datetime(2026, 10, 26, 9)
+
+
+def test_sync_drops_deleted_tasks(db):
+    task = AnalysisTask(
+        name="cron",
+        status=TaskStatus.ACTIVE,
+        trigger_type=TriggerType.SCHEDULE,
+        schedule_config={"interval_seconds": 60},
+    )
+    db.add(task)
+    db.commit()
+
+    scheduler = CronScheduler(session_factory=lambda: db, job_queue=object(), leader=object())
+    assert scheduler.load_all(db) == 1
+
+    db.delete(task)
+    db.commit()
+    scheduler.sync(db)
+    assert len(scheduler) == 0
@@ -0,0 +1,94 @@
+"""postgres执行队列的认领、续约与租约回收测试（SQLite下 FOR UPDATE SKIP LOCKED 被忽略）"""
+
+from datetime import datetime, timedelta
+
+from app.models.task_execution import ExecutionStatus
+from app.services.job_queue import POSTGRES_QUEUE, PostgresJobQueue, claim_execution
+
+
+def _queue(session_factory, **kwargs):
+    return PostgresJobQueue(session_factory=session_factory, lease_seconds=60, **kwargs)
+
+
+def test_claim_orders_by_priority_and_filters(db, session_factory, make_task, make_execution):
+    task = make_task()
+    low = make_execution(task, POSTGRES_QUEUE, priority=0)
+    high = make_execution(task, POSTGRES_QUEUE, priority=5)
+    make_execution(task, "celery", priority=9)
+    make_execution(task, POSTGRES_QUEUE, next_retry_at=datetime.utcnow() + timedelta(minutes=5))
+
+    queue = _queue(session_factory)
+    assert queue.claim(db, 10) == [high.id, low.id]
+    assert queue.claim(db, 10) == []
+
+    db.refresh(high)
+    assert high.status == ExecutionStatus.RUNNING
+    assert high.worker_id == queue.worker_id
+    assert high.lease_expires_at > datetime.utcnow() + timedelta(seconds=50)
+    assert high.queue_wait_time is not None
+
+
+def test_claim_respects_limit(db, session_factory, make_task, make_execution):
+    task = make_task()
+    for _ in range(3):
+        make_execution(task, POSTGRES_QUEUE)
+
+    queue = _queue(session_factory)
+    assert len(queue.claim(db, 2)) == 2
+    assert len(queue.claim(db, 2)) == 1
+
+
+def test_renew_extends_running_leases(db, session_factory, make_task, make_execution):
+    task = make_task()
+    execution = make_execution(task, POSTGRES_QUEUE)
+    queue = _queue(session_factory)
+    queue.claim(db, 1)
+
+    execution.lease_expires_at = datetime.utcnow() + timedelta(seconds=1)
+    db.commit()
+    queue.renew(db, [execution.id])
+    db.refresh(execution)
+    assert execution.lease_expires_at > datetime.utcnow() + timedelta(seconds=50)
+
+
+def test_recover_expired_requeues(db, session_factory, make_task, make_execution):
+    task = make_task()
+    execution = make_execution(task, POSTGRES_QUEUE)
+    queue = _queue(session_factory)
+    queue.claim(db, 1)
+
+    # 租约未过期时不回收
+    assert queue.recover_expired(db) == 0
+
+    execution.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert queue.recover_expired(db) == 1
+    db.refresh(execution)
+    assert execution.status == ExecutionStatus.PENDING
+    assert execution.lease_expires_at is None
+    assert execution.retry_count == 1
+    assert queue.claim(db, 1) == [execution.id]
+
+
+def test_recover_expired_fails_exhausted(db, session_factory, make_task, make_execution):
+    task = make_task()
+    execution = make_execution(task, POSTGRES_QUEUE, retry_count=3, max_retries=3)
+    queue = _queue(session_factory)
+    queue.claim(db, 1)
+
+    execution.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert queue.recover_expired(db) == 0
+    db.refresh(execution)
+    assert execution.status == ExecutionStatus.FAILED
+    assert execution.error_code == "LEASE_EXPIRED"
+
+
+def test_claim_execution_only_once(db, make_task, make_execution):
+    task = make_task()
+    execution = make_execution(task, "celery")
+
+    claimed = claim_execution(db, execution.id, "celery")
+    assert claimed is not None
+    assert claimed.status == ExecutionStatus.RUNNING
+    assert claim_execution(db, execution.id, "celery") is None
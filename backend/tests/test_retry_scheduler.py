@@ -0,0 +1,84 @@
+"""重试调度测试：分层时间轮与到期分派"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.task_execution import ExecutionStatus
+from app.services.job_queue import SCHEDULER_QUEUE
+from app.services.retry_scheduler import HierarchicalTimerWheel, RetryScheduler
+
+
+def _wheel():
+    # 刻度1秒，三层分别覆盖10秒、100秒、1000秒
+    return HierarchicalTimerWheel(tick=1.0, slots=(10, 10, 10), start=0)
+
+
+def test_wheel_expires_in_order_across_levels():
+    wheel = _wheel()
+    assert wheel.add("near", 3)
+    assert wheel.add("middle", 42)
+    assert wheel.add("far", 517)
+    assert wheel.next_due() == 3
+
+    assert wheel.advance(2) == []
+    assert wheel.advance(3) == ["near"]
+    assert wheel.advance(41) == []
+    assert wheel.advance(42) == ["middle"]
+    assert wheel.advance(516) == []
+    assert wheel.advance(600) == ["far"]
+    assert len(wheel) == 0
+
+
+def test_wheel_cancel_and_reschedule():
+    wheel = _wheel()
+    wheel.add("cancelled", 5)
+    wheel.add("moved", 5)
+    assert wheel.cancel("cancelled")
+    assert not wheel.cancel("cancelled")
+    wheel.add("moved", 250)
+
+    assert wheel.advance(10) == []
+    assert "moved" in wheel
+    assert wheel.advance(250) == ["moved"]
+
+
+def test_wheel_rejects_beyond_capacity_and_clamps_past():
+    wheel = _wheel()
+    assert not wheel.add("too_far", 1000)
+    assert wheel.add("overdue", -5)
+    assert wheel.advance(1) == ["overdue"]
+
+
+class FakeJobQueue:
+    name = SCHEDULER_QUEUE
+
+    def __init__(self):
+        self.enqueued = []
+
+    async def enqueue(self, db, execution):
+        execution.mark_enqueued(self.name)
+        self.enqueued.append(execution.id)
+
+
+def test_dispatch_requeues_due_retries_once(db, session_factory, make_task, make_execution):
+    async def run():
+        task = make_task()
+        due = make_execution(
+            task, SCHEDULER_QUEUE, status=ExecutionStatus.RETRY, retry_count=1,
+            next_retry_at=datetime.utcnow() - timedelta(seconds=1),
+        )
+        finished = make_execution(task, SCHEDULER_QUEUE, status=ExecutionStatus.SUCCESS)
+
+        job_queue = FakeJobQueue()
+        scheduler = RetryScheduler(session_factory, job_queue, tick=1.0)
+        assert scheduler.load_due(db) == 1
+        assert await scheduler.dispatch(db, [due.id, finished.id]) == 1
+        # 其他实例已分派的不再重复投递
+        assert await scheduler.dispatch(db, [due.id]) == 0
+
+        db.refresh(due)
+        assert due.status == ExecutionStatus.PENDING
+        assert due.next_retry_at is None
+        assert job_queue.enqueued == [due.id]
+
+    asyncio.run(run())
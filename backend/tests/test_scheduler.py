@@ -0,0 +1,216 @@
+"""执行调度器测试：加权公平队列、认领、任务并发名额与租约回收"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.task_execution import ExecutionStatus
+from app.services.job_queue import SCHEDULER_QUEUE
+from app.services.scheduler import ExecutionScheduler, FairQueue
+
+
+@pytest.fixture(autouse=True)
+def fake_semaphore_redis(redis, monkeypatch):
+    """任务并发名额使用fakeredis"""
+    monkeypatch.setattr(sys.modules["app.services.concurrency"], "get_async_redis", lambda: redis)
+
+
+class Runner:
+    """记录运行的执行，直到release才结束"""
+
+    def __init__(self):
+        self.started = []
+        self.done = asyncio.Event()
+
+    async def __call__(self, execution_id: int):
+        self.started.append(execution_id)
+        await self.done.wait()
+
+
+def _scheduler(session_factory, runner, **kwargs):
+    options = dict(max_running=10, fetch_limit=10, lease_seconds=60, load_lag=0)
+    options.update(kwargs)
+    return ExecutionScheduler(session_factory, runner, **options)
+
+
+def test_fair_queue_weighted_shares():
+    queue = FairQueue()
+    for i in range(30):
+        queue.push(1, 2.0, ("heavy", i))
+        queue.push(2, 1.0, ("light", i))
+
+    served = [queue.pop(queue.next_task()) for _ in range(30)]
+    assert sum(1 for name, _ in served if name == "heavy") == 20
+
+
+def test_fair_queue_priority_within_task():
+    queue = FairQueue()
+    queue.push(1, 1.0, "first", priority=0)
+    queue.push(1, 1.0, "urgent", priority=5)
+    queue.push(1, 1.0, "second", priority=0)
+    assert [queue.pop(1) for _ in range(3)] == ["urgent", "first", "second"]
+
+
+def test_fair_queue_idle_task_does_not_bank_credit():
+    queue = FairQueue()
+    for i in range(10):
+        queue.push(1, 1.0, i)
+    for _ in range(5):
+        queue.pop(queue.next_task())
+
+    # 新加入的任务从当前最小虚拟时间开始，不会连续独占
+    for i in range(10):
+        queue.push(2, 1.0, i)
+    served = []
+    for _ in range(4):
+        task_id = queue.next_task()
+        queue.pop(task_id)
+        served.append(task_id)
+    assert served.count(1) == 2 and served.count(2) == 2
+
+
+def test_tick_claims_and_respects_task_concurrency(session_factory, make_task, make_execution):
+    async def run():
+        limited = make_task(max_concurrent_executions=1)
+        other = make_task(max_concurrent_executions=5)
+        limited_ids = [make_execution(limited, SCHEDULER_QUEUE).id for _ in range(3)]
+        other_ids = [make_execution(other, SCHEDULER_QUEUE).id for _ in range(2)]
+
+        runner = Runner()
+        scheduler = _scheduler(session_factory, runner)
+        assert await scheduler.tick() == 3
+        await asyncio.sleep(0)
+        assert sorted(runner.started) == sorted([limited_ids[0]] + other_ids)
+
+        # 名额未释放前不再分派该任务
+        assert await scheduler.tick() == 0
+
+        runner.done.set()
+        await scheduler.shutdown()
+        runner.done.clear()
+        assert await scheduler.tick() == 1
+        await asyncio.sleep(0)
+        assert runner.started[-1] == limited_ids[1]
+
+        runner.done.set()
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+
+
+def test_claim_skips_rows_taken_by_other_instance(db, session_factory, make_task, make_execution):
+    async def run():
+        task = make_task(max_concurrent_executions=5)
+        executions = [make_execution(task, SCHEDULER_QUEUE) for _ in range(2)]
+
+        runner = Runner()
+        scheduler = _scheduler(session_factory, runner)
+        scheduler._load_pending(db)
+
+        # 另一个调度实例先认领了第一个执行
+        executions[0].status = ExecutionStatus.RUNNING
+        db.commit()
+
+        assert await scheduler.tick() == 1
+        await asyncio.sleep(0)
+        assert runner.started == [executions[1].id]
+        # 认领失败的名额已归还
+        assert await scheduler._semaphores[task.id].in_flight() == 1
+
+        runner.done.set()
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+
+
+def test_claim_sets_lease_and_queue_wait(db, session_factory, make_task, make_execution):
+    async def run():
+        task = make_task()
+        execution = make_execution(task, SCHEDULER_QUEUE)
+        runner = Runner()
+        scheduler = _scheduler(session_factory, runner)
+        await scheduler.tick()
+
+        db.refresh(execution)
+        assert execution.status == ExecutionStatus.RUNNING
+        assert execution.lease_expires_at > datetime.utcnow() + timedelta(seconds=50)
+        assert execution.queue_wait_time is not None
+
+        runner.done.set()
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+
+
+def test_crashed_instance_claims_are_recovered(db, session_factory, make_task, make_execution):
+    async def run():
+        task = make_task()
+        execution = make_execution(task, SCHEDULER_QUEUE)
+
+        crashed = _scheduler(session_factory, Runner())
+        await crashed.tick()
+        # 模拟调度进程崩溃：不再续约，租约过期
+        crashed._running.clear()
+        execution.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+        runner = Runner()
+        survivor = _scheduler(session_factory, runner)
+        # 名额租约在fakeredis中仍有效，这里直接清理以模拟其过期
+        await crashed._semaphores[task.id].redis.delete(crashed._semaphores[task.id].holders_key)
+        assert survivor.maintain_leases(db) == 1
+        db.refresh(execution)
+        assert execution.status == ExecutionStatus.PENDING
+
+        assert await survivor.tick() == 1
+        await asyncio.sleep(0)
+        assert runner.started == [execution.id]
+
+        runner.done.set()
+        await survivor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_maintain_leases_renews_running(db, session_factory, make_task, make_execution):
+    async def run():
+        task = make_task()
+        execution = make_execution(task, SCHEDULER_QUEUE)
+        runner = Runner()
+        scheduler = _scheduler(session_factory, runner)
+        await scheduler.tick()
+
+        execution.lease_expires_at = datetime.utcnow() + timedelta(seconds=1)
+        db.commit()
+        assert scheduler.maintain_leases(db) == 0
+        db.refresh(execution)
+        assert execution.lease_expires_at > datetime.utcnow() + timedelta(seconds=50)
+
+        runner.done.set()
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+
+
+def test_watermark_loads_new_and_requeued_rows(db, session_factory, make_task, make_execution):
+    task = make_task(max_concurrent_executions=5)
+    first = make_execution(task, SCHEDULER_QUEUE)
+    scheduler = _scheduler(session_factory, Runner(), fetch_limit=2)
+    assert scheduler._load_pending(db) == 1
+    # 已在本地队列中的执行不重复加入
+    assert scheduler._load_pending(db) == 0
+
+    later = [make_execution(task, SCHEDULER_QUEUE) for _ in range(3)]
+    # 每轮最多加入fetch_limit个，其余下一轮继续
+    assert scheduler._load_pending(db) == 2
+    assert scheduler._load_pending(db) == 1
+    assert scheduler._queued == {first.id} | {execution.id for execution in later}
+
+    # 历史入队时间早于水位的执行不会被重新扫描，重新入队会刷新入队时间
+    scheduler._queued.discard(first.id)
+    assert scheduler._load_pending(db) == 0
+    first.mark_enqueued(SCHEDULER_QUEUE)
+    db.commit()
+    assert scheduler._load_pending(db) == 1
@@ -0,0 +1,90 @@
+"""执行单飞去重测试：登记、租约续约与过期、唤醒follower"""
+
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+def _flight(redis, lease_seconds=0.3):
+    return SingleFlight(redis_client=redis, poll_interval=0.05, lease_seconds=lease_seconds)
+
+
+def test_leader_and_follower(redis):
+    async def run():
+        flight = _flight(redis)
+        assert await flight.join("file", 1) is None
+        assert await flight.join("file", 2) == 1
+        # 同一执行重新登记（如重试）仍为leader
+        assert await flight.join("file", 1) is None
+        await flight.finish("file", 1)
+        assert await flight.join("file", 2) is None
+        await flight.finish("file", 2)
+
+    asyncio.run(run())
+
+
+def test_leader_renews_beyond_lease(redis):
+    async def run():
+        flight = _flight(redis)
+        assert await flight.join("file", 1) is None
+        await asyncio.sleep(0.8)
+        assert await flight.join("file", 2) == 1
+        await flight.finish("file", 1)
+
+    asyncio.run(run())
+
+
+def test_registration_expires_without_renewal(redis):
+    async def run():
+        flight = _flight(redis)
+        assert await flight.join("file", 1) is None
+        # 模拟leader进程崩溃：续约停止
+        flight._renewals.pop("file").cancel()
+        await asyncio.sleep(0.4)
+        assert await flight.join("file", 2) is None
+        await flight.finish("file", 2)
+
+    asyncio.run(run())
+
+
+def test_finish_only_releases_own_registration(redis):
+    async def run():
+        flight = _flight(redis)
+        assert await flight.join("file", 1) is None
+        await flight.finish("file", 2)
+        assert await flight.join("file", 3) == 1
+        await flight.finish("file", 1)
+
+    asyncio.run(run())
+
+
+def test_finish_wakes_waiting_follower(redis):
+    async def run():
+        leader = _flight(redis, lease_seconds=30)
+        follower = SingleFlight(redis_client=redis, poll_interval=10, lease_seconds=30)
+        assert await leader.join("file", 1) is None
+        assert await follower.join("file", 2) == 1
+
+        waiter = asyncio.create_task(follower.wait("file", 1))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await leader.finish("file", 1)
+        # 通过发布的结束消息唤醒，无需等到轮询间隔
+        await asyncio.wait_for(waiter, 2)
+        follower._listener.cancel()
+
+    asyncio.run(run())
+
+
+def test_follower_notices_expired_leader(redis):
+    async def run():
+        leader = _flight(redis, lease_seconds=0.2)
+        follower = _flight(redis, lease_seconds=0.2)
+        assert await leader.join("file", 1) is None
+        assert await follower.join("file", 2) == 1
+        leader._renewals.pop("file").cancel()
+
+        await asyncio.wait_for(follower.wait("file", 1), 2)
+        follower._listener.cancel()
+
+    asyncio.run(run())